@@ -0,0 +1,7 @@
+def __getattr__(name):
+    # Import the loader, and with it pandas, only when it is first used,
+    # so that the command line starts quickly
+    if name == "load":
+        from .loader import load
+        return load
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,161 @@
+"""Catalogue of the workbooks in the transcriptions.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+The catalogue lists, for each workbook, the leagues and seasons it
+covers, its sheets and their numbers of rows, and the compilers and
+source named in its Metadata sheet.  It is read from the cells of the
+workbooks directly, without building DataFrames of their sheets, and is
+kept in processed/catalog.csv.  Each entry records the digest of its
+workbook, so that refreshing the catalogue reopens only the workbooks
+which have changed.  Selecting workbooks by league or season looks
+them up in the catalogue, reading any it does not cover, but does not
+write it.
+"""
+import pathlib
+
+import pandas as pd
+
+from . import readers
+from . import sheetcache
+
+
+columns = ["source", "workbook", "hash", "leagues", "seasons", "sheets",
+           "rows", "compilers", "title"]
+
+# Separator between the items of list-valued entries
+separator = "; "
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _column(rows, heading):
+    """Return the distinct non-empty values in the column of 'rows' headed
+    'heading', in order of appearance.
+    """
+    if not rows or heading not in rows[0]:
+        return []
+    index = rows[0].index(heading)
+    values = [_text(row[index]) for row in rows[1:] if index < len(row)]
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def inventory(fn):
+    """Return the catalogue entry for workbook 'fn' as a dict.
+    """
+    path = pathlib.Path(fn)
+    entry = {"source": path.parent.name, "workbook": path.name,
+             "hash": sheetcache.workbook_hash(fn)}
+    leagues = []
+    seasons = []
+    sheets = []
+    rows = []
+    compilers = []
+    title = []
+    for (name, cells) in readers.get_reader().sheets(fn):
+        sheets.append(name)
+        if name == "Metadata":
+            for row in cells:
+                (key, value) = ([_text(v) for v in row] + ["", ""])[:2]
+                if key.lower() == "compiler" and value:
+                    compilers.append(value)
+                elif key.lower() == "source" and value:
+                    title.append(value)
+            continue
+        rows.append(f"{name}={max(len(cells)-1, 0)}")
+        leagues.extend(_column(cells, "nameLeague"))
+        seasons.extend(_column(cells, "year"))
+    entry["leagues"] = separator.join(dict.fromkeys(leagues))
+    entry["seasons"] = separator.join(sorted(set(seasons)))
+    entry["sheets"] = separator.join(sheets)
+    entry["rows"] = separator.join(rows)
+    entry["compilers"] = separator.join(dict.fromkeys(compilers))
+    entry["title"] = separator.join(dict.fromkeys(title))
+    return entry
+
+
+def path(root="processed"):
+    return pathlib.Path(root)/"catalog.csv"
+
+
+def read(root="processed"):
+    """Return the catalogue as a DataFrame, empty if it has not been
+    built.
+    """
+    fn = path(root)
+    if not fn.exists():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(fn, dtype=str, keep_default_na=False)
+
+
+def _update(entries, fns):
+    """Return the entries for the workbooks 'fns', reusing those in
+    the dict 'entries' whose workbooks are unchanged and adding the
+    others to it.  Returns the entries and the number of workbooks read.
+    """
+    found = []
+    count = 0
+    for fn in fns:
+        fn = pathlib.Path(fn)
+        key = (fn.parent.name, fn.name, sheetcache.workbook_hash(fn))
+        entry = entries.get(key)
+        if entry is None:
+            entry = inventory(fn)
+            entries[key] = entry
+            count += 1
+        found.append(entry)
+    return (found, count)
+
+
+def _write(entries, root):
+    df = pd.DataFrame(entries, columns=columns) \
+           .sort_values(["source", "workbook"], ignore_index=True)
+    path(root).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path(root), index=False)
+    return df
+
+
+def _previous(root):
+    return {(rec["source"], rec["workbook"], rec["hash"]): rec
+            for rec in read(root).to_dict(orient="records")}
+
+
+def build(root="processed", transcript="transcript"):
+    """Bring the catalogue up to date with the workbooks in 'transcript',
+    reading only those which are new or have changed.  Returns the
+    catalogue and the number of workbooks read.
+    """
+    fns = [fn for fn in sorted(pathlib.Path(transcript).glob("*/*.xls"))
+           if "~" not in fn.name]
+    (entries, count) = _update(_previous(root), fns)
+    return (_write(entries, root), count)
+
+
+def lookup(fns, root="processed"):
+    """Return the catalogue entries for the workbooks 'fns' as a list of
+    dicts, reading only those which are not catalogued or have changed.
+    The catalogue itself is left as it is; only build() writes it.
+    """
+    (entries, count) = _update(_previous(root), fns)
+    return entries
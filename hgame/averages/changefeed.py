@@ -0,0 +1,142 @@
+"""Feed of rows inserted, updated and deleted by each build.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+After a table is written, the fingerprints of its rows are compared
+with those kept from the previous build, and the differences are
+written to processed/<source>/changes/<table>.csv.  Each row of the
+feed has a 'change' of insert, update or delete, and a 'row.key' which
+identifies the row across builds; inserted and updated rows carry all
+their values, and deleted rows their key columns only.  A consumer
+holding the previous build can apply the feed in place of reloading the
+table.  The first build of a table with no snapshot inserts every row.
+
+Person refs number the rows of each sheet in turn, so inserting or
+deleting a row renumbers the rows after it.  The feed therefore keys
+rows on what does not shift: the league-season, phase and club, the
+person's names, compared without regard to case, and the stint.  A
+person's rows from different sheets are told apart by the letter of
+their refs, and their fielding rows by the positions they are for.
+Rows which agree on all of these are told apart by their order of
+occurrence.  A correction to a name or position flag is thus a delete
+and an insert in the feed.
+"""
+import pathlib
+
+import pandas as pd
+
+from . import diff
+from .schema import tables
+
+
+# Columns identifying a row of each table across builds
+keys = {
+    "playing_individual":  ["league.year", "league.name", "phase.name",
+                            "entry.name", "person.ref", "person.name.last",
+                            "person.name.given", "S_STINT"] +
+                           [col for col in tables["playing_individual"]
+                            if col.endswith("_POS")],
+    "managing_individual": ["league.year", "league.name", "phase.name",
+                            "entry.name", "person.name.last",
+                            "person.name.given"],
+    "playing_team":        ["league.year", "league.name", "entry.name",
+                            "phase.name"],
+}
+
+# How key columns are compared: refs by the letter of their sheet, and
+# names without regard to case
+_key_values = {
+    "person.ref":        lambda col: col.str.extract(r"^([A-Z]*)")[0],
+    "person.name.last":  lambda col: col.str.casefold(),
+    "person.name.given": lambda col: col.str.casefold(),
+}
+
+
+def _directory(source, root="processed"):
+    return pathlib.Path(root)/source/"changes"
+
+
+def _row_keys(keyhash):
+    return pd.Series(keyhash).map("{:016x}".format).to_numpy()
+
+
+def snapshot(df, table):
+    """Return the snapshot of 'df', the text of 'table': the row key and
+    content fingerprint of each row, with the key columns.
+    """
+    key = keys[table]
+    (keyhash, rowhash) = diff.fingerprint(df, key, _key_values)
+    snap = df[key].copy()
+    snap.insert(0, "row.key", _row_keys(keyhash))
+    snap.insert(1, "row.hash", _row_keys(rowhash))
+    return snap
+
+
+def changes(previous, current, df):
+    """Return the feed of changes taking a table from the snapshot
+    'previous' to the snapshot 'current' of its text 'df'.
+    """
+    key = [c for c in current.columns if c not in ["row.key", "row.hash"]]
+    merged = previous[["row.key", "row.hash"]] \
+        .merge(current[["row.key", "row.hash"]].reset_index(),
+               on="row.key", how="outer", suffixes=("_old", ""),
+               indicator=True)
+    inserted = merged.loc[merged["_merge"] == "right_only", "index"]
+    updated = merged.loc[(merged["_merge"] == "both") &
+                         (merged["row.hash_old"] != merged["row.hash"]),
+                         "index"]
+    deleted = previous.loc[previous["row.key"]
+                           .isin(merged.loc[merged["_merge"] == "left_only",
+                                            "row.key"]),
+                           ["row.key"] + key]
+    rows = []
+    for (change, index) in [("insert", inserted), ("update", updated)]:
+        part = df.iloc[index.astype(int).sort_values()]
+        part.insert(0, "row.key", current["row.key"]
+                    .iloc[index.astype(int).sort_values()].to_numpy())
+        part.insert(0, "change", change)
+        rows.append(part)
+    deleted.insert(0, "change", "delete")
+    rows.append(deleted)
+    return pd.concat(rows, ignore_index=True) \
+             .reindex(columns=["change", "row.key"] + list(df.columns)) \
+             .fillna("")
+
+
+def update(source, table, root="processed"):
+    """Write the feed of changes to 'table' of 'source' since the last
+    build, and replace its snapshot.  Returns the number of rows
+    inserted, updated and deleted.
+    """
+    directory = _directory(source, root)
+    directory.mkdir(parents=True, exist_ok=True)
+    df = diff.read_table(pathlib.Path(root)/source/f"{table}.csv")
+    current = snapshot(df, table)
+    snapfn = directory/f"{table}.snapshot.csv"
+    if snapfn.exists():
+        # A snapshot from an older version may have other key columns
+        previous = pd.read_csv(snapfn, dtype=str, keep_default_na=False) \
+                     .reindex(columns=current.columns, fill_value="")
+    else:
+        previous = current.iloc[:0]
+    feed = changes(previous, current, df)
+    feed.to_csv(directory/f"{table}.csv", index=False)
+    current.to_csv(snapfn, index=False)
+    counts = feed["change"].value_counts()
+    return tuple(int(counts.get(change, 0))
+                 for change in ["insert", "update", "delete"])
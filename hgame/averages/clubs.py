@@ -0,0 +1,235 @@
+"""Canonical identifiers for the clubs named in the processed tables.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Club names are copied from the guides as printed, so the same club may
+be 'St. Paul' in one table and 'St Paul' or 'St. P.' in another.  The
+club index gathers every (league.year, league.name, entry.name) in the
+processed tables and clusters the names within each league-season.  A
+league-season is identified by its key in the league registry, where
+there is one, so that the variants in every source are clustered
+together.  Names are clustered when their club keys (see
+leagues.club_key) are equal or within a small edit distance of each
+other, or when one is abbreviated with a full stop and is a prefix of
+only one other name in the league-season.  Names marked to tell apart
+clubs of the same city, such as 'Grand Rapids [II]', are clustered only
+with names bearing the same mark.  Each cluster is given the id
+<league key>-<club key of its commonest name>.
+
+Clustering can be corrected in club_overrides.csv, which gives the
+club.id for an entry.name in a league.year, and optionally only in
+one league.name.  The index is written to processed/clubs.csv, and
+ClubIndex.annotate() adds a club.id column to a table, so that tables
+join on exact ids.
+"""
+import collections
+import pathlib
+import re
+
+import pandas as pd
+
+from . import leagues
+from . import loader
+
+
+# Marks such as [II] telling apart clubs of the same city
+_mark_pattern = re.compile(r"\s*\[[^\]]*\]")
+
+_index_columns = ["league.year", "league.name", "entry.name", "club.id",
+                  "club.name", "rows", "override"]
+
+
+def edit_distance(a, b):
+    """Return the Levenshtein distance between strings 'a' and 'b'.
+    """
+    if len(a) < len(b):
+        (a, b) = (b, a)
+    previous = list(range(len(b) + 1))
+    for (i, x) in enumerate(a, 1):
+        current = [i]
+        for (j, y) in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j-1] + 1,
+                               previous[j-1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def _close(a, b):
+    """Return True if club keys 'a' and 'b' are close enough to be taken
+    as the same name: one edit apart, or two for long names.
+    """
+    limit = 2 if min(len(a), len(b)) >= 10 else 1
+    return min(len(a), len(b)) >= 5 and \
+        abs(len(a) - len(b)) <= limit and edit_distance(a, b) <= limit
+
+
+def _mark(name):
+    match = _mark_pattern.search(name)
+    return match.group(0) if match else ""
+
+
+def cluster(counts):
+    """Cluster the club names in 'counts', a dict mapping each name seen
+    in one league-season to its number of rows.  Returns a dict mapping
+    each name to the canonical name of its cluster, the commonest.
+    """
+    keys = {name: (leagues.club_key(_mark_pattern.sub("", name)),
+                   _mark(name))
+            for name in counts}
+    parent = {key: key for key in keys.values()}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    distinct = sorted(parent)
+    for (i, a) in enumerate(distinct):
+        for b in distinct[i+1:]:
+            if a[1] == b[1] and _close(a[0], b[0]):
+                parent[find(a)] = find(b)
+    for name in counts:
+        a = keys[name]
+        if not name.rstrip().endswith(".") or len(a[0]) < 2:
+            continue
+        extensions = [b for b in distinct if b != a and b[1] == a[1] and
+                      b[0].startswith(a[0])]
+        if len(extensions) == 1:
+            parent[find(a)] = find(extensions[0])
+
+    members = collections.defaultdict(list)
+    for name in counts:
+        members[find(keys[name])].append(name)
+    canonical = {}
+    for names in members.values():
+        best = min(names, key=lambda name: (-counts[name], name))
+        for name in names:
+            canonical[name] = best
+    return canonical
+
+
+def _entries(root):
+    """Return the number of rows with each (league.year, league.name,
+    entry.name) in the processed tables.
+    """
+    columns = ["league.year", "league.name", "entry.name"]
+    df = pd.concat([loader.load(table=table, columns=columns, root=root)
+                    for table in ["playing_team", "playing_individual",
+                                  "managing_individual"]],
+                   ignore_index=True)
+    df = df[df[columns].notnull().all(axis=1)]
+    df = df.assign(**{"league.year": df["league.year"].astype(int),
+                      "league.name": df["league.name"].astype(str),
+                      "entry.name": df["entry.name"].astype(str)})
+    return df.groupby(columns).size().rename("rows").reset_index()
+
+
+def _read_overrides(path):
+    path = pathlib.Path(path)
+    if not path.exists():
+        return {}
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return {(int(year), league, name): club
+            for (year, league, name, club) in
+            df[["league.year", "league.name", "entry.name",
+                "club.id"]].itertuples(index=False)}
+
+
+def _league_key(registry, year, name):
+    key = registry.key(year, name) if registry is not None else None
+    if key is None:
+        key = f"{year}-{leagues.league_initials(name)}"
+    return key
+
+
+def build_index(root="processed", overrides="club_overrides.csv"):
+    """Build the club index from the processed tables in 'root' and the
+    curated 'overrides', and write it to root/clubs.csv.
+    """
+    try:
+        registry = leagues.Registry.load(root)
+    except FileNotFoundError:
+        registry = None
+    entries = _entries(root)
+    entries["league.key"] = [_league_key(registry, year, name)
+                             for (year, name) in
+                             zip(entries["league.year"],
+                                 entries["league.name"])]
+    fixed = _read_overrides(overrides)
+
+    records = []
+    for (key, group) in entries.groupby("league.key", sort=True):
+        counts = group.groupby("entry.name")["rows"].sum().to_dict()
+        canonical = cluster(counts)
+        for (year, league, name, rows) in \
+                group[["league.year", "league.name", "entry.name",
+                       "rows"]].itertuples(index=False):
+            club = fixed.get((year, league, name),
+                             fixed.get((year, "", name)))
+            if club is not None:
+                records.append((year, league, name, club, name, rows, True))
+            else:
+                best = canonical[name]
+                records.append((year, league, name,
+                                f"{key}-{leagues.club_key(best)}", best,
+                                rows, False))
+    df = pd.DataFrame(records, columns=_index_columns) \
+           .sort_values(["league.year", "league.name", "entry.name"],
+                        ignore_index=True)
+    df.to_csv(pathlib.Path(root)/"clubs.csv", index=False)
+    return ClubIndex(df)
+
+
+class ClubIndex(object):
+    """Indexed mapping from (league.year, league.name, entry.name) to
+    canonical club id.
+    """
+    def __init__(self, df):
+        self.df = df
+        self._ids = {(int(year), league, name): club
+                     for (year, league, name, club) in
+                     df[["league.year", "league.name", "entry.name",
+                         "club.id"]].itertuples(index=False)}
+
+    @classmethod
+    def load(cls, root="processed"):
+        return cls(pd.read_csv(pathlib.Path(root)/"clubs.csv",
+                               dtype={"league.name": str, "entry.name": str,
+                                      "club.id": str, "club.name": str}))
+
+    def id(self, year, league, name):
+        """Return the club id for 'name' in 'league' in 'year', or None.
+        """
+        return self._ids.get((int(year), league, name))
+
+    def annotate(self, df):
+        """Return 'df' with a 'club.id' column inserted after its
+        'entry.name' column.
+        """
+        ids = pd.Series(
+            [self._ids.get((int(year), league, name))
+             if not (pd.isnull(year) or pd.isnull(name)) else None
+             for (year, league, name) in
+             zip(df["league.year"], df["league.name"], df["entry.name"])],
+            index=df.index, dtype=object
+        )
+        df = df.copy()
+        df.insert(loc=df.columns.get_loc("entry.name")+1,
+                  column="club.id", value=ids)
+        return df
@@ -0,0 +1,161 @@
+"""Transparent compression for processed output files.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+"""
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import pathlib
+
+
+# Compression method name -> file suffix appended to the plain name
+suffixes = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "xz":   ".xz",
+}
+
+# Leading bytes identifying each compressed format
+_magic = {
+    "gzip": b"\x1f\x8b",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "xz":   b"\xfd7zXZ\x00",
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires the 'zstandard' package; "
+                          "install hgame-averages[zstd]") from None
+    return zstandard
+
+
+def output_path(path, compress=None):
+    """Return the name under which 'path' is written with 'compress'.
+    """
+    path = pathlib.Path(path)
+    if compress is None:
+        return path
+    return path.with_name(path.name + suffixes[compress])
+
+
+def check(compress):
+    """Raise ImportError if the package needed to write 'compress' is not
+    installed, so that a missing codec is reported before any work is
+    done.
+    """
+    if compress == "zstd":
+        _zstandard()
+
+
+@contextlib.contextmanager
+def _open_gzip(path, name):
+    """Open 'path' for writing gzip-compressed text.  The header names
+    the file as 'name' and carries no timestamp, so that the same text
+    is always compressed to the same bytes.
+    """
+    with path.open("wb") as raw, \
+         gzip.GzipFile(filename=name, mode="wb", mtime=0,
+                       fileobj=raw) as stream, \
+         io.TextIOWrapper(stream, encoding="utf-8", newline="") as f:
+        yield f
+
+
+def _open_text(path, compress, name):
+    if compress is None:
+        return path.open("w", encoding="utf-8", newline="")
+    if compress == "gzip":
+        return _open_gzip(path, name)
+    if compress == "xz":
+        return lzma.open(path, "wt", encoding="utf-8", newline="")
+    if compress == "zstd":
+        return _zstandard().open(path, "wt", encoding="utf-8", newline="")
+    raise ValueError(f"Unknown compression method {compress}")
+
+
+@contextlib.contextmanager
+def open_output(path, compress=None):
+    """Open 'path' for writing text, compressed with 'compress' if given.
+
+    The returned handle compresses incrementally as text is written to it,
+    so callers can stream output in chunks.  Text goes to a temporary file
+    beside 'path', which replaces the output only once it has been written
+    in full; if writing fails, the previous output is left as it was.
+    Then any copy of the same file written previously with a different
+    compression is removed, so that readers never see a stale variant.
+    """
+    path = pathlib.Path(path)
+    target = output_path(path, compress)
+    temp = target.with_name(target.name + ".tmp%d" % os.getpid())
+    try:
+        with _open_text(temp, compress, target.name) as f:
+            yield f
+        os.replace(temp, target)
+    finally:
+        if temp.exists():
+            temp.unlink()
+    for candidate in [path] + [output_path(path, c) for c in suffixes]:
+        if candidate != target and candidate.exists():
+            candidate.unlink()
+
+
+def detect(path):
+    """Return the compression method of the file at 'path', or None.
+    """
+    with pathlib.Path(path).open("rb") as f:
+        head = f.read(6)
+    for (method, magic) in _magic.items():
+        if head.startswith(magic):
+            return method
+    return None
+
+
+def find_input(path):
+    """Return the existing file for 'path', allowing for any compression
+    suffix.  Returns None if no variant of the file exists.
+    """
+    path = pathlib.Path(path)
+    for candidate in [path] + [output_path(path, c) for c in suffixes]:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def open_input(path, mode="rt"):
+    """Open 'path' for reading, decompressing transparently.
+
+    'path' may name the plain file; a compressed variant is used if that
+    is what exists on disk.  The format is detected from the file contents
+    rather than its name.
+    """
+    found = find_input(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    kwargs = {"encoding": "utf-8"} if "t" in mode else {}
+    method = detect(found)
+    if method is None:
+        return found.open(mode, **kwargs)
+    if method == "gzip":
+        return gzip.open(found, mode, **kwargs)
+    if method == "xz":
+        return lzma.open(found, mode, **kwargs)
+    return _zstandard().open(found, mode, **kwargs)
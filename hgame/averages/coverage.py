@@ -0,0 +1,145 @@
+"""Coverage of the columns of the processed tables.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Most sources fill only part of the standardised columns of each table;
+older guides have no fielding by outfield position, for instance.  When
+the tables of a source are written, the number of non-null values in
+each of their columns is counted as they are assembled, and kept in the
+coverage index of the source, processed/<source>/coverage.csv.  This
+lists every column of each table in order, with its dtype, its count,
+and whether it is stored in the table file.
+
+A table may be written pruned, keeping only the columns with values.
+The index then still describes the full schema, and expand() restores
+the columns left out, all null, so no information is lost.
+"""
+import pathlib
+
+import pandas as pd
+
+from . import schema
+
+
+columns = ["table", "column", "dtype", "count", "stored"]
+
+filename = "coverage.csv"
+
+
+def path(source, root="processed"):
+    """Return the coverage index of 'source'.
+    """
+    return pathlib.Path(root)/source/filename
+
+
+def entries(table, dtypes, counts, stored):
+    """Return the entries of the coverage index for 'table', whose
+    columns have 'dtypes' and 'counts' of non-null values, and of which
+    those in 'stored' are in the table file.
+    """
+    return [(table, col, str(dtype), counts[col], int(col in stored))
+            for (col, dtype) in dtypes.items()]
+
+
+def write(source, entries, root="processed"):
+    """Write the coverage index of 'source' from its 'entries'.
+    """
+    pd.DataFrame(entries, columns=columns) \
+      .to_csv(path(source, root), index=False)
+
+
+def _read(fn):
+    if not fn.exists():
+        return None
+    return pd.read_csv(fn, dtype={"table": str, "column": str,
+                                  "dtype": str})
+
+
+def read(source, root="processed"):
+    """Return the coverage index of 'source', or None if there is none.
+    """
+    return _read(path(source, root))
+
+
+def full_columns(table_path):
+    """Return the full list of columns of the table file 'table_path',
+    which may have a compression suffix, or None if the index of its
+    source does not cover it.
+    """
+    table_path = pathlib.Path(table_path)
+    df = _read(table_path.with_name(filename))
+    if df is None:
+        return None
+    table = table_path.name.split(".csv")[0]
+    return list(df.loc[df["table"] == table, "column"]) or None
+
+
+def expand(df, table_path, fill_value=None):
+    """Return 'df', read from the table file 'table_path', with any
+    columns pruned from the file restored and filled with 'fill_value'.
+    """
+    full = full_columns(table_path)
+    if full is None or list(df.columns) == full:
+        return df
+    return df.reindex(columns=full, fill_value=fill_value)
+
+
+def prune(dtypes, counts):
+    """Return the columns to store of a table whose columns have 'dtypes'
+    and 'counts' of non-null values: those with values, or all of them
+    if the table is empty.
+    """
+    if not any(counts.values()):
+        return list(dtypes)
+    return [col for col in dtypes if counts[col]]
+
+
+def index(source=None, table=None, root="processed"):
+    """Return the coverage of the columns of 'table' (default all) in
+    'source' (default all), one row per source, table and column, as a
+    DataFrame.
+    """
+    if source is None:
+        source = sorted(p.name for p in pathlib.Path(root).iterdir()
+                        if p.is_dir())
+    elif isinstance(source, str):
+        source = [source]
+    frames = []
+    for name in source:
+        df = read(name, root)
+        if df is None:
+            continue
+        if table is not None:
+            df = df[df["table"] == table]
+        df.insert(0, "source", name)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["source"] + columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def covered(source=None, table="playing_individual", root="processed"):
+    """Return the columns of 'table' which have values in any of
+    'source' (default all), in schema order, or None if none of them
+    has a coverage index.
+    """
+    df = index(source, table, root)
+    if df.empty:
+        return None
+    counts = df.groupby("column", sort=False)["count"].sum()
+    return [col for col in schema.tables[table] if counts.get(col, 0) > 0]
@@ -0,0 +1,154 @@
+"""Consolidate processed sources into one partitioned dataset.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+The dataset lives under dataset/, with one directory per table and
+hive-style partitions beneath it:
+
+    dataset/<table>/league.year=<year>/source=<source>/part.csv
+
+Every partition file carries a leading 'source' column.  The file
+dataset/manifest.csv lists every partition with its row count and the
+range of years it covers, so that readers can select partitions without
+opening them.  Rebuilding a source replaces only that source's partitions
+and manifest entries.
+"""
+import pathlib
+import shutil
+
+import pandas as pd
+
+from . import compression
+from . import coverage
+
+
+tables = ["playing_individual", "managing_individual", "playing_team"]
+
+_manifest_columns = ["table", "source", "year_min", "year_max",
+                     "rows", "path"]
+
+
+def _read_manifest(root):
+    path = root/"manifest.csv"
+    if not path.exists():
+        return pd.DataFrame(columns=_manifest_columns)
+    return pd.read_csv(path, dtype={"source": str, "path": str})
+
+
+def _write_manifest(root, manifest):
+    path = root/"manifest.csv"
+    temp = path.with_name(path.name + ".tmp")
+    manifest.sort_values(["table", "year_min", "source"]) \
+            .to_csv(temp, index=False)
+    temp.replace(path)
+
+
+def _partitions(source, table, compress, root):
+    """Write the partitions of 'table' for 'source', returning their
+    manifest entries.
+    """
+    fn = compression.find_input(pathlib.Path("processed")/source /
+                                f"{table}.csv")
+    if fn is None:
+        return []
+    with compression.open_input(fn) as f:
+        df = pd.read_csv(f, dtype=str, keep_default_na=False)
+    df = coverage.expand(df, fn, "")
+    df.insert(loc=0, column="source", value=source)
+    entries = []
+    for (year, part) in df.groupby("league.year", sort=True):
+        reldir = pathlib.Path(table)/f"league.year={year}"/f"source={source}"
+        (root/reldir).mkdir(parents=True, exist_ok=True)
+        relpath = compression.output_path(reldir/"part.csv", compress)
+        with compression.open_output(root/reldir/"part.csv", compress) as f:
+            part.to_csv(f, index=False)
+        entries.append({"table": table, "source": source,
+                        "year_min": int(year), "year_max": int(year),
+                        "rows": len(part), "path": relpath.as_posix()})
+    return entries
+
+
+def _remove_source(root, source):
+    for table in tables:
+        for partdir in (root/table).glob(f"league.year=*/source={source}"):
+            shutil.rmtree(partdir)
+            try:
+                partdir.parent.rmdir()
+            except OSError:
+                pass
+
+
+def build(sources=None, compress=None, root="dataset"):
+    """Add 'sources' to the dataset, replacing any partitions previously
+    built from them.  If 'sources' is None, all processed sources are
+    (re)built.
+    """
+    root = pathlib.Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    if sources is None:
+        sources = sorted(p.name for p in pathlib.Path("processed").iterdir()
+                         if p.is_dir())
+    manifest = _read_manifest(root)
+    for source in sources:
+        print(f"Adding {source} to dataset")
+        _remove_source(root, source)
+        entries = [entry
+                   for table in tables
+                   for entry in _partitions(source, table, compress, root)]
+        manifest = pd.concat(
+            [manifest[manifest["source"] != source],
+             pd.DataFrame(entries, columns=_manifest_columns)],
+            ignore_index=True
+        )
+    _write_manifest(root, manifest)
+
+
+def partitions(table, years=None, sources=None, root="dataset"):
+    """Return the manifest entries for 'table' which may contain rows
+    for 'years' (an inclusive (first, last) pair) and 'sources'.
+    """
+    manifest = _read_manifest(pathlib.Path(root))
+    manifest = manifest[manifest["table"] == table]
+    if years is not None:
+        first, last = years
+        manifest = manifest[(manifest["year_max"] >= first) &
+                            (manifest["year_min"] <= last)]
+    if sources is not None:
+        manifest = manifest[manifest["source"].isin(sources)]
+    return manifest
+
+
+def scan(table, years=None, sources=None, root="dataset", **kwargs):
+    """Iterate over the partitions of 'table' matching 'years' and
+    'sources', yielding one DataFrame per partition.  Additional keyword
+    arguments are passed to pd.read_csv.
+    """
+    kwargs.setdefault("dtype", str)
+    for path in partitions(table, years, sources, root)["path"]:
+        with compression.open_input(pathlib.Path(root)/path) as f:
+            yield pd.read_csv(f, **kwargs)
+
+
+def read(table, years=None, sources=None, root="dataset", **kwargs):
+    """Return the rows of 'table' for 'years' and 'sources' as one
+    DataFrame, reading only the partitions which can contain them.
+    """
+    frames = list(scan(table, years, sources, root, **kwargs))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
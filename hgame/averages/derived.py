@@ -0,0 +1,143 @@
+"""Recomputation of derived statistics from their components.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Averages, percentages and earned run averages are transcribed as
+printed.  Here they are recomputed from the counts they were derived
+from, over whole tables at once, and compared with the printed values.
+
+Innings pitched are usually recorded with thirds of an inning as tenths,
+so that 200.2 is 200 2/3 innings, but some transcriptions give them as
+decimals (200.67) or as fractions ("200 2/3").  ip_outs() reads all of
+these as a whole number of outs.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Ratios recomputed from components: code -> (numerator, denominator),
+# where each is a list of columns to be summed
+_ratios = {
+    "B_AVG": (["B_H"], ["B_AB"]),
+    "B_SLG": (["B_TB"], ["B_AB"]),
+    "P_AVG": (["P_H"], ["P_AB"]),
+    "P_PCT": (["P_W"], ["P_W", "P_L"]),
+    "R_PCT": (["R_W"], ["R_W", "R_L"]),
+}
+
+_fielding_prefixes = ["F_1B_", "F_2B_", "F_3B_", "F_SS_", "F_OF_", "F_LF_",
+                      "F_CF_", "F_RF_", "F_C_", "F_P_", "F_ALL_", "F_"]
+
+# Largest difference between computed and printed values accepted as
+# rounding, by code; percentages are printed to three places and earned
+# run averages to two, but guides did not always round to nearest
+tolerances = {"P_ERA": 0.01}
+default_tolerance = 0.001
+
+_fraction = r"^\s*(?P<whole>\d+)?\s*(?:(?P<thirds>[12])\s*/\s*3)?\s*$"
+
+
+def _numeric(df, col):
+    """Return column 'col' of 'df' as floats, or all nulls if absent.
+    """
+    if col not in df:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce").astype(float)
+
+
+def ip_outs(values):
+    """Return the innings pitched in the Series 'values' as a Series of
+    outs.  Numbers whose first decimal place is 0, 1 or 2 count thirds
+    as tenths; other decimals are taken to be fractions of an inning and
+    rounded to the nearest third.  Strings may also be fractions such as
+    "200 2/3".  Values which cannot be read are null.
+    """
+    numbers = pd.to_numeric(values, errors="coerce").astype(float)
+    whole = np.floor(numbers)
+    tenths = np.round((numbers - whole) * 10, 6)
+    thirds = np.where(np.isin(tenths, [0, 1, 2]), tenths,
+                      np.round((numbers - whole) * 3))
+    outs = pd.Series(whole * 3 + thirds, index=values.index)
+    text = values.where(numbers.isnull() & values.notnull())
+    if text.notnull().any():
+        parts = text.astype(str).str.extract(_fraction)
+        parsed = pd.to_numeric(parts["whole"]).fillna(0) * 3 + \
+            pd.to_numeric(parts["thirds"]).fillna(0)
+        valid = text.notnull() & \
+            (parts["whole"].notnull() | parts["thirds"].notnull())
+        outs = outs.where(~valid, parsed)
+    return outs.round().astype("Int64")
+
+
+def _ratio(df, numerator, denominator):
+    num = sum(_numeric(df, col) for col in numerator)
+    den = sum(_numeric(df, col) for col in denominator)
+    return (num / den).where(den > 0)
+
+
+def recompute(df):
+    """Return a DataFrame with the index of 'df' giving each derived
+    statistic of 'df' recomputed from its components, for those derived
+    statistics which 'df' has.
+    """
+    computed = {}
+    for (code, (numerator, denominator)) in _ratios.items():
+        if code in df:
+            computed[code] = _ratio(df, numerator, denominator)
+    if "P_ERA" in df:
+        outs = ip_outs(df["P_IP"]).astype(float) if "P_IP" in df \
+            else pd.Series(np.nan, index=df.index)
+        computed["P_ERA"] = (27 * _numeric(df, "P_ER") / outs) \
+            .where(outs > 0)
+    for prefix in _fielding_prefixes:
+        code = prefix + "PCT"
+        if code in df:
+            computed[code] = _ratio(df, [prefix + "PO", prefix + "A"],
+                                    [prefix + "PO", prefix + "A",
+                                     prefix + "E"])
+    return pd.DataFrame(computed, index=df.index)
+
+
+def deltas(df, identity=None, all_rows=False):
+    """Compare the printed derived statistics of 'df' with their
+    recomputed values.  Returns one row per value which differs by more
+    than the tolerance for that statistic, or per value which could be
+    recomputed if 'all_rows' is set, giving the 'identity' columns of
+    'df', the code, and the printed and computed values and their
+    difference.
+    """
+    computed = recompute(df)
+    identity = [col for col in (identity or []) if col in df]
+    frames = []
+    for code in computed:
+        printed = _numeric(df, code)
+        delta = computed[code] - printed
+        keep = printed.notnull() & computed[code].notnull()
+        if not all_rows:
+            keep &= delta.abs() > tolerances.get(code, default_tolerance) \
+                + 1e-9
+        part = df.loc[keep, identity].copy()
+        part["code"] = code
+        part["printed"] = printed[keep]
+        part["computed"] = computed[code][keep]
+        part["delta"] = delta[keep]
+        frames.append(part)
+    if not frames:
+        return pd.DataFrame(columns=identity +
+                            ["code", "printed", "computed", "delta"])
+    return pd.concat(frames, ignore_index=True)
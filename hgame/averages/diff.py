@@ -0,0 +1,202 @@
+"""Compare two builds of the processed tables row by row.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Each row is given two 64-bit fingerprints: one of its key columns, and
+one of its entire contents.  Rows of the two builds are matched through
+a hash join on the key fingerprint, and matched rows whose content
+fingerprints differ are compared column by column.  Rows whose key
+occurs more than once in a table are told apart by their order of
+occurrence.  Values are compared as the text written to the files.
+"""
+import collections
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from . import compression
+from . import coverage
+from .schema import tables
+
+
+# Columns identifying a row of each table
+keys = {
+    "playing_individual":  ["league.year", "league.name", "person.ref",
+                            "S_STINT", "entry.name"],
+    "managing_individual": ["league.year", "league.name", "phase.name",
+                            "entry.name", "person.ref"],
+    "playing_team":        ["league.year", "league.name", "entry.name",
+                            "phase.name"],
+}
+
+TableDiff = collections.namedtuple(
+    "TableDiff", ["source", "table", "added", "removed", "changed"]
+)
+
+
+def read_table(path):
+    """Read the table at 'path' with every value as text, or return None
+    if there is no such file.  Columns pruned from the file are restored
+    as empty, so pruned and unpruned tables compare equal.
+    """
+    path = compression.find_input(path)
+    if path is None:
+        return None
+    with compression.open_input(path) as f:
+        df = pd.read_csv(f, dtype=str, keep_default_na=False)
+    return coverage.expand(df, path, "")
+
+
+def fingerprint(df, key, values=None):
+    """Return the key and content fingerprints of the rows of 'df', as
+    arrays of uint64.  'values' may map key columns to functions of the
+    column giving the values by which they are compared.
+    """
+    keyed = df[key]
+    if values:
+        keyed = keyed.apply(lambda col: values.get(col.name,
+                                                   lambda x: x)(col))
+    keyhash = pd.util.hash_pandas_object(keyed, index=False).to_numpy()
+    occurrence = pd.Series(keyhash).groupby(keyhash).cumcount().to_numpy()
+    keyhash = pd.util.hash_pandas_object(
+        pd.DataFrame({"key": keyhash, "occurrence": occurrence}),
+        index=False
+    ).to_numpy()
+    rowhash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return (keyhash, rowhash)
+
+
+def diff_table(old, new, key):
+    """Compare the DataFrames 'old' and 'new' of a table with key columns
+    'key', or by their entire contents if 'key' is empty.  Returns the
+    rows added and removed, and a DataFrame with one row per changed
+    value, giving the key, the column and the old and new values.
+    """
+    columns = list(new.columns) + [c for c in old.columns
+                                   if c not in new.columns]
+    old = old.reindex(columns=columns, fill_value="")
+    new = new.reindex(columns=columns, fill_value="")
+    key = list(key) or columns
+    (oldkey, oldrow) = fingerprint(old, key)
+    (newkey, newrow) = fingerprint(new, key)
+    matched = pd.DataFrame({"key": oldkey, "old": np.arange(len(old)),
+                            "oldrow": oldrow}) \
+                .merge(pd.DataFrame({"key": newkey, "new": np.arange(len(new)),
+                                     "newrow": newrow}),
+                       on="key", how="outer")
+    added = new.iloc[matched.loc[matched["old"].isnull(), "new"]
+                     .astype(int).sort_values()]
+    removed = old.iloc[matched.loc[matched["new"].isnull(), "old"]
+                       .astype(int).sort_values()]
+    matched = matched[~matched["old"].isnull() & ~matched["new"].isnull() &
+                      (matched["oldrow"] != matched["newrow"])] \
+        .sort_values("new")
+    oldvalues = old.iloc[matched["old"].astype(int)].to_numpy()
+    newvalues = new.iloc[matched["new"].astype(int)].to_numpy()
+    (rows, cols) = np.nonzero(oldvalues != newvalues)
+    changed = new.iloc[matched["new"].astype(int).to_numpy()[rows]][key] \
+        .reset_index(drop=True)
+    changed["column"] = np.array(columns, dtype=object)[cols]
+    changed["old"] = oldvalues[rows, cols]
+    changed["new"] = newvalues[rows, cols]
+    return (added, removed, changed)
+
+
+def _table_name(path):
+    return path.name.split(".")[0]
+
+
+def _table_files(path):
+    """Return a dict mapping (source, table) to the file for each
+    processed table under 'path', which may be a table file, the
+    directory of one source, or a directory of sources.
+    """
+    path = pathlib.Path(path)
+    if path.is_file():
+        return {(None, _table_name(path)): path}
+    found = {}
+    for table in tables:
+        fn = compression.find_input(path/f"{table}.csv")
+        if fn is not None:
+            found[(None, table)] = fn
+    if found:
+        return found
+    for source in sorted(p for p in path.iterdir() if p.is_dir()):
+        for table in tables:
+            fn = compression.find_input(source/f"{table}.csv")
+            if fn is not None:
+                found[(source.name, table)] = fn
+    return found
+
+
+def diff(old, new):
+    """Compare the processed tables under 'old' and 'new', which are both
+    table files, source directories or directories of sources.  Yields a
+    TableDiff for each table which differs.
+    """
+    oldfiles = _table_files(old)
+    newfiles = _table_files(new)
+    if pathlib.Path(old).is_file() and pathlib.Path(new).is_file():
+        # Two files are compared with each other whatever their names
+        oldfiles = {key: oldfiles[next(iter(oldfiles))] for key in newfiles}
+    for (source, table) in sorted(set(oldfiles) | set(newfiles),
+                                  key=lambda x: (x[0] or "", x[1])):
+        oldfn = oldfiles.get((source, table))
+        newfn = newfiles.get((source, table))
+        if oldfn is not None and newfn is not None and \
+           oldfn.read_bytes() == newfn.read_bytes():
+            continue
+        olddf = read_table(oldfn) if oldfn is not None else None
+        newdf = read_table(newfn) if newfn is not None else None
+        if olddf is None:
+            olddf = newdf.iloc[:0]
+        if newdf is None:
+            newdf = olddf.iloc[:0]
+        (added, removed, changed) = diff_table(olddf, newdf,
+                                               keys.get(table, []))
+        if len(added) or len(removed) or len(changed):
+            yield TableDiff(source, table, added, removed, changed)
+
+
+def report(diffs, limit=20):
+    """Print a summary of each of 'diffs', listing up to 'limit' rows of
+    each kind.  Returns the number of tables which differ.
+    """
+    count = 0
+    for d in diffs:
+        count += 1
+        key = keys.get(d.table) or list(d.changed.columns[:-3])
+        name = d.table if d.source is None else f"{d.source}/{d.table}"
+        changed_rows = d.changed.drop_duplicates(subset=key)
+        print(f"{name}: {len(d.added)} added, {len(d.removed)} removed, "
+              f"{len(changed_rows)} changed")
+        for (label, rows) in [("+", d.added), ("-", d.removed)]:
+            for rec in rows[key].head(limit).itertuples(index=False):
+                print(f"  {label} {', '.join(rec)}")
+        shown = 0
+        for (rowkey, group) in d.changed.groupby(key, sort=False):
+            if shown == limit:
+                break
+            rowkey = rowkey if isinstance(rowkey, tuple) else (rowkey,)
+            print(f"  ~ {', '.join(rowkey)}")
+            for (col, old, new) in group[["column", "old", "new"]] \
+                    .itertuples(index=False):
+                print(f"      {col}: {old!r} -> {new!r}")
+            shown += 1
+    return count
@@ -0,0 +1,199 @@
+"""Head-to-head records between the clubs of a league.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Some guides print a grid of the games each club of a league won against
+each other club.  The HeadToHead sheet transcribes it with one row per
+club and one column per opponent.  Each league-season and phase becomes
+a HeadToHead: the club labels, and a square array of small integers in
+which wins[i, j] is the number of games club i won from club j.  Entries
+which were not printed, such as the diagonal, are MISSING.
+
+The row sums of the array are the clubs' wins and the column sums their
+losses, so check() compares them with R_W and R_L in the standings for
+all clubs at once.
+"""
+import numpy as np
+import pandas as pd
+
+from . import normalize
+from . import report
+
+
+# Entries of the array which were not printed
+MISSING = -1
+
+_keys = ["league.year", "league.name", "phase.name"]
+
+
+class HeadToHead(object):
+    """The head-to-head grid of one league-season and phase.
+    """
+    def __init__(self, year, league, phase, clubs, wins):
+        self.year = year
+        self.league = league
+        self.phase = phase
+        self.clubs = list(clubs)
+        self.wins = wins
+
+    def _counts(self):
+        return np.where(self.wins == MISSING, 0, self.wins)
+
+    def won(self):
+        """Return the wins of each club over the whole grid.
+        """
+        return self._counts().sum(axis=1)
+
+    def lost(self):
+        """Return the losses of each club over the whole grid.
+        """
+        return self._counts().sum(axis=0)
+
+    def to_matrix(self):
+        """Return the grid as a DataFrame with a row for each club and a
+        column for each opponent.  Entries not printed are null.
+        """
+        return pd.DataFrame(self.wins, index=self.clubs, columns=self.clubs) \
+                 .mask(self.wins == MISSING).astype("Int64") \
+                 .rename_axis(index="entry.name", columns="opponent.name")
+
+    def to_long(self):
+        """Return the grid as a DataFrame with one row for each printed
+        entry, giving the wins 'R_W' of a club against an opponent.
+        """
+        (rows, cols) = np.nonzero(self.wins != MISSING)
+        clubs = np.array(self.clubs, dtype=object)
+        return pd.DataFrame({
+            "league.year":   self.year,
+            "league.name":   self.league,
+            "phase.name":    self.phase,
+            "entry.name":    clubs[rows],
+            "opponent.name": clubs[cols],
+            "R_W":           self.wins[rows, cols],
+        })
+
+    def totals(self):
+        """Return the wins and losses of each club over the grid.
+        """
+        return pd.DataFrame({
+            "league.year": self.year,
+            "league.name": self.league,
+            "phase.name":  self.phase,
+            "entry.name":  self.clubs,
+            "R_W":         self.won(),
+            "R_L":         self.lost(),
+        })
+
+
+def _club_column(df):
+    if "entry.name" in df:
+        return "entry.name"
+    # A few sheets leave the heading of the club column blank
+    return next(col for col in df.columns if col not in _keys)
+
+
+def _label(value):
+    return normalize.normalize_text(str(value))
+
+
+def matrices(df):
+    """Return a HeadToHead for each league-season and phase in 'df', a
+    HeadToHead sheet with its identifying columns standardized.
+    """
+    if df.empty:
+        return []
+    df = df.rename(columns={_club_column(df): "entry.name"})
+    if "phase.name" not in df:
+        df = df.assign(**{"phase.name": "regular"})
+    df = df.assign(**{col: df[col].fillna(method="pad")
+                      for col in ["league.year", "league.name"]})
+    df = df[df["entry.name"].notnull()]
+    opponents = [col for col in df.columns
+                 if col not in _keys + ["entry.name"]]
+    labels = [_label(col) for col in opponents]
+    values = df[opponents].apply(pd.to_numeric, errors="coerce")
+    unreadable = df[opponents].notnull() & values.isnull()
+    if unreadable.to_numpy().any():
+        report.warn(f"HeadToHead entries which are not numbers: "
+                    f"{sorted(set(df[opponents][unreadable].stack()))}",
+                    sheet="HeadToHead")
+    grids = []
+    for (key, rows) in df.groupby(_keys, sort=False).indices.items():
+        clubs = [_label(club) for club in df["entry.name"].iloc[rows]]
+        position = {club: i for (i, club) in enumerate(clubs)}
+        block = values.iloc[rows].to_numpy(dtype=float)
+        printed = ~np.isnan(block)
+        # Opponents are matched to clubs by name; columns which match
+        # no club are left out
+        target = np.array([position.get(label, -1) for label in labels])
+        unmatched = printed.any(axis=0) & (target < 0)
+        if unmatched.any():
+            report.warn(f"HeadToHead columns which are not clubs of "
+                        f"{key[1]} {key[0]}: "
+                        f"{[opponents[i] for i in np.nonzero(unmatched)[0]]}",
+                        sheet="HeadToHead")
+        printed &= (target >= 0)
+        wins = np.full((len(clubs), len(clubs)), MISSING, dtype=np.int16)
+        (i, k) = np.nonzero(printed)
+        wins[i, target[k]] = block[i, k]
+        grids.append(HeadToHead(int(float(key[0])), key[1], key[2],
+                                clubs, wins))
+    return grids
+
+
+def to_long(grids):
+    """Return the long form of all of 'grids' as one DataFrame.
+    """
+    if not grids:
+        return pd.DataFrame(columns=_keys + ["entry.name", "opponent.name",
+                                             "R_W"])
+    return pd.concat([grid.to_long() for grid in grids], ignore_index=True)
+
+
+def check(grids, standings):
+    """Compare the wins and losses of each club in 'grids' with those in
+    'standings', a standings table with standardized columns.  Returns
+    one row per club giving both, with 'disagrees' set where they differ
+    or the club is not in the standings.
+    """
+    columns = _keys + ["entry.name"]
+    if not grids:
+        return pd.DataFrame(columns=columns + ["R_W", "R_W.standings",
+                                               "R_L", "R_L.standings",
+                                               "disagrees"])
+    totals = pd.concat([grid.totals() for grid in grids], ignore_index=True)
+    standings = standings.assign(
+        **{"league.year": pd.to_numeric(standings["league.year"])
+           .astype("Int64"),
+           "entry.name": standings["entry.name"].map(_label,
+                                                     na_action="ignore")}
+    )
+    if "phase.name" not in standings:
+        standings = standings.assign(**{"phase.name": "regular"})
+    standings = standings.assign(
+        **{col: pd.to_numeric(standings[col], errors="coerce")
+           .astype("Int64") if col in standings else pd.NA
+           for col in ["R_W", "R_L"]}
+    )[columns + ["R_W", "R_L"]].drop_duplicates(columns)
+    totals = totals.astype({"league.year": "Int64"})
+    df = totals.merge(standings, how="left", on=columns,
+                      suffixes=("", ".standings"))
+    df["disagrees"] = ((df["R_W"] != df["R_W.standings"]) |
+                       (df["R_L"] != df["R_L.standings"])) \
+        .fillna(True).astype(bool)
+    return df
@@ -0,0 +1,130 @@
+"""Layout of the processed outputs of a source by workbook.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+The tables of a source are written one workbook at a time, after a
+header, so the rows of each workbook are one stretch of the text of
+each table.  When the outputs are written, their layout is recorded:
+for each workbook in turn, the digest of its contents, the summaries of
+its tables, the length of the text of its rows in each table and the
+derived statistics found to differ in them.  With it are kept the
+dtypes the tables were formatted for, the digest of this package's
+code, and the sizes and modification times of the files written.
+
+A layout is used only while the files are as it describes them.  The
+watch command uses it to take the rows of the workbooks which have not
+changed from the outputs, rather than processing them again.  Layouts
+are kept in the cache directory, in their own 'layouts' directory; they
+are small, and are not counted against or evicted with the cached
+sheets.
+"""
+import collections
+import hashlib
+import pathlib
+import pickle
+
+from . import compression
+from . import schema
+from . import sheetcache
+
+
+Entry = collections.namedtuple(
+    "Entry", ["fn", "digest", "assemblers", "lengths", "found"]
+)
+
+_code = None
+
+
+def code_digest():
+    """Return the digest of the code of this package, which determines
+    how workbooks are processed.
+    """
+    global _code
+    if _code is None:
+        digest = hashlib.sha256()
+        for path in sorted(pathlib.Path(__file__).parent.glob("*.py")):
+            digest.update(path.read_bytes())
+        _code = digest.hexdigest()
+    return _code
+
+
+def signature(dtypes):
+    return tuple((col, str(dtype)) for (col, dtype) in dtypes.items())
+
+
+def signatures(entries):
+    """Return the signatures of the dtypes of the tables assembled from
+    the workbooks of 'entries'.
+    """
+    found = []
+    for (i, table) in enumerate(schema.tables):
+        assembler = schema.Assembler(table)
+        for entry in entries:
+            assembler.extend(entry.assemblers[i])
+        found.append(signature(assembler.dtypes()))
+    return found
+
+
+def path(source, root="processed"):
+    """Return the file holding the layout of the outputs of 'source' in
+    'root'.
+    """
+    where = str(pathlib.Path(root, source).resolve())
+    digest = hashlib.sha256(where.encode("utf-8")).hexdigest()
+    return sheetcache.cache_dir()/"layouts"/f"{digest}.layout"
+
+
+def _stamps(source, root):
+    stamps = []
+    for table in schema.tables:
+        fn = compression.find_input(pathlib.Path(root)/source/f"{table}.csv")
+        if fn is None:
+            return None
+        stat = fn.stat()
+        stamps.append((fn.name, stat.st_size, stat.st_mtime_ns))
+    return stamps
+
+
+def record(source, entries, root="processed"):
+    """Record the layout of the outputs of 'source' in 'root', just
+    written from the workbooks of 'entries', in order.
+    """
+    layout = {"code": code_digest(), "stamps": _stamps(source, root),
+              "signatures": signatures(entries), "entries": list(entries)}
+    fn = path(source, root)
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    temp = fn.with_name(fn.name + ".tmp")
+    with temp.open("wb") as f:
+        pickle.dump(layout, f)
+    temp.replace(fn)
+
+
+def load(source, root="processed"):
+    """Return the signatures and entries of the layout of the outputs of
+    'source' in 'root', or None if there is none which still describes
+    them.
+    """
+    try:
+        with path(source, root).open("rb") as f:
+            layout = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if layout["code"] != code_digest() or \
+       layout["stamps"] != _stamps(source, root):
+        return None
+    return (layout["signatures"], layout["entries"])
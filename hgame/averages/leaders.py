@@ -0,0 +1,191 @@
+"""League leaders and recomputation of published ranks.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Any statistic can be ranked within each league-season.  Individuals are
+ranked on their season totals, that is rows with S_STINT of 0 or T, and
+clubs on their standings.  Only rows meeting the qualification rules
+are ranked.  A rule maps a column to a threshold: a whole number is a
+minimum, and a fraction is a share of the largest value of that column
+in the league-season, so that a rule of {"B_AB": 0.6} admits batters
+with at least 60% of the at-bats of the busiest batter.  Innings
+pitched are compared as innings, counting their tenths as thirds.
+
+The guides' own qualification rules are not recorded, so by default
+there is no rule.  Instead, in a league-season for which the guide
+printed ranks, the rows it ranked are taken to be those which qualified,
+and elsewhere every row is ranked.  Where a row has both a printed and
+a recomputed rank, the two are compared and disagreements are flagged.
+"""
+import collections
+import pathlib
+
+import pandas as pd
+
+from . import compression
+from . import derived
+from . import loader
+
+
+Stat = collections.namedtuple(
+    "Stat", ["table", "column", "ascending", "printed", "qualify"]
+)
+
+# Statistics for which the guides published ranks
+stats = {
+    "B_AVG": Stat("playing_individual", "B_AVG", False, "B_AVG_RANK", {}),
+    "P_ERA": Stat("playing_individual", "P_ERA", True, "P_ERA_RANK", {}),
+    "R_PCT": Stat("playing_team", "R_PCT", False, "R_RANK", {}),
+}
+
+# How the values of columns are measured for qualification rules
+_measures = {
+    "P_IP": lambda values: derived.ip_outs(values).astype(float) / 3,
+}
+
+_groups = {
+    "playing_individual": ["league.year", "league.name", "phase.name"],
+    "playing_team":       ["league.year", "league.name", "phase.name",
+                           "division.name"],
+}
+
+_identity = {
+    "playing_individual": ["person.ref", "person.name.last",
+                           "person.name.given", "S_STINT", "entry.name"],
+    "playing_team":       ["entry.name"],
+}
+
+# Rankings already computed, by source and ranking parameters
+_results = {}
+
+
+def get_stat(column, qualify=None):
+    """Return the Stat for ranking 'column', with the qualification
+    rules 'qualify' if given.  Columns without
+    published ranks are ranked from highest to lowest.
+    """
+    stat = stats.get(column)
+    if stat is None:
+        table = "playing_team" if column.startswith("R_") \
+            else "playing_individual"
+        stat = Stat(table, column, False, None, {})
+    if qualify is not None:
+        stat = stat._replace(qualify=dict(qualify))
+    return stat
+
+
+def _columns(stat):
+    columns = _groups[stat.table] + _identity[stat.table] + [stat.column]
+    if stat.printed is not None:
+        columns.append(stat.printed)
+    return columns + [c for c in stat.qualify if c not in columns]
+
+
+def _rank_source(source, stat, method, root):
+    """Return the ranking of 'stat' within the processed tables of
+    'source'.
+    """
+    df = loader.load(source, stat.table, _columns(stat), root=root)
+    if stat.table == "playing_individual":
+        df = df[df["S_STINT"].isin(["0", "T"])]
+    groups = _groups[stat.table]
+    df = df[df[stat.column].notnull()].reset_index(drop=True)
+    for col in groups:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    keys = [df[col].fillna("") for col in groups]
+    qualified = pd.Series(True, index=df.index)
+    for (col, threshold) in stat.qualify.items():
+        values = _measures.get(col, lambda x: x.astype(float))(df[col])
+        if isinstance(threshold, float) and threshold < 1:
+            threshold = values.groupby(keys).transform("max") * threshold
+        qualified &= values >= threshold
+    if stat.printed is not None:
+        printed = df[stat.printed].astype("Int64")
+        if not stat.qualify:
+            ranked = printed.notnull().groupby(keys).transform("any")
+            qualified &= printed.notnull() | ~ranked
+    df["rank"] = df[stat.column].astype(float).where(qualified) \
+        .groupby(keys).rank(method=method, ascending=stat.ascending) \
+        .astype("Int64")
+    if stat.printed is not None:
+        df["disagrees"] = (printed.notnull() & df["rank"].notnull() &
+                           (df["rank"] != printed)).fillna(False) \
+            .astype(bool)
+    else:
+        df["disagrees"] = False
+    return df
+
+
+def _stamp(source, table, root):
+    path = compression.find_input(pathlib.Path(root)/source/f"{table}.csv")
+    return None if path is None else path.stat().st_mtime_ns
+
+
+def rank(column, source=None, qualify=None, method="min", root="processed"):
+    """Return the rows of 'source' (default all) ranked on 'column' within
+    each league-season, with the recomputed 'rank' and a 'disagrees'
+    flag marking rows whose printed rank differs from it.  Rows which do
+    not qualify under the rules 'qualify' are kept without a rank; by
+    default, rows the guide did not rank where it printed ranks.
+    'method' is "min" for competition ranking, in which ties share the
+    best rank and leave a gap, or "dense" for ranking without gaps.
+
+    Rankings are cached per source until its processed files change.
+    """
+    stat = get_stat(column, qualify)
+    if source is None:
+        source = loader.sources(root)
+    elif isinstance(source, str):
+        source = [source]
+    frames = []
+    for name in source:
+        key = (name, stat.table, stat.column, stat.ascending, stat.printed,
+               tuple(sorted(stat.qualify.items())), method, root)
+        stamp = _stamp(name, stat.table, root)
+        if stamp is None:
+            continue
+        cached = _results.get(key)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, _rank_source(name, stat, method, root))
+            _results[key] = cached
+        frames.append(cached[1])
+    if not frames:
+        return pd.DataFrame(columns=["source"] + _columns(stat) +
+                            ["rank", "disagrees"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def leaders(column, source=None, top=10, **kwargs):
+    """Return the 'top' qualified rows on 'column' in each league-season,
+    in order of rank.  Other arguments are as for rank().
+    """
+    df = rank(column, source, **kwargs)
+    stat = get_stat(column)
+    groups = ["source"] + _groups[stat.table]
+    return df[df["rank"] <= top] \
+        .sort_values(groups + ["rank"], kind="stable") \
+        .reset_index(drop=True)
+
+
+def disagreements(column, source=None, **kwargs):
+    """Return the rows whose printed rank on 'column' differs from the
+    recomputed rank.  Arguments are as for rank().
+    """
+    df = rank(column, source, **kwargs)
+    return df[df["disagrees"]].reset_index(drop=True)
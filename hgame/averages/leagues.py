@@ -0,0 +1,227 @@
+"""League-key registry and encyclopedia standings.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+The files in standings/ identify leagues by a key such as '1915-AA',
+while processed tables name leagues in free text as printed in each
+source.  The registry maps every (league.year, league.name) pair found
+in processed/ to a league key.  Keys are taken from the standings files
+where the clubs in the league match those in the encyclopedia; other
+leagues are given a key made from the initials of their name.  Once the
+registry is built, standings and processed rows join on exact keys.
+"""
+import pathlib
+import re
+
+import pandas as pd
+
+from . import loader
+
+
+# Encyclopedia phase codes and the corresponding processed phase.name
+phase_names = {
+    "R": "regular",
+    "W": "final",
+}
+
+_registry_columns = ["league.year", "league.name", "league.key", "matched"]
+
+
+def club_key(name):
+    """Return the key under which a club name is compared: lowercased,
+    with everything but letters and digits removed.
+    """
+    if pd.isnull(name):
+        return name
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def league_initials(name):
+    """Return the initials of a league name, e.g. 'IIIL' for the
+    'Illinois-Indiana-Iowa League'.
+    """
+    return "".join(word[0] for word in re.split(r"[\s\-]+", name)
+                   if word and word[0].isalpha()).upper()
+
+
+def load_standings(root="standings"):
+    """Return all encyclopedia standings as one DataFrame, with the league
+    key split into 'league.year' and 'league.code' and the phase code
+    translated to 'phase.name'.
+    """
+    frames = [pd.read_csv(fn, dtype={"league.key": str, "phase.code": str,
+                                     "entry.name": str})
+              for fn in sorted(pathlib.Path(root).glob("*/*.csv"))]
+    df = pd.concat(frames, ignore_index=True)
+    parts = df["league.key"].str.split("-", n=1, expand=True)
+    df.insert(loc=1, column="league.year", value=parts[0].astype(int))
+    df.insert(loc=2, column="league.code", value=parts[1])
+    df.insert(loc=4, column="phase.name",
+              value=df["phase.code"].map(phase_names))
+    df["club.key"] = df["entry.name"].map(club_key)
+    return df
+
+
+def _league_clubs(root):
+    """Return the set of club keys seen for each (league.year, league.name)
+    in the processed tables.
+    """
+    columns = ["league.year", "league.name", "entry.name"]
+    df = pd.concat([loader.load(table=table, columns=columns, root=root)
+                    for table in ["playing_team", "playing_individual",
+                                  "managing_individual"]],
+                   ignore_index=True)
+    df = df[~df["league.name"].isnull()]
+    df["league.year"] = df["league.year"].astype(int)
+    df["league.name"] = df["league.name"].astype(str)
+    df["club.key"] = df["entry.name"].astype(object).map(club_key)
+    return {key: set(group["club.key"].dropna())
+            for (key, group) in df.groupby(["league.year", "league.name"])}
+
+
+def build_registry(root="processed", standings="standings"):
+    """Build the league registry from the processed tables in 'root' and
+    the encyclopedia standings, and write it to root/leagues.csv.
+    """
+    known = load_standings(standings)
+    known = known[known["phase.code"] == "R"]
+    known = {key: set(group["club.key"])
+             for (key, group) in known.groupby("league.key")}
+    variants = _league_clubs(root)
+
+    # Score every pairing of a league variant with an encyclopedia league
+    # of the same year by the overlap of their clubs, and accept pairings
+    # from the best score down.
+    scores = []
+    for ((year, name), clubs) in variants.items():
+        for (key, keyclubs) in known.items():
+            if not key.startswith(f"{year}-"):
+                continue
+            score = len(clubs & keyclubs) / len(clubs | keyclubs)
+            if score >= 0.3:
+                scores.append((score, year, name, key))
+    registry = {}
+    for (score, year, name, key) in sorted(scores, reverse=True):
+        if (year, name) not in registry:
+            registry[(year, name)] = (key, True)
+
+    # Unmatched variants share a key with any other variant of the same
+    # normalised name in that year, or are given one from their initials.
+    bynorm = {(year, club_key(name)): key
+              for ((year, name), (key, _)) in registry.items()}
+    used = {key for (key, _) in registry.values()}
+    for (year, name) in sorted(variants):
+        if (year, name) in registry:
+            continue
+        norm = (year, club_key(name))
+        if norm not in bynorm:
+            key = f"{year}-{league_initials(name)}"
+            suffix = 2
+            while key in used:
+                key = f"{year}-{league_initials(name)}{suffix}"
+                suffix += 1
+            used.add(key)
+            bynorm[norm] = key
+        registry[(year, name)] = (bynorm[norm], False)
+
+    df = pd.DataFrame([(year, name, key, matched)
+                       for ((year, name), (key, matched))
+                       in sorted(registry.items())],
+                      columns=_registry_columns)
+    df.to_csv(pathlib.Path(root)/"leagues.csv", index=False)
+    return Registry(df)
+
+
+class Registry(object):
+    """Indexed mapping from (league.year, league.name) to league key.
+    """
+    def __init__(self, df):
+        self.df = df
+        self._keys = {(int(year), name): key
+                      for (year, name, key) in
+                      df[["league.year", "league.name",
+                          "league.key"]].itertuples(index=False)}
+
+    @classmethod
+    def load(cls, root="processed"):
+        return cls(pd.read_csv(pathlib.Path(root)/"leagues.csv",
+                               dtype={"league.name": str,
+                                      "league.key": str}))
+
+    def key(self, year, name):
+        """Return the league key for 'name' in 'year', or None.
+        """
+        return self._keys.get((int(year), name))
+
+    def annotate(self, df):
+        """Return 'df' with a 'league.key' column inserted after its
+        'league.name' column.
+        """
+        keys = pd.Series(
+            [self._keys.get((int(year), name))
+             if not pd.isnull(year) else None
+             for (year, name) in zip(df["league.year"], df["league.name"])],
+            index=df.index, dtype=object
+        )
+        df = df.copy()
+        df.insert(loc=df.columns.get_loc("league.name")+1,
+                  column="league.key", value=keys)
+        return df
+
+
+def crosscheck(registry=None, root="processed", standings="standings"):
+    """Compare encyclopedia standings with the team rows of every processed
+    source, returning one row per mismatch in R_W, R_L or R_ATT.
+    """
+    if registry is None:
+        registry = Registry.load(root)
+    known = load_standings(standings)
+    teams = loader.load(table="playing_team",
+                        columns=["league.year", "league.name",
+                                 "entry.name", "phase.name",
+                                 "R_W", "R_L", "R_ATT"],
+                        root=root)
+    teams = teams[~teams["league.year"].isnull()]
+    for col in ["league.name", "entry.name", "phase.name", "source"]:
+        teams[col] = teams[col].astype(object)
+    teams = registry.annotate(teams)
+    teams["club.key"] = teams["entry.name"].map(club_key)
+    # Standings and attendance are on separate rows in processed tables
+    teams = teams.groupby(["source", "league.key", "club.key", "phase.name"],
+                          as_index=False)[["entry.name", "R_W", "R_L",
+                                           "R_ATT"]] \
+                 .first()
+    merged = known.merge(teams, how="inner",
+                         on=["league.key", "club.key", "phase.name"],
+                         suffixes=("", ".source"))
+    mismatches = []
+    for stat in ["R_W", "R_L", "R_ATT"]:
+        differ = merged[~merged[stat].isnull() &
+                        ~merged[f"{stat}.source"].isnull() &
+                        (merged[stat] != merged[f"{stat}.source"])]
+        mismatches.append(
+            pd.DataFrame({"source": differ["source"],
+                          "league.key": differ["league.key"],
+                          "phase.name": differ["phase.name"],
+                          "entry.name": differ["entry.name"],
+                          "stat": stat,
+                          "standings": differ[stat],
+                          "processed": differ[f"{stat}.source"]})
+        )
+    return pd.concat(mismatches, ignore_index=True) \
+             .sort_values(["league.key", "entry.name", "stat", "source"])
@@ -0,0 +1,193 @@
+"""Load processed tables into typed DataFrames.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+"""
+import collections
+import pathlib
+
+import pandas as pd
+
+from . import compression
+from . import coverage
+from . import schema
+from .schema import tables
+
+
+# Text columns with few distinct values are stored as categoricals
+_categorical_columns = ["league.name", "entry.name", "phase.name",
+                        "division.name", "person.bats", "person.throws",
+                        "S_STINT"]
+
+
+def column_dtype(col):
+    """Return the dtype used for column 'col' of a processed table.
+    """
+    if col in _categorical_columns:
+        return "category"
+    return schema.dtype(col)
+
+
+class TableCache(object):
+    """A least-recently-used cache of parsed tables, bounded by the total
+    in-memory size of the tables it holds.
+    """
+    def __init__(self, max_bytes=512*1024*1024):
+        self.max_bytes = max_bytes
+        self._tables = collections.OrderedDict()
+        self._sizes = {}
+
+    @property
+    def size(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        try:
+            df = self._tables[key]
+        except KeyError:
+            return None
+        self._tables.move_to_end(key)
+        return df
+
+    def put(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        self.discard(key)
+        self._tables[key] = df
+        self._sizes[key] = size
+        while self.size > self.max_bytes:
+            (oldest, _) = self._tables.popitem(last=False)
+            del self._sizes[oldest]
+
+    def discard(self, key):
+        self._tables.pop(key, None)
+        self._sizes.pop(key, None)
+
+    def clear(self):
+        self._tables.clear()
+        self._sizes.clear()
+
+
+cache = TableCache()
+
+
+def sources(root="processed"):
+    """Return the names of all processed sources.
+    """
+    return sorted(p.name for p in pathlib.Path(root).iterdir() if p.is_dir())
+
+
+def _read_table(path, columns):
+    """Read the file 'path' with only 'columns', consulting the cache.
+    """
+    key = (str(path), path.stat().st_mtime_ns, columns)
+    df = cache.get(key)
+    if df is None:
+        with compression.open_input(path) as f:
+            header = pd.read_csv(f, nrows=0).columns
+        usecols = [c for c in (columns or header) if c in header]
+        with compression.open_input(path) as f:
+            df = pd.read_csv(f, usecols=usecols,
+                             dtype={c: column_dtype(c) for c in usecols})
+        missing = [c for c in (columns or header) if c not in header]
+        df = df.reindex(columns=list(columns or header)) \
+               .astype({c: object for c in missing}) \
+               .astype({c: column_dtype(c) for c in missing})
+        cache.put(key, df)
+    return df
+
+
+def covered_columns(source=None, table="playing_individual",
+                    root="processed"):
+    """Return the columns of 'table' which have values in any of 'source'
+    (default all), according to their coverage indexes, or None if none
+    of them has one.
+    """
+    return coverage.covered(source, table, root)
+
+
+def _year_range(years):
+    if years is None:
+        return None
+    if isinstance(years, int):
+        return (years, years)
+    return tuple(years)
+
+
+def scan(source=None, table="playing_individual", columns=None, years=None,
+         root="processed"):
+    """Iterate over 'table' from each of 'source', yielding one DataFrame
+    per source.  See load() for the meaning of the arguments.
+    """
+    if table not in tables:
+        raise ValueError(f"Unknown table {table}")
+    if source is None:
+        source = sources(root)
+    elif isinstance(source, str):
+        source = [source]
+    years = _year_range(years)
+    if columns is not None:
+        columns = tuple(columns)
+        if years is not None and "league.year" not in columns:
+            readcols = ("league.year",) + columns
+        else:
+            readcols = columns
+    else:
+        readcols = None
+    for name in source:
+        path = compression.find_input(pathlib.Path(root)/name/f"{table}.csv")
+        if path is None:
+            continue
+        if readcols is None:
+            # Restore any columns pruned from the file
+            full = coverage.full_columns(path)
+            df = _read_table(path, None if full is None else tuple(full))
+        else:
+            df = _read_table(path, readcols)
+        if years is not None:
+            df = df[df["league.year"].between(*years)]
+        df = df.copy() if columns is None else df[list(columns)].copy()
+        df.insert(loc=0, column="source", value=name)
+        yield df
+
+
+def load(source=None, table="playing_individual", columns=None, years=None,
+         root="processed"):
+    """Return the processed 'table' for 'source' as a DataFrame.
+
+    'source' is a source name, a list of them, or None for all sources.
+    Only 'columns' are read if given.  'years' restricts the rows to one
+    season, or to an inclusive (first, last) range of seasons.  Columns
+    are typed according to the processed schema, and a leading 'source'
+    column identifies where each row came from.
+
+    Parsed files are held in an LRU cache, so repeated loads of the
+    same table are served from memory until the file changes.  Tables
+    written pruned are loaded with their full set of columns; passing
+    covered_columns() as 'columns' reads only those with values.
+    """
+    frames = list(scan(source, table, columns, years, root))
+    if not frames:
+        return pd.DataFrame(columns=["source"] +
+                            list(columns or tables[table]))
+    df = pd.concat(frames, ignore_index=True)
+    for col in df.columns:
+        if col in _categorical_columns:
+            df[col] = df[col].astype("category")
+    df["source"] = df["source"].astype("category")
+    return df
@@ -1,8 +1,6 @@
-import click
+import pathlib
 
-from . import process
-from . import tojson
-from . import totoml
+import click
 
 
 @click.group()
@@ -10,20 +8,531 @@ def cli():
     pass
 
 
+def _check_compress(ctx, param, value):
+    from . import compression
+    try:
+        compression.check(value)
+    except ImportError as exc:
+        raise click.BadParameter(str(exc))
+    return value
+
+
+compress_option = click.option(
+    "--compress", type=click.Choice(["gzip", "zstd", "xz"]), default=None,
+    callback=_check_compress,
+    help="Compress output files as they are written."
+)
+
+stable_keys_option = click.option(
+    "--stable-keys", is_flag=True, default=False,
+    help="Qualify person and row keys by workbook, so they are unique "
+         "across all sources."
+)
+
+
+keep_going_option = click.option(
+    "--keep-going", is_flag=True, default=False,
+    help="Record sheets and workbooks which fail, and carry on with the "
+         "rest."
+)
+
+report_option = click.option(
+    "--report", "report_path", type=click.Path(), default=None,
+    help="File for the --keep-going report (default report.csv in the "
+         "output directory)."
+)
+
+_subset_options = [
+    click.option("--league", "leagues", multiple=True,
+                 help="Process only leagues whose names contain this; "
+                      "may be repeated."),
+    click.option("--season", "seasons", type=int, multiple=True,
+                 help="Process only this season; may be repeated."),
+    click.option("--workbook", "workbooks", multiple=True,
+                 help="Process only workbooks with this name or matching "
+                      "this pattern; may be repeated."),
+    click.option("--sheet", "sheets", multiple=True,
+                 help="Process only the sheet with this name; may be "
+                      "repeated."),
+    click.option("--output-dir", type=click.Path(), default=None,
+                 help="Directory to write outputs to (default the current "
+                      "directory, or scratch if any of the options above "
+                      "is given)."),
+]
+
+
+def subset_options(command):
+    for option in reversed(_subset_options):
+        command = option(command)
+    return command
+
+
+def _selection(leagues, seasons, workbooks, sheets, output_dir, name):
+    """Return the Selection given by the subset options, or None if they
+    select everything, and the directory to write output 'name' to.
+    """
+    from . import subset
+    selection = subset.Selection(
+        **{field: list(values) or None for (field, values) in
+           zip(subset.Selection._fields,
+               [leagues, seasons, workbooks, sheets])}
+    )
+    if subset.is_empty(selection):
+        selection = None
+    elif output_dir is None:
+        output_dir = "scratch"
+    root = name if output_dir is None else str(pathlib.Path(output_dir)/name)
+    return (selection, root)
+
+
+def _run(work, keep_going, report_path, default_path):
+    """Call 'work', collecting problems in a report written to
+    'report_path' (or 'default_path') if 'keep_going' is set.  Returns
+    the number of errors recorded.
+    """
+    from . import report
+    if not keep_going:
+        work()
+        return 0
+    collected = report.Report()
+    with report.collecting(collected):
+        work()
+    report_path = report_path or default_path
+    collected.write(report_path)
+    errors = len(collected.errors)
+    print(f"{errors} error(s), {len(collected.problems) - errors} "
+          f"warning(s); report written to {report_path}")
+    for (source, workbook) in collected.failed():
+        print(f"  failed: {source}/{workbook or ''}")
+    return errors
+
+
 @cli.command("csv")
-@click.argument("source")
-def do_csv(source):
-    process.process_source(source)
+@click.argument("sources", nargs=-1, required=True)
+@compress_option
+@stable_keys_option
+@click.option("--update-dataset", is_flag=True, default=False,
+              help="Replace these sources' partitions in the dataset.")
+@click.option("--changes", is_flag=True, default=False,
+              help="Write the rows changed since the last build to "
+                   "processed/SOURCE/changes.")
+@click.option("--prune", is_flag=True, default=False,
+              help="Leave out columns with no values; the full schema is "
+                   "kept in the coverage index.")
+@click.option("--club-ids", is_flag=True, default=False,
+              help="Add a club.id column from the club index in "
+                   "processed/clubs.csv.")
+@keep_going_option
+@report_option
+@subset_options
+def do_csv(sources, compress, stable_keys, update_dataset, changes, prune,
+           club_ids, keep_going, report_path, **subset):
+    from . import clubs
+    from . import dataset
+    from . import process
+
+    (selection, root) = _selection(name="processed", **subset)
+    if update_dataset and selection is not None:
+        raise click.UsageError("--update-dataset cannot be used with a "
+                               "subset of the sources.")
+
+    index = clubs.ClubIndex.load() if club_ids else None
+
+    def work():
+        for source in sources:
+            process.process_source(source, compress, changes, stable_keys,
+                                   selection, root, prune, index)
+    try:
+        errors = _run(work, keep_going, report_path,
+                      str(pathlib.Path(root)/"report.csv"))
+    except process.ColumnTypeError as exc:
+        print("ERROR: %s" % exc)
+        raise SystemExit(1)
+    if update_dataset:
+        dataset.build(list(sources), compress)
+    if errors:
+        raise SystemExit(1)
 
 
 @cli.command("json")
 @click.argument("source")
-def do_json(source):
-    tojson.main(source)
+@compress_option
+@stable_keys_option
+@keep_going_option
+@report_option
+@subset_options
+def do_json(source, compress, stable_keys, keep_going, report_path,
+            **subset):
+    from . import tojson
+    (selection, root) = _selection(name="json", **subset)
+    if _run(lambda: tojson.main(source, compress, stable_keys,
+                                selection, root),
+            keep_going, report_path, str(pathlib.Path(root)/"report.csv")):
+        raise SystemExit(1)
 
 
 @cli.command("toml")
 @click.argument("source")
-def do_toml(source):
-    totoml.main(source)
+@compress_option
+@stable_keys_option
+@keep_going_option
+@report_option
+@subset_options
+def do_toml(source, compress, stable_keys, keep_going, report_path,
+            **subset):
+    from . import totoml
+    (selection, root) = _selection(name="toml", **subset)
+    if _run(lambda: totoml.main(source, compress, stable_keys,
+                                selection, root),
+            keep_going, report_path, str(pathlib.Path(root)/"report.csv")):
+        raise SystemExit(1)
+
+
+@cli.command("dataset")
+@click.argument("sources", nargs=-1)
+@compress_option
+def do_dataset(sources, compress):
+    """Build the partitioned dataset from processed SOURCES (default all).
+    """
+    from . import dataset
+    dataset.build(list(sources) or None, compress)
+
+
+@cli.command("catalog")
+def do_catalog():
+    """Catalogue the workbooks in processed/catalog.csv, reading only
+    those which have changed.
+    """
+    from . import catalog
+    (df, count) = catalog.build()
+    print(f"{len(df)} workbooks catalogued, {count} read")
+
+
+@cli.command("coverage")
+@click.argument("sources", nargs=-1)
+@click.option("--table", type=click.Choice(["playing_individual",
+                                            "managing_individual",
+                                            "playing_team"]),
+              default="playing_individual", show_default=True)
+@click.option("--empty", is_flag=True, default=False,
+              help="List only the columns with no values.")
+def do_coverage(sources, table, empty):
+    """Show the number of values in each column of TABLE in processed
+    SOURCES (default all).
+    """
+    from . import coverage
+    df = coverage.index(list(sources) or None, table)
+    if df.empty:
+        print("No coverage recorded; rebuild the sources with 'csv'.")
+        return
+    df = df.pivot(index="column", columns="source", values="count") \
+           .reindex(df["column"].drop_duplicates())
+    df["total"] = df.sum(axis=1)
+    if empty:
+        df = df[df["total"] == 0]
+    print(df.to_string())
+
+
+@cli.command("check-derived")
+@click.argument("sources", nargs=-1)
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the differences to this CSV file.")
+def do_check_derived(sources, output):
+    """Compare printed averages, percentages and ERAs in SOURCES (default
+    all) with their values recomputed from components.
+    """
+    import pandas as pd
+
+    from . import derived
+    from . import loader
+    identity = ["source", "league.year", "league.name", "phase.name",
+                "person.ref", "person.name.last", "S_STINT", "entry.name"]
+    df = pd.concat([derived.deltas(loader.load(list(sources) or None, table),
+                                   identity)
+                    for table in ["playing_individual", "playing_team"]],
+                   ignore_index=True)
+    if output is not None:
+        df.to_csv(output, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command("diff")
+@click.argument("old", type=click.Path(exists=True))
+@click.argument("new", type=click.Path(exists=True))
+@click.option("--limit", type=int, default=20, show_default=True,
+              help="Rows of each kind to list per table.")
+def do_diff(old, new, limit):
+    """Report rows added, removed and changed between processed tables
+    OLD and NEW.  Exits with status 1 if they differ.
+    """
+    from . import diff
+    if diff.report(diff.diff(old, new), limit):
+        raise SystemExit(1)
+
+
+def _parse_rule(ctx, param, value):
+    rules = {}
+    for rule in value:
+        (col, _, threshold) = rule.partition("=")
+        try:
+            rules[col] = float(threshold) if "." in threshold \
+                else int(threshold)
+        except ValueError:
+            raise click.BadParameter(f"{rule} is not COLUMN=THRESHOLD")
+    return rules if value else None
+
+
+@cli.command("leaders")
+@click.argument("column")
+@click.argument("sources", nargs=-1)
+@click.option("--top", type=int, default=10, show_default=True,
+              help="Leaders to list per league-season.")
+@click.option("--qualify", multiple=True, callback=_parse_rule,
+              metavar="COLUMN=THRESHOLD",
+              help="Qualification rule replacing the rows ranked in the "
+                   "guide; a fraction is a share of the league-season "
+                   "maximum.")
+@click.option("--dense", is_flag=True, default=False,
+              help="Rank ties without gaps.")
+@click.option("--disagreements", is_flag=True, default=False,
+              help="List rows whose printed rank differs instead.")
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the rows to this CSV file.")
+def do_leaders(column, sources, top, qualify, dense, disagreements, output):
+    """List leaders in COLUMN for each league-season in SOURCES (default
+    all), or check printed ranks against recomputed ones.
+    """
+    from . import leaders
+    kwargs = {"qualify": qualify, "method": "dense" if dense else "min"}
+    if disagreements:
+        df = leaders.disagreements(column, list(sources) or None, **kwargs)
+    else:
+        df = leaders.leaders(column, list(sources) or None, top, **kwargs)
+    if output is not None:
+        df.to_csv(output, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command("head-to-head")
+@click.argument("sources", nargs=-1, required=True)
+@click.option("--matrix", is_flag=True, default=False,
+              help="Show each league-season as a matrix of wins.")
+@click.option("--check", is_flag=True, default=False,
+              help="List clubs whose wins and losses differ from the "
+                   "standings instead.")
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the rows to this CSV file.")
+def do_head_to_head(sources, matrix, check, output):
+    """List head-to-head records in SOURCES, or check them against the
+    standings.
+    """
+    import pandas as pd
+
+    from . import headtohead
+    from . import process
+    grids = []
+    checks = []
+    for source in sources:
+        for fn in process.source_workbooks(source):
+            book = process.Workbook(fn)
+            found = headtohead.matrices(book.head_to_head)
+            grids.extend(found)
+            if check and found:
+                df = headtohead.check(found, book._team_standings)
+                df.insert(loc=0, column="source", value=source)
+                checks.append(df[df["disagrees"]])
+    if check:
+        df = pd.concat(checks, ignore_index=True) if checks \
+            else headtohead.check([], None)
+    elif matrix and output is None:
+        for grid in grids:
+            print(f"{grid.year} {grid.league} ({grid.phase})")
+            print(grid.to_matrix().to_string())
+            print()
+        return
+    elif matrix:
+        df = pd.concat([grid.to_matrix().reset_index()
+                        .assign(**{"league.year": grid.year,
+                                   "league.name": grid.league,
+                                   "phase.name": grid.phase})
+                        for grid in grids], ignore_index=True)
+        df = df[["league.year", "league.name", "phase.name"] +
+                [col for col in df.columns if col not in
+                 ["league.year", "league.name", "phase.name"]]]
+    else:
+        df = headtohead.to_long(grids)
+    if output is not None:
+        df.to_csv(output, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command("roster")
+@click.argument("date")
+@click.argument("sources", nargs=-1)
+@click.option("--club", default=None,
+              help="List only this club (default all).")
+@click.option("--league", default=None,
+              help="List only clubs in this league (default all).")
+@click.option("--managers", is_flag=True, default=False,
+              help="List managers instead of players.")
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the rows to this CSV file.")
+def do_roster(date, sources, club, league, managers, output):
+    """List the players (or managers) with clubs on DATE, given as
+    YYYY-MM-DD, in SOURCES (default all).
+    """
+    from . import rosters
+    table = "managing_individual" if managers else "playing_individual"
+    index = rosters.build(list(sources) or None, table)
+    df = rosters.format_days(index.on(date, club, league))
+    if output is not None:
+        df.to_csv(output, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command("check-tenures")
+@click.argument("sources", nargs=-1)
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the overlapping tenures to this CSV file.")
+def do_check_tenures(sources, output):
+    """List managers in SOURCES (default all) whose tenures overlap that
+    of an earlier manager of the same club.
+    """
+    from . import rosters
+    index = rosters.build(list(sources) or None, "managing_individual")
+    df = rosters.format_days(rosters.overlapping_tenures(index))
+    if output is not None:
+        df.to_csv(output, index=False)
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command("leagues")
+def do_leagues():
+    """Build the league-key registry in processed/leagues.csv.
+    """
+    from . import leagues
+    registry = leagues.build_registry()
+    print(f"{len(registry.df)} league-seasons, "
+          f"{registry.df['matched'].sum()} matched to standings")
+
+
+@cli.command("clubs")
+@click.option("--overrides", type=click.Path(), default="club_overrides.csv",
+              show_default=True,
+              help="Curated club ids overriding the clustering.")
+def do_clubs(overrides):
+    """Build the club index in processed/clubs.csv.
+    """
+    from . import clubs
+    index = clubs.build_index(overrides=overrides)
+    print(f"{len(index.df)} club names, "
+          f"{index.df['club.id'].nunique()} clubs")
+
+
+@cli.command("check-standings")
+@click.option("--output", type=click.Path(), default=None,
+              help="Write mismatches to this CSV file.")
+def do_check_standings(output):
+    """Cross-check processed team records against encyclopedia standings.
+    """
+    from . import leagues
+    mismatches = leagues.crosscheck()
+    if output is not None:
+        mismatches.to_csv(output, index=False)
+    else:
+        print(mismatches.to_string(index=False))
+
+
+@cli.command("watch")
+@click.argument("sources", nargs=-1)
+@compress_option
+@click.option("--poll", is_flag=True, default=False,
+              help="Poll for changes instead of using inotify.")
+def do_watch(sources, compress, poll):
+    """Reprocess workbooks in SOURCES (default all) as they are saved.
+    """
+    from . import watch
+    try:
+        watch.watch(list(sources), compress, poll)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command("check-readers")
+@click.argument("sources", nargs=-1)
+@click.option("--reader", default="calamine", show_default=True,
+              help="Reader to compare with the xlrd reader.")
+@click.option("--output", type=click.Path(), default=None,
+              help="Write the differences to this CSV file.")
+def do_check_readers(sources, reader, output):
+    """Check that READER reads every sheet of the workbooks in SOURCES
+    (default all) as the xlrd reader does.
+    """
+    import pandas as pd
+    from . import process
+    from . import readers
+    if not sources:
+        sources = sorted(p.name for p in pathlib.Path("transcript").iterdir()
+                         if p.is_dir())
+    records = []
+    for source in sources:
+        for fn in process.source_workbooks(source):
+            for (sheet, dtype, difference) in \
+                    readers.compare(fn, "xlrd", reader):
+                records.append((fn, sheet, "str" if dtype else "",
+                                difference))
+    df = pd.DataFrame(records,
+                      columns=["workbook", "sheet", "dtype", "difference"])
+    if output is not None:
+        df.to_csv(output, index=False)
+    elif df.empty:
+        print("No differences")
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.group("cache")
+def cache():
+    """Manage the cache of parsed worksheets.
+    """
+    pass
+
+
+@cache.command("clear")
+def do_cache_clear():
+    from . import sheetcache
+    sheetcache.clear()
+
+
+@cache.command("stats")
+def do_cache_stats():
+    from . import sheetcache
+    stats = sheetcache.stats()
+    print(f"Directory:  {stats['directory']}")
+    print(f"Workbooks:  {stats['workbooks']}")
+    print(f"Sheets:     {stats['sheets']}")
+    print(f"Size:       {stats['bytes'] / 1024**2:.1f} MB "
+          f"(limit {stats['max_bytes'] / 1024**2:.0f} MB)")
+
 
+@cli.command("serve")
+@click.option("--host", default="127.0.0.1", show_default=True,
+              help="Address to listen on.")
+@click.option("--port", type=int, default=8000, show_default=True,
+              help="Port to listen on.")
+@click.option("--reload-interval", type=float, default=2.0,
+              show_default=True,
+              help="Seconds between checks for changed processed files.")
+def do_serve(host, port, reload_interval):
+    """Answer JSON queries over the processed tables on local HTTP.
+    """
+    from . import serve
+    try:
+        serve.serve(host, port, interval=reload_interval)
+    except KeyboardInterrupt:
+        pass
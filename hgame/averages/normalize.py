@@ -0,0 +1,96 @@
+"""Normalisation of text in names of people, clubs and leagues.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Characters introduced by word processors and spreadsheets, and their
+# plain equivalents.  Characters mapped to None are removed.
+_translations = {
+    0x2018: "'",     # left single quotation mark
+    0x2019: "'",     # right single quotation mark
+    0x201A: "'",     # single low-9 quotation mark
+    0x2032: "'",     # prime
+    0x201C: '"',     # left double quotation mark
+    0x201D: '"',     # right double quotation mark
+    0x201E: '"',     # double low-9 quotation mark
+    0x2033: '"',     # double prime
+    0x2010: "-",     # hyphen
+    0x2011: "-",     # non-breaking hyphen
+    0x2013: "-",     # en dash
+    0x00A0: " ",     # non-breaking space
+    0x2007: " ",     # figure space
+    0x202F: " ",     # narrow non-breaking space
+    0x00AD: None,    # soft hyphen
+    0x200B: None,    # zero width space
+    0x200C: None,    # zero width non-joiner
+    0x200D: None,    # zero width joiner
+    0xFEFF: None,    # byte order mark
+}
+
+_table = str.maketrans(_translations)
+
+
+def normalize_text(text):
+    """Return 'text' with typographic characters replaced by their plain
+    equivalents, leading and trailing whitespace removed, and internal
+    runs of whitespace collapsed to a single space.  Returns None if
+    nothing remains.
+    """
+    return " ".join(text.translate(_table).split()) or None
+
+
+def normalize_series(values):
+    """Normalise the strings in the Series 'values'; other entries are
+    left unchanged.  Each distinct string is normalised once.  Returns the
+    normalised Series and the number of entries changed.
+    """
+    array = values.to_numpy(dtype=object)
+    isstr = np.fromiter((isinstance(v, str) for v in array),
+                        dtype=bool, count=len(array))
+    if not isstr.any():
+        return values, 0
+    strings = array[isstr]
+    mapping = {text: normalize_text(text) for text in pd.unique(strings)}
+    normalized = np.array([mapping[text] for text in strings], dtype=object)
+    changed = int((normalized != strings).sum())
+    if not changed:
+        return values, 0
+    array = array.copy()
+    array[isstr] = normalized
+    return pd.Series(array, index=values.index, name=values.name), changed
+
+
+def is_name_column(col):
+    """Return True if the raw sheet column 'col' holds names of people,
+    clubs or leagues.
+    """
+    return isinstance(col, str) and col.startswith("name")
+
+
+def normalize_names(df):
+    """Normalise every name column of the raw sheet 'df' in place.
+    Returns the total number of cells changed.
+    """
+    total = 0
+    for col in [c for c in df.columns if is_name_column(c)]:
+        (df[col], changed) = normalize_series(df[col])
+        total += changed
+    return total
@@ -20,67 +20,86 @@ Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
 import sys
 import os
 import glob
+import collections
+import contextlib
+import functools
 import logging
+import tempfile
 
-import xlrd
 import pandas as pd
-import damm
+
+from . import changefeed
+from . import compression
+from . import coverage
+from . import derived
+from . import layout
+from . import normalize
+from . import readers
+from . import refs
+from . import report
+from . import schema
+from . import sheetcache
+from . import stints
+from . import subset
+
+
+class ColumnTypeError(ValueError):
+    """A value in a column of whole numbers is not a whole number.  The
+    row is not given, as the tables are checked only once their sheets
+    have been combined.
+    """
+    def __init__(self, column, value, message):
+        super().__init__("In de-floating column '%s', value %r: %s" %
+                         (column, value, message))
+        self.column = column
+        self.value = value
+
+
+def reads_sheet(sheet, columns=('league.year',)):
+    """Decorate a method reading 'sheet'.  If the workbook's selection
+    leaves out 'sheet', it is treated as missing, with 'columns', without
+    being read.  While a report is active, a failure is recorded in it
+    and the sheet is likewise treated as missing.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self):
+            if subset.selects_sheet(self.selection, sheet):
+                with report.isolating(workbook=self.fn, sheet=sheet):
+                    return method(self)
+            return pd.DataFrame(columns=list(columns))
+        return wrapper
+    return decorate
 
 
 class Workbook(object):
     """Encapsulates access to a statistics workbook.
     """
-    def __init__(self, fn):
+    def __init__(self, fn, stable_keys=False, selection=None):
         self.fn = fn
-
-    @staticmethod
-    def _standardize_columns(dataframe, columns):
-        for col in columns:
-            if col not in dataframe:
-                dataframe[col] = None
-        return dataframe[columns]
-
-    @staticmethod
-    def _compute_stints(multiclub, g_label):
-        clubs = pd.melt(multiclub[['person.ref'] +
-                                  [x for x in multiclub.columns
-                                   if x.startswith("nameClub")]],
-                        id_vars='person.ref')
-        clubs = clubs[~clubs['value'].isnull()]
-        clubs[g_label] = clubs['value'].apply(lambda x:
-                                              x.split("@")[0]
-                                              if "@" in x else None)
-        clubs['value'] = clubs['value'].str.split("@").str[-1]
-        clubs['S_STINT'] = clubs['variable'].str[-1]
-        clubs = clubs[['person.ref', 'value', 'S_STINT', g_label]]
-        clubs.columns = ['person.ref', 'nameClub1', 'S_STINT', g_label]
-        return clubs
-
-    @staticmethod
-    def _clear_spurious_blanks(df):
-        for col in df.columns:
-            if col.startswith("name"):
-                try:
-                    df[col] = df[col].str.strip().replace("", None)
-                except AttributeError:
-                    print(f"WARNING: Unable to clean data in column {col}")
+        self.book = refs.workbook_id(fn) if stable_keys else None
+        self.selection = selection
+
+    def _normalize_names(self, df, sheet):
+        changed = normalize.normalize_names(df)
+        if changed:
+            logging.info("  %s: normalized %d cells in %s" %
+                         (self.fn, changed, sheet))
         return df
 
-
     @property
+    @reads_sheet('Batting')
     def individual_batting(self):
         """Return a DataFrame containing data from the Batting sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Batting',
-                               dtype={'nameFirst': str,
-                                      'nameClub2': str})
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='Batting',
+                                       dtype={'nameFirst': str,
+                                              'nameClub2': str})
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = self._clear_spurious_blanks(df)
-        df['person.ref'] = ((~df['nameLast'].isnull()).cumsum().
-                            apply(lambda x: 'B%04d%d' %
-                                  (x, damm.encode("%04d" % x))))
+        df = self._normalize_names(df, 'Batting')
+        df['person.ref'] = refs.sheet_refs(df, 'Batting', self.book)
         df = df.rename(columns={'nameClub': 'nameClub1'})
         if 'S_STINT' not in df:
             if 'nameClub2' in df:
@@ -90,11 +109,11 @@ class Workbook(object):
             else:
                 df['S_STINT'] = '0'
             multiclub = df[df['S_STINT'] == 'T']
-            clubs = self._compute_stints(multiclub, 'G')
+            clubs = stints.expand_stints(multiclub, 'G')
             df = pd.concat([df, clubs], sort=False, ignore_index=True)
         df = df.assign(year=df['year'].fillna(method='pad'),
                        nameLeague=df['nameLeague'].fillna(method='pad')) \
-               .sort_values(['person.ref', 'S_STINT'])
+               .pipe(stints.sort_stints)
         for col in ['nameLast', 'nameFirst', 'phase.name', 'bats']:
             if col in df:
                 df[col] = df.groupby('person.ref')[col] \
@@ -131,53 +150,21 @@ class Workbook(object):
                                    if 0 < len(x[col]) < 8
                                    else x[col], axis=1)
 
-        return df.rename(columns={'year':         'league.year',
-                                  'nameLeague':   'league.name',
-                                  'nameClub1':    'entry.name',
-                                  'nameLast':     'person.name.last',
-                                  'nameFirst':    'person.name.given',
-                                  'bats':         'person.bats',
-                                  'dateFirst':    'S_FIRST',
-                                  'dateLast':     'S_LAST',
-                                  'G':            'B_G',
-                                  'AB':           'B_AB',
-                                  'R':            'B_R',
-                                  'ER':           'B_ER',
-                                  'H':            'B_H',
-                                  'TB':           'B_TB',
-                                  'H1B':          'B_1B',
-                                  'H2B':          'B_2B',
-                                  'H3B':          'B_3B',
-                                  'HR':           'B_HR',
-                                  'RBI':          'B_RBI',
-                                  'BB':           'B_BB',
-                                  'IBB':          'B_IBB',
-                                  'SO':           'B_SO',
-                                  'GDP':          'B_GDP',
-                                  'HP':           'B_HP',
-                                  'SH':           'B_SH',
-                                  'SF':           'B_SF',
-                                  'SB':           'B_SB',
-                                  'CS':           'B_CS',
-                                  'AVG':          'B_AVG',
-                                  'AVG_RANK':     'B_AVG_RANK'})
+        return schema.standardize(df, 'Batting')
 
     @property
+    @reads_sheet('Pitching')
     def individual_pitching(self):
         """Return a DataFrame containing data from the Pitching sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Pitching',
-                               dtype={'nameFirst': str,
-                                      'nameClub2': str})
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='Pitching',
+                                       dtype={'nameFirst': str,
+                                              'nameClub2': str})
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = self._clear_spurious_blanks(df)
-        df['person.ref'] = (
-            (~df['nameLast'].isnull()).cumsum()
-            .apply(lambda x: 'P%04d%d' %
-                   (1000+x, damm.encode("%04d" % (1000+x))))
-        )
+        df = self._normalize_names(df, 'Pitching')
+        df['person.ref'] = refs.sheet_refs(df, 'Pitching', self.book)
         df = df.rename(columns={'nameClub': 'nameClub1'})
         if 'S_STINT' not in df:
             if 'nameClub2' in df:
@@ -187,69 +174,32 @@ class Workbook(object):
             else:
                 df['S_STINT'] = '0'
             multiclub = df[df['S_STINT'] == 'T']
-            clubs = self._compute_stints(multiclub, 'GP')
+            clubs = stints.expand_stints(multiclub, 'GP')
             df = pd.concat([df, clubs], sort=False, ignore_index=True)
         df['year'] = df['year'].fillna(method='pad')
         df['nameLeague'] = df['nameLeague'].fillna(method='pad')
-        df = df.sort_values(['person.ref', 'S_STINT'])
+        df = stints.sort_stints(df)
         for col in ['nameLast', 'nameFirst', 'phase.name', 'throws']:
             if col in df:
                 df[col] = df.groupby('person.ref')[col] \
                             .fillna(method='backfill')
         df.loc[df['S_STINT'] == 'T', 'nameClub1'] = None
         df['F_P_POS'] = 1
-        return df.rename(columns={'year':         'league.year',
-                                  'nameLeague':   'league.name',
-                                  'nameClub1':    'entry.name',
-                                  'nameLast':     'person.name.last',
-                                  'nameFirst':    'person.name.given',
-                                  'throws':       'person.throws',
-                                  'GP':           'P_G',
-                                  'GS':           'P_GS',
-                                  'CG':           'P_CG',
-                                  'SHO':          'P_SHO',
-                                  'GF':           'P_GF',
-                                  'TO':           'P_TO',
-                                  'W':            'P_W',
-                                  'L':            'P_L',
-                                  'T':            'P_T',
-                                  'SV':           'P_SV',
-                                  'PCT':          'P_PCT',
-                                  'IP':           'P_IP',
-                                  'AB':           'P_AB',
-                                  'H':            'P_H',
-                                  'R':            'P_R',
-                                  'ER':           'P_ER',
-                                  'HR':           'P_HR',
-                                  'BB':           'P_BB',
-                                  'IBB':          'P_IBB',
-                                  'SO':           'P_SO',
-                                  'HB':           'P_HP',
-                                  'SH':           'P_SH',
-                                  'SF':           'P_SF',
-                                  'WP':           'P_WP',
-                                  'ERA':          'P_ERA',
-                                  'BK':           'P_BK',
-                                  'SB':           'P_SB',
-                                  'AVG':          'P_AVG',
-                                  'ERA_RANK':     'P_ERA_RANK'})
+        return schema.standardize(df, 'Pitching')
 
     @property
+    @reads_sheet('Fielding')
     def individual_fielding(self):
         """Return a DataFrame containing data from the Fielding sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Fielding',
-                               dtype={'nameFirst': str,
-                                      'nameClub2': str})
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='Fielding',
+                                       dtype={'nameFirst': str,
+                                              'nameClub2': str})
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = self._clear_spurious_blanks(df)
-        df['person.ref'] = (
-            (~df['nameLast'].isnull()).cumsum()
-            .apply(lambda x: 'F%04d%d' %
-                   (2000+x, damm.encode("%04d" % (2000+x))))
-        )
+        df = self._normalize_names(df, 'Fielding')
+        df['person.ref'] = refs.sheet_refs(df, 'Fielding', self.book)
         df = df.rename(columns={'nameClub': 'nameClub1'})
         if 'S_STINT' not in df:
             if 'nameClub2' in df:
@@ -259,11 +209,11 @@ class Workbook(object):
             else:
                 df['S_STINT'] = '0'
             multiclub = df[df['S_STINT'] == 'T']
-            clubs = self._compute_stints(multiclub, 'G')
+            clubs = stints.expand_stints(multiclub, 'G')
             df = pd.concat([df, clubs], sort=False, ignore_index=True)
         df['year'] = df['year'].fillna(method='pad')
         df['nameLeague'] = df['nameLeague'].fillna(method='pad')
-        df = df.sort_values(['person.ref', 'S_STINT'])
+        df = stints.sort_stints(df)
         for col in ['nameLast', 'nameFirst', 'Pos', 'phase.name', 'throws']:
             if col in df:
                 df[col] = df.groupby('person.ref')[col] \
@@ -288,96 +238,32 @@ class Workbook(object):
         melted = melted.pivot(columns='variable',
                               values='value', index='rowid')
         df = pd.merge(df, melted, left_on='rowid', right_index=True)
-        return df.rename(columns={'year':         'league.year',
-                                  'nameLeague':   'league.name',
-                                  'nameClub1':    'entry.name',
-                                  'nameLast':     'person.name.last',
-                                  'nameFirst':    'person.name.given',
-                                  'throws':       'person.throws'})
+        return schema.standardize(df, 'Fielding', stats=False)
 
     @property
     def individual_playing(self):
         """Return a DataFrame containing all individual playing data.
         """
-        df = pd.concat([self.individual_batting,
-                        self.individual_pitching,
-                        self.individual_fielding],
-                       sort=False, ignore_index=True)
-        if 'phase.name' not in df:
-            df['phase.name'] = 'regular'
+        df = schema.assemble([self.individual_batting,
+                              self.individual_pitching,
+                              self.individual_fielding],
+                             'playing_individual')
         df['phase.name'] = df['phase.name'].fillna('regular')
-        cols = [
-            'league.year', 'league.name',
-            'person.ref',
-            'person.name.last', 'person.name.given',
-            'person.bats', 'person.throws',
-            'phase.name', 'S_STINT', 'entry.name',
-            'S_FIRST', 'S_LAST',
-            'B_G', 'B_AB', 'B_R', 'B_ER', 'B_H', 'B_TB',
-            'B_1B', 'B_2B', 'B_3B', 'B_HR', 'B_RBI',
-            'B_BB', 'B_IBB', 'B_SO', 'B_GDP', 'B_HP', 'B_SH', 'B_SF',
-            'B_SB', 'B_CS',
-            'B_AVG', 'B_AVG_RANK',
-            'P_G', 'P_GS', 'P_CG', 'P_SHO', 'P_TO', 'P_GF',
-            'P_W', 'P_L', 'P_T', 'P_PCT', 'P_SV',
-            'P_IP', 'P_TBF', 'P_AB', 'P_R', 'P_ER', 'P_H',
-            'P_HR', 'P_BB', 'P_IBB', 'P_SO', 'P_HP', 'P_SH',
-            'P_WP', 'P_BK', 'P_SB',
-            'P_ERA', 'P_ERA_RANK', 'P_AVG',
-            'F_1B_POS', 'F_1B_G', 'F_1B_TC', 'F_1B_PO', 'F_1B_A', 'F_1B_E',
-            'F_1B_DP', 'F_1B_TP', 'F_1B_PCT',
-            'F_2B_POS', 'F_2B_G', 'F_2B_TC', 'F_2B_PO', 'F_2B_A', 'F_2B_E',
-            'F_2B_DP', 'F_2B_TP', 'F_2B_PCT',
-            'F_3B_POS', 'F_3B_G', 'F_3B_TC', 'F_3B_PO', 'F_3B_A', 'F_3B_E',
-            'F_3B_DP', 'F_3B_TP', 'F_3B_PCT',
-            'F_SS_POS', 'F_SS_G', 'F_SS_TC', 'F_SS_PO', 'F_SS_A', 'F_SS_E',
-            'F_SS_DP', 'F_SS_TP', 'F_SS_PCT',
-            'F_OF_POS', 'F_OF_G', 'F_OF_TC', 'F_OF_PO', 'F_OF_A', 'F_OF_E',
-            'F_OF_DP', 'F_OF_TP', 'F_OF_PCT',
-            'F_LF_POS', 'F_LF_G', 'F_LF_TC', 'F_LF_PO', 'F_LF_A', 'F_LF_E',
-            'F_LF_DP', 'F_LF_TP', 'F_LF_PCT',
-            'F_CF_POS', 'F_CF_G', 'F_CF_TC', 'F_CF_PO', 'F_CF_A', 'F_CF_E',
-            'F_CF_DP', 'F_CF_TP', 'F_CF_PCT',
-            'F_RF_POS', 'F_RF_G', 'F_RF_TC', 'F_RF_PO', 'F_RF_A', 'F_RF_E',
-            'F_RF_DP', 'F_RF_TP', 'F_RF_PCT',
-            'F_C_POS', 'F_C_G', 'F_C_INN',
-            'F_C_TC', 'F_C_PO', 'F_C_A', 'F_C_E',
-            'F_C_DP', 'F_C_TP', 'F_C_PB', 'F_C_SB', 'F_C_CS', 'F_C_PCT',
-            'F_P_POS', 'F_P_G', 'F_P_TC', 'F_P_PO', 'F_P_A', 'F_P_E',
-            'F_P_DP', 'F_P_TP', 'F_P_PCT',
-            'F_ALL_G', 'F_ALL_TC', 'F_ALL_PO', 'F_ALL_A', 'F_ALL_E',
-            'F_ALL_DP', 'F_ALL_TP', 'F_ALL_PCT'
-        ]
         for col in ['person.name.last', 'person.name.given']:
-            if col not in df:
-                df[col] = None
             df[col] = df[col].fillna("")
-            df[col] = df[col].str.replace(chr(8220), '"')
-            df[col] = df[col].str.replace(chr(8221), '"')
-            df[col] = df[col].str.replace(chr(8217), "'")
-
-        return self._standardize_columns(df, cols)
-
-    _individual_managing_columns = [
-        'league.year', 'league.name', 'phase.name',
-        'entry.name', 'seq', 'person.ref',
-        'person.name.last', 'person.name.given',
-        'S_FIRST', 'S_LAST'
-    ]
+        return df
 
     @property
+    @reads_sheet('Managing', schema.tables['managing_individual'])
     def individual_managing(self):
         """Return a DataFrame containing data from the Managing sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Managing')
-        except xlrd.biffh.XLRDError:
-            return pd.DataFrame(columns=self._individual_managing_columns)
-        df['person.ref'] = ((~df['nameLast'].isnull())
-                            .cumsum()
-                            .apply(lambda x:
-                                   'M%04d%d' %
-                                   (9000+x, damm.encode("%04d" % (9000+x)))))
+            df = sheetcache.read_excel(self.fn, sheet_name='Managing')
+        except readers.SheetNotFound:
+            return pd.DataFrame(columns=schema.tables['managing_individual'])
+        df = self._normalize_names(df, 'Managing')
+        df['person.ref'] = refs.sheet_refs(df, 'Managing', self.book)
         # These are captured as YYYYMMDD - make sure they are treated as
         # strings and not floats
         for col in ['dateFirst', 'dateLast']:
@@ -389,167 +275,96 @@ class Workbook(object):
                                    str(int(x['year']))+x[col].rjust(4, '0')
                                    if 0 < len(x[col]) < 8
                                    else x[col], axis=1)
-        df = df.rename(columns={'year':          'league.year',
-                                'nameLeague':    'league.name',
-                                'nameClub':      'entry.name',
-                                'nameLast':      'person.name.last',
-                                'nameFirst':     'person.name.given',
-                                'phase':         'phase.name',
-                                'dateFirst':     'S_FIRST',
-                                'dateLast':      'S_LAST'})
+        df = schema.standardize(df, 'Managing')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
-        return self._standardize_columns(df, self._individual_managing_columns)
+        return schema.assemble([df], 'managing_individual')
 
     @property
+    @reads_sheet('Standings')
     def _team_standings(self):
         """Return a DataFrame containing data from the standings sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Standings')
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='Standings')
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = df.rename(columns={'year':    'league.year',
-                                'nameLeague':  'league.name',
-                                'nameClub':  'entry.name',
-                                'phase':     'phase.name',
-                                'division':  'division.name',
-                                'dateFirst': 'S_FIRST',
-                                'dateLast':  'S_LAST',
-                                'W':       'R_W',
-                                'L':       'R_L',
-                                'T':       'R_T',
-                                'PCT':     'R_PCT',
-                                'RANK':    'R_RANK'})
+        df = self._normalize_names(df, 'Standings')
+        df = schema.standardize(df, 'Standings')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
         return df
 
     @property
+    @reads_sheet('HeadToHead')
+    def head_to_head(self):
+        """Return a DataFrame containing data from the HeadToHead sheet,
+        with a column for each opponent.  See headtohead.matrices.
+        """
+        try:
+            df = sheetcache.read_excel(self.fn, sheet_name='HeadToHead',
+                                       dtype=str)
+        except readers.SheetNotFound:
+            return pd.DataFrame(columns=['league.year'])
+        df = self._normalize_names(df, 'HeadToHead')
+        return schema.standardize(df)
+
+    @property
+    @reads_sheet('TeamBatting')
     def _team_batting(self):
         """Return a DataFrame containing data from the TeamBatting sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='TeamBatting')
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='TeamBatting')
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = df.rename(columns={'year':     'league.year',
-                                'nameLeague':  'league.name',
-                                'nameClub':    'entry.name',
-                                'phase':    'phase.name',
-                                'G':        'B_G',
-                                'IP':       'B_IP',
-                                'AB':       'B_AB',
-                                'R':        'B_R',
-                                'ER':       'B_ER',
-                                'OR':       'P_R',
-                                'H':        'B_H',
-                                'TB':       'B_TB',
-                                'H1B':      'B_1B',
-                                'H2B':      'B_2B',
-                                'H3B':      'B_3B',
-                                'HR':       'B_HR',
-                                'RBI':      'B_RBI',
-                                'BB':       'B_BB',
-                                'IBB':      'B_IBB',
-                                'SO':       'B_SO',
-                                'GDP':      'B_GDP',
-                                'HP':       'B_HP',
-                                'SH':       'B_SH',
-                                'SF':       'B_SF',
-                                'SB':       'B_SB',
-                                'CS':       'B_CS',
-                                'LOB':      'B_LOB',
-                                'AVG':      'B_AVG'})
+        df = self._normalize_names(df, 'TeamBatting')
+        df = schema.standardize(df, 'TeamBatting')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
         return df
 
     @property
+    @reads_sheet('TeamPitching')
     def _team_pitching(self):
         """Return a DataFrame containing data from the TeamPitching sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='TeamPitching')
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='TeamPitching')
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = df.rename(columns={'year':     'league.year',
-                                'nameLeague':  'league.name',
-                                'nameClub':    'entry.name',
-                                'phase':    'phase.name',
-                                'GP':       'P_G',
-                                'CG':       'P_CG',
-                                'SHO':      'P_SHO',
-                                'GF':       'P_GF',
-                                'W':        'P_W',
-                                'L':        'P_L',
-                                'T':        'P_T',
-                                'PCT':      'P_PCT',
-                                'SV':       'P_SV',
-                                'IP':       'P_IP',
-                                'TBF':      'P_TBF',
-                                'AB':       'P_AB',
-                                'R':        'P_R',
-                                'ER':       'P_ER',
-                                'H':        'P_H',
-                                'HR':       'P_HR',
-                                'BB':       'P_BB',
-                                'IBB':      'P_IBB',
-                                'SO':       'P_SO',
-                                'HB':       'P_HP',
-                                'SH':       'P_SH',
-                                'SF':       'P_SF',
-                                'WP':       'P_WP',
-                                'BK':       'P_BK',
-                                'ERA':      'P_ERA'})
+        df = self._normalize_names(df, 'TeamPitching')
+        df = schema.standardize(df, 'TeamPitching')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
         return df
 
     @property
+    @reads_sheet('TeamFielding')
     def _team_fielding(self):
         """Return a DataFrame containing data from the TeamFielding sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='TeamFielding')
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='TeamFielding')
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = df.rename(columns={'year':     'league.year',
-                                'nameLeague':  'league.name',
-                                'nameClub':    'entry.name',
-                                'phase':    'phase.name',
-                                'G':        'F_G',
-                                'TC':       'F_TC',
-                                'PO':       'F_PO',
-                                'A':        'F_A',
-                                'E':        'F_E',
-                                'DP':       'F_DP',
-                                'TP':       'F_TP',
-                                'PB':       'F_PB',
-                                'CI':       'F_XI',
-                                'LOB':      'F_LOB',
-                                'SB':       'F_SB',
-                                'CS':       'F_CS',
-                                'PCT':      'F_PCT'})
+        df = self._normalize_names(df, 'TeamFielding')
+        df = schema.standardize(df, 'TeamFielding')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
         return df
 
     @property
+    @reads_sheet('Attendance')
     def _team_attendance(self):
         """Return a DataFrame containing data from the Attendance sheet.
         """
         try:
-            df = pd.read_excel(self.fn, sheet_name='Attendance')
-        except xlrd.biffh.XLRDError:
+            df = sheetcache.read_excel(self.fn, sheet_name='Attendance')
+        except readers.SheetNotFound:
             return pd.DataFrame(columns=['league.year'])
-        df = df.rename(columns={
-            'year':        'league.year',
-            'nameLeague':  'league.name',
-            'nameClub':    'entry.name',
-            'phase':       'phase.name',
-            'ATT':         'R_ATT'
-        })
+        df = self._normalize_names(df, 'Attendance')
+        df = schema.standardize(df, 'Attendance')
         if 'phase.name' not in df:
             df['phase.name'] = 'regular'
         return df
@@ -558,99 +373,249 @@ class Workbook(object):
     def team_playing(self):
         """Return a DataFrame containing team performance data.
         """
-        try:
-            playing = pd.concat([self._team_standings,
-                                 self._team_attendance,
-                                 self._team_batting,
-                                 self._team_pitching,
-                                 self._team_fielding],
-                                sort=False, ignore_index=True)
-        except ValueError as exc:
-            if "No objects" in str(exc):
-                return None
-            else:
-                raise
-        columns = ['league.year', 'league.name',
-                   'entry.name', 'phase.name', 'division.name',
-                   'S_FIRST', 'S_LAST',
-                   'R_G', 'R_W', 'R_L', 'R_T', 'R_PCT', 'R_RANK', 'R_ATT',
-                   'B_G', 'B_IP', 'B_AB', 'B_R', 'B_ER', 'B_H', 'B_TB',
-                   'B_1B', 'B_2B', 'B_3B', 'B_HR', 'B_RBI',
-                   'B_BB', 'B_IBB', 'B_SO', 'B_GDP', 'B_HP',
-                   'B_SH', 'B_SF', 'B_SB', 'B_CS', 'B_LOB',
-                   'B_AVG',
-                   'P_G', 'P_CG', 'P_SHO', 'P_GF',
-                   'P_W', 'P_L', 'P_T', 'P_PCT', 'P_SV',
-                   'P_IP', 'P_TBF', 'P_AB', 'P_R', 'P_ER', 'P_H', 'P_HR',
-                   'P_BB', 'P_IBB', 'P_SO', 'P_HP', 'P_SH', 'P_SF',
-                   'P_WP', 'P_BK', 'P_ERA',
-                   'F_G', 'F_TC', 'F_PO', 'F_A', 'F_E', 'F_DP', 'F_TP',
-                   'F_PB', 'F_SB', 'F_CS', 'F_XI', 'F_LOB', 'F_PCT']
-        return self._standardize_columns(playing, columns)
+        return schema.assemble([self._team_standings,
+                                self._team_attendance,
+                                self._team_batting,
+                                self._team_pitching,
+                                self._team_fielding],
+                               'playing_team')
 
 
 def defloat_columns(df):
     """Convert columns which should be integers to strings.  This deals with
     pandas' usage of floats for numeric columns which can have nulls.
     """
-    df['league.year'] = df['league.year'].apply(int)
-    for col in [x for x in df.columns
-                if (x[:2] in ["B_", "F_", "P_", "M_", "R_"] and
-                    x not in ["B_AVG", "P_IP", "P_ERA", "P_AVG"] and
-                    x[-4:] != "_PCT") or
-                   (x in ["S_FIRST", "S_LAST", "seq"])]:
-        try:
-            df[col] = df[col].apply(lambda x:
-                                    str(int(x)) if not pd.isnull(x) and x != ""
-                                    else x)
-        except ValueError as ex:
-            print("ERROR: In de-floating column '%s':" % col)
-            print(ex)
-            sys.exit(1)
+    df['league.year'] = _apply_column(df, 'league.year', int)
+    for col in [x for x in df.columns if schema.is_integer(x)]:
+        df[col] = _apply_column(df, col,
+                                lambda x:
+                                str(int(x)) if not pd.isnull(x) and x != ""
+                                else x)
     return df
 
 
-def process_source(source):
-    """Process workbooks from 'source', transforming all data and
-    outputting to CSV files in processed.
+def _apply_column(df, col, func):
+    """Apply 'func' to each value of column 'col' of 'df', raising
+    ColumnTypeError at the first value it rejects.
     """
-    logging.basicConfig(level=logging.INFO, format="%(message)s")
-    books = [fn for fn in sorted(glob.glob("transcript/%s/*.xls" % source))
-             if "~" not in fn]
-    logging.info("Processing source %s" % source)
-    for book in books:
-        logging.info("  %s" % book)
-    xlsbooks = [Workbook(fn) for fn in books]
+    try:
+        return df[col].apply(func)
+    except ValueError as exc:
+        for value in df[col]:
+            try:
+                func(value)
+            except ValueError:
+                raise ColumnTypeError(col, value, exc) from None
+        raise
+
+
+def check_integer_columns(df):
+    """Raise ColumnTypeError if 'df' cannot be de-floated.
+    """
+    defloat_columns(df.copy())
+
+
+def log_derived_deltas(table, counts):
+    """Log 'counts', the number of printed derived statistics in 'table'
+    differing from their values recomputed from components.
+    """
+    if counts:
+        logging.info("  %s: derived values differing from printed: %s" %
+                     (table, ", ".join("%s %d" % (code, n)
+                                       for (code, n)
+                                       in counts.most_common())))
+
+
+def source_workbooks(source, selection=None):
+    """Return the filenames of the workbooks making up 'source', or those
+    of them chosen by 'selection'.
+    """
+    return subset.select_workbooks(
+        [fn for fn in sorted(glob.glob("transcript/%s/*.xls" % source))
+         if "~" not in fn],
+        selection
+    )
+
+
+def process_workbook(book):
+    """Return the standardised individual playing, individual managing
+    and team playing tables for the Workbook 'book'.
+    """
+    return (book.individual_playing,
+            book.individual_managing,
+            book.team_playing)
 
+
+def prepare_table(table, assembler, dtypes, stored, df, clubs=None):
+    """Return one workbook's 'table' as it is written: 'df' cast to the
+    'dtypes' worked out by 'assembler', with the columns 'stored', and a
+    club.id column from 'clubs' if given.  Also returns the codes of the
+    printed derived statistics differing from their recomputed values.
+    """
+    df = assembler.cast([df], dtypes)
+    if table != 'managing_individual':
+        found = derived.deltas(df)['code']
+    else:
+        found = []
+    df = defloat_columns(df[stored])
+    if clubs is not None:
+        df = clubs.annotate(df)
+    return (df, found)
+
+
+def write_source(source, results, compress=None, changes=False,
+                 root="processed", prune=False, clubs=None):
+    """Write the processed output files for 'source' in 'root' from
+    'results', an iterable of the tables returned by process_workbook for
+    each workbook.
+
+    If 'changes' is set, the feed of rows changed since the previous
+    build is written too.  The coverage of the columns of the tables is
+    written to the coverage index of the source.  If 'prune' is set,
+    columns with no values are left out of the table files.  If 'clubs'
+    is given, a club.id column is added from that clubs.ClubIndex.
+
+    The tables of each workbook are set aside on disk as they arrive,
+    keeping only a summary of their columns, from which the dtypes of the
+    assembled tables are worked out.  The outputs are then written one
+    workbook at a time, so only one workbook's tables are held in memory.
+
+    Returns, for each workbook, the summaries of its tables, the length
+    of the text of its rows in each table, and the derived statistics
+    found to differ in them, from which the layout of the outputs is
+    recorded.
+    """
     try:
-        os.makedirs("processed/%s" % source)
+        os.makedirs("%s/%s" % (root, source))
     except os.error:
         pass
 
-    ind_playing = pd.concat([book.individual_playing for book in xlsbooks],
-                            ignore_index=True)
-    ind_playing = defloat_columns(ind_playing)
-    ind_playing.to_csv("processed/%s/playing_individual.csv" % source,
-                       index=False, encoding='utf-8')
-
-    ind_managing = pd.concat([book.individual_managing for book in xlsbooks],
-                             ignore_index=True)
-    ind_managing = defloat_columns(ind_managing)
-    ind_managing.to_csv("processed/%s/managing_individual.csv" % source,
-                        index=False, encoding='utf-8')
+    assemblers = [schema.Assembler(table) for table in schema.tables]
+    parts = []
+    with tempfile.TemporaryDirectory() as spill:
+        count = 0
+        for result in results:
+            summary = [schema.Assembler(table) for table in schema.tables]
+            for (assembler, part, df) in zip(assemblers, summary, result):
+                part.add(df)
+                assembler.extend(part)
+            parts.append((summary, [], []))
+            pd.to_pickle(result, os.path.join(spill, "%d.pkl" % count))
+            count += 1
+        dtypes = [assembler.dtypes() for assembler in assemblers]
+        stored = [coverage.prune(types, assembler.counts) if prune
+                  else list(types)
+                  for (assembler, types) in zip(assemblers, dtypes)]
+        paths = ["%s/%s/%s.csv" % (root, source, table)
+                 for table in schema.tables]
+        deltas = {table: collections.Counter() for table in schema.tables}
+        ids = {table: 0 for table in schema.tables}
+        with contextlib.ExitStack() as stack:
+            outputs = [stack.enter_context(compression.open_output(
+                           path, compress))
+                       for path in paths]
+            if not count:
+                for (table, f) in zip(schema.tables, outputs):
+                    df = defloat_columns(schema.assemble([], table))
+                    if clubs is not None:
+                        df = clubs.annotate(df)
+                    df.to_csv(f, index=False)
+            for i in range(count):
+                result = pd.read_pickle(os.path.join(spill, "%d.pkl" % i))
+                (_, lengths, codes) = parts[i]
+                for (table, assembler, types, keep, frame, f) in \
+                        zip(schema.tables, assemblers, dtypes, stored,
+                            result, outputs):
+                    (df, found) = prepare_table(table, assembler, types,
+                                                keep, frame, clubs)
+                    deltas[table].update(found)
+                    if clubs is not None:
+                        ids[table] += int(df['club.id'].notnull().sum())
+                    if i == 0:
+                        df.iloc[:0].to_csv(f, index=False)
+                    text = df.to_csv(index=False, header=False)
+                    f.write(text)
+                    lengths.append(len(text))
+                    codes.append(list(found))
+    entries = []
+    for (table, assembler, types, keep) in \
+            zip(schema.tables, assemblers, dtypes, stored):
+        counts = assembler.counts
+        if clubs is not None:
+            # The club.id column follows entry.name
+            items = list(types.items())
+            at = list(types).index('entry.name') + 1
+            types = dict(items[:at] + [('club.id', 'object')] +
+                         items[at:])
+            counts = {**counts, 'club.id': ids[table]}
+            keep = keep + ['club.id']
+        entries.extend(coverage.entries(table, types, counts, keep))
+    coverage.write(source, entries, root)
+    for (table, counts) in deltas.items():
+        log_derived_deltas(table, counts)
+
+    if changes:
+        for table in schema.tables:
+            counts = changefeed.update(source, table, root)
+            logging.info("  %s: %d inserted, %d updated, %d deleted" %
+                         ((table,) + counts))
+    return parts
+
+
+def process_source(source, compress=None, changes=False, stable_keys=False,
+                   selection=None, root="processed", prune=False,
+                   clubs=None):
+    """Process workbooks from 'source', transforming all data and
+    outputting to CSV files in processed.
 
-    try:
-        team_playing = pd.concat([ent
-                                  for ent in [book.team_playing
-                                              for book in xlsbooks]
-                                  if ent is not None],
-                                 ignore_index=True)
-        team_playing = defloat_columns(team_playing)
-        team_playing.to_csv("processed/%s/playing_team.csv" % source,
-                            index=False, encoding='utf-8')
-    except ValueError as exc:
-        if "No objects to concatenate" not in str(exc):
-            raise
+    If 'compress' is given, output files are compressed using that method
+    as they are written.  If 'changes' is set, a feed of the rows changed
+    is written too.  If 'stable_keys' is set, person references are
+    qualified by their workbook so they are unique across the collection.
+    If 'selection' is given, only the leagues, seasons, workbooks and
+    sheets it selects are processed, and the outputs are written to
+    'root' instead of processed.  If 'prune' is set, columns without
+    values are left out of the outputs, and can be restored from the
+    coverage index.  If 'clubs' is given, the outputs carry a club.id
+    column from that clubs.ClubIndex.
+
+    While a report is active, a sheet or workbook which fails is recorded
+    in it and left out, and the outputs are written from the rest.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    books = source_workbooks(source, selection)
+    logging.info("Processing source %s" % source)
+    for book in books:
+        logging.info("  %s" % book)
+    written = []
+
+    def results():
+        for fn in books:
+            with report.isolating(source=source, workbook=fn) as unit:
+                # Fail once for a workbook which cannot be read at all
+                sheetcache.sheet_names(fn)
+                result = process_workbook(Workbook(fn, stable_keys,
+                                                   selection))
+                result = [subset.filter_rows(df, selection) for df in result]
+                if report.active() is not None:
+                    for df in result:
+                        check_integer_columns(df)
+            if not unit.failed:
+                written.append(fn)
+                yield result
+
+    parts = None
+    with report.isolating(source=source):
+        parts = write_source(source, results(), compress, changes, root,
+                             prune, clubs)
+    if parts is not None and selection is None and clubs is None and \
+       not (stable_keys or prune):
+        # Outputs as the watch command writes them, which it can take
+        # the rows of unchanged workbooks from
+        layout.record(source,
+                      [layout.Entry(fn, sheetcache.workbook_hash(fn), *part)
+                       for (fn, part) in zip(written, parts)],
+                      root)
     print()
 
 
@@ -0,0 +1,267 @@
+"""Backends reading the sheets of the transcription workbooks.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+A reader lists the sheets of a workbook, reads a sheet, or several from
+one opening of the workbook, into DataFrames as pd.read_excel does,
+with the same 'dtype' and 'usecols' arguments, and yields the rows of
+cell values of each sheet for the catalogue.  A sheet which is not in
+the workbook raises SheetNotFound, whichever the backend.
+
+The 'xlrd' reader goes through pd.read_excel, and needs only the
+packages the rest of the project does.  The 'calamine' reader uses the
+Rust calamine library through the python-calamine package, installed
+with hgame-averages[calamine], which parses workbooks several times
+faster.  Its cells are converted as pandas converts xlrd's, and the
+sheet is then parsed by the same TextParser, so both readers give the
+same DataFrames; 'hgame-averages check-readers' compares them over the
+transcriptions.
+
+The reader is named by $HGAME_READER.  If that is not set, calamine is
+used when it is installed, and xlrd otherwise.
+"""
+import datetime
+import os
+
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+
+_ole_magic = b"\xd0\xcf\x11\xe0"
+
+
+class SheetNotFound(LookupError):
+    """Raised when a sheet is not in a workbook.
+    """
+    def __init__(self, fn, sheet_name):
+        super().__init__(f"No sheet named <{sheet_name!r}> in {fn}")
+        self.fn = fn
+        self.sheet_name = sheet_name
+
+
+def _is_xls(fn):
+    """Return True if 'fn' is an xls workbook.  A few transcriptions are
+    saved as xlsx under an .xls name, so the format is told from the
+    contents of the file.
+    """
+    with open(fn, "rb") as f:
+        return f.read(4) == _ole_magic
+
+
+class XlrdReader(object):
+    """Reads workbooks with pd.read_excel, using xlrd for xls workbooks
+    and openpyxl for xlsx ones.
+    """
+    name = "xlrd"
+
+    def sheet_names(self, fn):
+        if _is_xls(fn):
+            # Only the workbook's directory is read, not its sheets
+            import xlrd
+            book = xlrd.open_workbook(fn, on_demand=True)
+            try:
+                return book.sheet_names()
+            finally:
+                book.release_resources()
+        with pd.ExcelFile(fn) as book:
+            return book.sheet_names
+
+    def read(self, fn, sheet_name, **kwargs):
+        return self.read_sheets(fn, [sheet_name], **kwargs)[sheet_name]
+
+    def read_sheets(self, fn, sheet_names, **kwargs):
+        """Return a dict of the sheets 'sheet_names' of workbook 'fn',
+        read from one opening of it.
+        """
+        with pd.ExcelFile(fn) as book:
+            for name in sheet_names:
+                if name not in book.sheet_names:
+                    raise SheetNotFound(fn, name)
+            return {name: book.parse(name, **kwargs) for name in sheet_names}
+
+    def sheets(self, fn):
+        """Yield the name and rows of cell values of each sheet of
+        workbook 'fn', without building DataFrames.
+        """
+        if _is_xls(fn):
+            import xlrd
+            book = xlrd.open_workbook(fn, on_demand=True)
+            try:
+                for name in book.sheet_names():
+                    sheet = book.sheet_by_name(name)
+                    yield (name, [sheet.row_values(r)
+                                  for r in range(sheet.nrows)])
+                    book.unload_sheet(name)
+            finally:
+                book.release_resources()
+        else:
+            try:
+                import openpyxl
+            except ImportError:
+                raise ImportError(f"{fn} is an xlsx workbook, which requires "
+                                  f"the 'openpyxl' package") from None
+            with open(fn, "rb") as f:
+                book = openpyxl.load_workbook(f, read_only=True,
+                                              data_only=True)
+                for name in book.sheetnames:
+                    yield (name, [list(row) for row in
+                                  book[name].iter_rows(values_only=True)])
+                book.close()
+
+
+def _cell(value):
+    """Convert a cell value from calamine as pandas converts the cells
+    it reads: numbers which are whole become ints, and dates Timestamps.
+    """
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value)
+    if isinstance(value, datetime.timedelta):
+        return pd.Timedelta(value)
+    return value
+
+
+def frame(rows, dtype=None, usecols=None):
+    """Return the DataFrame of a sheet whose cells are 'rows', headed by
+    its first row, as pd.read_excel returns it.
+    """
+    if not rows:
+        return pd.DataFrame()
+    try:
+        return TextParser(rows, header=0, dtype=dtype, usecols=usecols,
+                          skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+class CalamineReader(object):
+    """Reads workbooks of either format with python-calamine.
+    """
+    name = "calamine"
+
+    def __init__(self):
+        try:
+            import python_calamine
+        except ImportError:
+            raise ImportError("the calamine reader requires the "
+                              "'python-calamine' package; install "
+                              "hgame-averages[calamine]") from None
+        self._calamine = python_calamine
+
+    def _open(self, fn):
+        # Opened from the file object, calamine tells the format from the
+        # contents rather than the name
+        with open(fn, "rb") as f:
+            return self._calamine.CalamineWorkbook.from_filelike(f)
+
+    def _rows(self, book, name):
+        return book.get_sheet_by_name(name).to_python(skip_empty_area=False)
+
+    def sheet_names(self, fn):
+        return list(self._open(fn).sheet_names)
+
+    def read(self, fn, sheet_name, dtype=None, usecols=None):
+        return self.read_sheets(fn, [sheet_name], dtype=dtype,
+                                usecols=usecols)[sheet_name]
+
+    def read_sheets(self, fn, sheet_names, dtype=None, usecols=None):
+        book = self._open(fn)
+        for name in sheet_names:
+            if name not in book.sheet_names:
+                raise SheetNotFound(fn, name)
+        return {name: frame([[_cell(value) for value in row]
+                             for row in self._rows(book, name)],
+                            dtype=dtype, usecols=usecols)
+                for name in sheet_names}
+
+    def sheets(self, fn):
+        book = self._open(fn)
+        for name in book.sheet_names:
+            yield (name, self._rows(book, name))
+
+
+# Reader name -> class
+backends = {
+    "xlrd":     XlrdReader,
+    "calamine": CalamineReader,
+}
+
+_readers = {}
+
+
+def default_name():
+    """Return the name of the reader to use: $HGAME_READER if set, or
+    calamine if it is installed, or xlrd.
+    """
+    name = os.environ.get("HGAME_READER")
+    if name is not None:
+        return name
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return "xlrd"
+    return "calamine"
+
+
+def get_reader(name=None):
+    """Return the reader 'name', or the default reader.
+    """
+    if name is None:
+        name = default_name()
+    if name not in backends:
+        raise ValueError(f"Unknown reader '{name}'; "
+                         f"choose from {', '.join(backends)}")
+    if name not in _readers:
+        _readers[name] = backends[name]()
+    return _readers[name]
+
+
+def _differences(expected, actual):
+    """Return a description of how DataFrame 'actual' differs from
+    'expected', or None if they are the same.
+    """
+    try:
+        pd.testing.assert_frame_equal(actual, expected)
+    except AssertionError as exc:
+        return " ".join(str(exc).split())
+    return None
+
+
+def compare(fn, reference="xlrd", other="calamine",
+            dtypes=(None, str)):
+    """Compare the sheets of workbook 'fn' as read by the readers
+    'reference' and 'other', with each of 'dtypes'.  Returns a list of
+    (sheet, dtype, difference) for the sheets which are not the same.
+    """
+    (reference, other) = (get_reader(reference), get_reader(other))
+    names = reference.sheet_names(fn)
+    if other.sheet_names(fn) != names:
+        return [("", None, f"sheet names {names} and "
+                           f"{other.sheet_names(fn)}")]
+    found = []
+    for name in names:
+        for dtype in dtypes:
+            difference = _differences(reference.read(fn, name, dtype=dtype),
+                                      other.read(fn, name, dtype=dtype))
+            if difference is not None:
+                found.append((name, dtype, difference))
+    return found
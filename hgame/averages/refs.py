@@ -0,0 +1,85 @@
+"""Construction of person and row references.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+A reference is a letter prefix, a four-digit number and a Damm check
+digit, such as B00013.  Numbering restarts in every workbook, so such
+references are unique only within one workbook.  A stable reference
+also carries a ten-digit identifier of the workbook, computed from the
+names of its source and file, such as B0123456789000137; it is unique
+across the whole collection and unchanged between builds as long as
+the workbook is not renamed.  The check digit covers all the digits.
+
+The rows of each sheet are numbered from the offset of the sheet in
+'sheets', so that people in different sheets of a workbook have
+different references.  The CSV tables take their references from
+sheet_refs(), and so do the JSON and TOML outputs when keys are stable,
+so that they join on them; otherwise those number their rows in turn.
+"""
+import pathlib
+import zlib
+
+import damm
+import pandas as pd
+
+
+# Prefix of the references to the rows of each sheet, and the offset
+# from which they are numbered
+sheets = {
+    "Batting":      ("B", 0),
+    "Pitching":     ("P", 1000),
+    "Fielding":     ("F", 2000),
+    "Managing":     ("M", 9000),
+    "TeamBatting":  ("TB", 0),
+    "TeamPitching": ("TP", 0),
+    "TeamFielding": ("TF", 0),
+    "Standings":    ("TS", 0),
+    "HeadToHead":   ("TH", 0),
+    "Attendance":   ("TA", 0),
+}
+
+
+def workbook_id(fn):
+    """Return the identifier of the workbook at 'fn', from the names of
+    its source directory and file.
+    """
+    path = pathlib.Path(fn)
+    return zlib.crc32(f"{path.parent.name}/{path.name}".encode("utf-8"))
+
+
+def make_ref(prefix, number, book=None):
+    """Return the reference with 'prefix' for 'number', qualified by the
+    workbook identifier 'book' if given.
+    """
+    digits = "%04d" % number if book is None else "%010d%04d" % (book, number)
+    return "%s%s%d" % (prefix, digits, damm.encode(digits))
+
+
+def sheet_refs(df, sheet, book=None):
+    """Return a reference for each row of 'df', a sheet of kind 'sheet' as
+    read from its workbook, qualified by the workbook identifier 'book' if
+    given.  In sheets of people, numbers advance at each row giving a
+    surname, so rows continuing a person's entry share its reference;
+    in other sheets, at every row.
+    """
+    (prefix, offset) = sheets[sheet]
+    if "nameLast" in df:
+        numbers = (~df["nameLast"].isnull()).cumsum()
+    else:
+        numbers = pd.Series(range(1, len(df)+1), index=df.index, dtype=int)
+    return numbers.apply(lambda x: make_ref(prefix, offset+x, book))
@@ -0,0 +1,155 @@
+"""Collection of errors and warnings from batch processing.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+When processing with --keep-going, a failure in one sheet or workbook is
+recorded in a Report and processing continues with the next.  Each
+problem is located by source, workbook, sheet, column and row, as far
+as they are known, and the report is written as one CSV file at the
+end, from which the failed workbooks can be rebuilt.
+
+While a Report is active, warnings issued through warn() are recorded in
+it at the current location; otherwise they are printed as before.
+"""
+import collections
+import contextlib
+import pathlib
+
+import pandas as pd
+
+
+Problem = collections.namedtuple(
+    "Problem",
+    ["level", "source", "workbook", "sheet", "column", "row", "message"]
+)
+
+ERROR = "error"
+WARNING = "warning"
+
+# The report collecting problems, if any
+_active = None
+
+
+class Report(object):
+    """A list of the problems met during processing.
+    """
+    def __init__(self):
+        self.problems = []
+        self._where = {}
+
+    @contextlib.contextmanager
+    def at(self, **where):
+        """Locate problems recorded within the block at 'where', which may
+        give the source, workbook and sheet.
+        """
+        previous = self._where
+        self._where = {**previous, **where}
+        try:
+            yield self
+        finally:
+            self._where = previous
+
+    def add(self, level, message, **where):
+        where = {**self._where, **where}
+        if where.get("workbook") is not None:
+            where["workbook"] = pathlib.Path(where["workbook"]).name
+        self.problems.append(Problem(level=level, message=str(message),
+                                     **{field: where.get(field)
+                                        for field in Problem._fields[1:-1]}))
+
+    def error(self, exc, **where):
+        """Record the exception 'exc', using its column and row if it
+        gives them.
+        """
+        for field in ["column", "row"]:
+            if getattr(exc, field, None) is not None:
+                where.setdefault(field, getattr(exc, field))
+        self.add(ERROR, f"{type(exc).__name__}: {exc}", **where)
+
+    def warning(self, message, **where):
+        self.add(WARNING, message, **where)
+
+    @property
+    def errors(self):
+        return [p for p in self.problems if p.level == ERROR]
+
+    def failed(self):
+        """Return the sorted (source, workbook) pairs with errors.
+        """
+        return sorted({(p.source, p.workbook) for p in self.errors})
+
+    def to_frame(self):
+        return pd.DataFrame(self.problems, columns=Problem._fields) \
+                 .astype({"row": "Int64"})
+
+    def write(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.to_frame().to_csv(path, index=False)
+
+
+@contextlib.contextmanager
+def collecting(report):
+    """Make 'report' the active report within the block.
+    """
+    global _active
+    previous = _active
+    _active = report
+    try:
+        yield report
+    finally:
+        _active = previous
+
+
+def active():
+    """Return the active report, or None.
+    """
+    return _active
+
+
+class _Unit(object):
+    failed = False
+
+
+@contextlib.contextmanager
+def isolating(**where):
+    """Run the block as one unit of work located at 'where'.  If there
+    is an active report, an exception in the block is recorded in it
+    rather than raised, and the 'failed' attribute of the object yielded
+    is set.  Otherwise exceptions propagate as usual.
+    """
+    unit = _Unit()
+    if _active is None:
+        yield unit
+        return
+    with _active.at(**where):
+        try:
+            yield unit
+        except Exception as exc:
+            _active.error(exc)
+            unit.failed = True
+
+
+def warn(message, **where):
+    """Record the warning 'message' in the active report, or print it
+    if there is none.
+    """
+    if _active is None:
+        print(f"WARNING: {message}")
+    else:
+        _active.warning(message, **where)
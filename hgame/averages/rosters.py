@@ -0,0 +1,238 @@
+"""Rosters and managerial tenures on given dates.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+S_FIRST and S_LAST record, as YYYYMMDD, the first and last dates a
+person was with a club.  An IntervalIndex holds these spans as day
+numbers, sorted by club and first date, so that the people with a club
+on a date (a stabbing query), or at any time within a range of dates
+(an overlap query), are found by binary search.  Within a club, a span
+containing a date must begin no earlier than the date less the longest
+span of that club, which bounds the search from below.
+
+Players are indexed only where at least one of their dates was
+transcribed; a missing date is taken as the start or end of the season.
+Managers are indexed by their order 'seq': a manager without a first
+date took over at the start of the season, and one without a last date
+served until the day before the next manager's first date, or the end
+of the season.
+"""
+import numpy as np
+import pandas as pd
+
+from . import loader
+
+
+_clubs = ["league.year", "league.name", "entry.name"]
+
+# Each source orders the managers of a club in a phase of its season
+_tenures = ["source"] + _clubs + ["phase.name"]
+
+_identity = {
+    "playing_individual":  ["person.ref", "person.name.last",
+                            "person.name.given", "S_STINT"],
+    "managing_individual": ["phase.name", "seq", "person.ref",
+                            "person.name.last", "person.name.given"],
+}
+
+# Offset keeping day numbers positive within the low half of a key
+_offset = 1 << 31
+
+
+def day_numbers(values):
+    """Return the YYYYMMDD dates in 'values' as an array of float day
+    numbers since 1970-01-01, with NaN where there is no valid date.
+    """
+    dates = pd.to_datetime(pd.Series(values, dtype=object), format="%Y%m%d",
+                           errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    return np.where(dates.isnull(), np.nan, days)
+
+
+def parse_date(text):
+    """Return the day number of the date 'text', given as YYYY-MM-DD or
+    YYYYMMDD.
+    """
+    return int(day_numbers([str(text).replace("-", "")])[0])
+
+
+def _season_bounds(df, first, last):
+    """Return the first and last days of the season of each row of 'df':
+    1 January and 31 December of its year, widened to take in any dates
+    transcribed for its league-season, as for winter leagues.
+    """
+    years = df["league.year"].astype(int).to_numpy()
+    jan1 = day_numbers([f"{y}0101" for y in years])
+    dec31 = day_numbers([f"{y}1231" for y in years])
+    keys = [df["league.year"], df["league.name"]]
+    low = pd.Series(first, index=df.index).groupby(keys).transform("min")
+    high = pd.Series(last, index=df.index).groupby(keys).transform("max")
+    return (np.fmin(jan1, low.to_numpy()), np.fmax(dec31, high.to_numpy()))
+
+
+def playing_spans(df):
+    """Return the rows of the playing table 'df' with transcribed dates,
+    with their spans as 'first' and 'last' day numbers.
+    """
+    df = df[df["entry.name"].notnull() &
+            (df["S_FIRST"].notnull() | df["S_LAST"].notnull())].copy()
+    first = day_numbers(df["S_FIRST"])
+    last = day_numbers(df["S_LAST"])
+    (start, end) = _season_bounds(df, first, last)
+    df["first"] = np.where(np.isnan(first), start, first)
+    df["last"] = np.where(np.isnan(last), end, last)
+    return df
+
+
+def managing_spans(df):
+    """Return the rows of the managing table 'df' with their tenures as
+    'first' and 'last' day numbers, inferring missing dates from the
+    order of the club's managers in each source.
+    """
+    df = df[df["entry.name"].notnull()].copy()
+    df["seq"] = pd.to_numeric(df["seq"]).fillna(0)
+    df["phase.name"] = df["phase.name"].fillna("regular")
+    df = df.sort_values(_tenures + ["seq"], kind="stable")
+    first = day_numbers(df["S_FIRST"])
+    last = day_numbers(df["S_LAST"])
+    (start, end) = _season_bounds(df, first, last)
+    # The predecessor and successor of each manager are the rows before
+    # and after in the same club
+    group = df.groupby(_tenures, sort=False).ngroup().to_numpy()
+    opens = np.insert(group[1:] != group[:-1], 0, True)
+    closes = np.append(group[1:] != group[:-1], True)
+    following = np.append(first[1:], np.nan)
+    following[closes] = np.nan
+    preceding = np.insert(last[:-1], 0, np.nan) + 1
+    preceding[opens] = np.nan
+    df["first"] = np.where(~np.isnan(first), first,
+                           np.where(np.isnan(preceding), start, preceding))
+    df["last"] = np.where(~np.isnan(last), last,
+                          np.where(np.isnan(following), end, following - 1))
+    # Whether the start of the tenure is known rather than assumed
+    df["dated"] = ~np.isnan(first) | ~np.isnan(preceding) | opens
+    return df
+
+
+class IntervalIndex(object):
+    """Spans of dates of the rows of a table, indexed by club.
+    """
+    def __init__(self, df):
+        df = df.astype({col: object for col in _clubs})
+        codes = df.groupby(_clubs, sort=False).ngroup().to_numpy()
+        first = df["first"].to_numpy(dtype=np.int64)
+        last = df["last"].to_numpy(dtype=np.int64)
+        keys = (codes.astype(np.int64) << 32) + first + _offset
+        order = np.argsort(keys, kind="stable")
+        self.df = df.iloc[order].reset_index(drop=True)
+        self._keys = keys[order]
+        self._first = first[order]
+        self._last = last[order]
+        self._clubs = {club: code for (code, club) in
+                       enumerate(df[_clubs].drop_duplicates()
+                                 .itertuples(index=False, name=None))}
+        # The longest span of each club bounds searches from below
+        self._span = np.zeros(len(self._clubs), dtype=np.int64)
+        np.maximum.at(self._span, codes, last - first)
+
+    def codes(self, years, club=None, league=None):
+        """Return the codes of the clubs named 'club' (default all) in
+        'league' (default all) in any of 'years'.
+        """
+        years = [int(year) for year in years]
+        return np.array([code for ((y, lg, name), code) in
+                         self._clubs.items()
+                         if int(y) in years and
+                         (club is None or name == club) and
+                         (league is None or lg == league)],
+                        dtype=np.int64)
+
+    def overlap(self, codes, first, last):
+        """Return the rows whose spans overlap the range of days from
+        'first' to 'last' for the clubs with 'codes', for arrays of
+        queries.  A 'query' column gives the position of the query
+        matched by each row.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        first = np.broadcast_to(np.asarray(first, dtype=np.int64),
+                                codes.shape)
+        last = np.broadcast_to(np.asarray(last, dtype=np.int64),
+                               codes.shape)
+        base = (codes << 32) + _offset
+        lo = np.searchsorted(self._keys, base + first - self._span[codes],
+                             side="left")
+        hi = np.searchsorted(self._keys, base + last, side="right")
+        counts = np.maximum(hi - lo, 0)
+        query = np.repeat(np.arange(len(codes)), counts)
+        rows = np.repeat(lo - np.cumsum(counts) + counts, counts) + \
+            np.arange(counts.sum())
+        keep = self._last[rows] >= first[query]
+        df = self.df.iloc[rows[keep]].reset_index(drop=True)
+        df.insert(loc=0, column="query", value=query[keep])
+        return df
+
+    def stab(self, codes, days):
+        """Return the rows whose spans contain the day 'days' for the
+        clubs with 'codes', for arrays of queries.
+        """
+        return self.overlap(codes, days, days)
+
+    def on(self, date, club=None, league=None):
+        """Return the rows with club 'club' (default all) in 'league'
+        (default all) on 'date', given as YYYY-MM-DD or YYYYMMDD.
+        """
+        day = parse_date(date)
+        year = pd.Timestamp(day, unit="D").year
+        # Winter leagues run into the following year
+        df = self.stab(self.codes([year - 1, year], club, league), day)
+        return df.drop(columns=["query"])
+
+
+def build(source=None, table="playing_individual", root="processed"):
+    """Return the IntervalIndex of 'table' in 'source' (default all).
+    """
+    columns = _clubs + _identity[table] + ["S_FIRST", "S_LAST"]
+    df = loader.load(source, table, columns, root=root)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    df = df[df[_clubs].notnull().all(axis=1)]
+    if table == "managing_individual":
+        return IntervalIndex(managing_spans(df))
+    return IntervalIndex(playing_spans(df))
+
+
+def overlapping_tenures(index):
+    """Return the tenures in the managing IntervalIndex 'index' which
+    begin, on a known date, before an earlier tenure with the same club
+    ends in the same source.  A change of manager on the day is not an
+    overlap.
+    """
+    df = index.df
+    # Rows are sorted by club and first day, so a tenure overlaps an
+    # earlier one if it begins before the latest end so far in its club
+    group = df.groupby(_tenures, sort=False).ngroup()
+    latest = df["last"].groupby(group).cummax().groupby(group).shift()
+    return df[df["dated"] & (df["first"] < latest)].reset_index(drop=True)
+
+
+def format_days(df):
+    """Return 'df' with its 'first' and 'last' day numbers as dates.
+    """
+    return df.assign(**{col: pd.to_datetime(df[col], unit="D").dt.date
+                        for col in ["first", "last"]})
@@ -0,0 +1,545 @@
+"""Registry of standardised columns.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Every statistic has a standard code, such as 'B_AB' or 'P_IP', made of
+a prefix for the kind of statistic (B_ batting, P_ pitching, F_ fielding,
+R_ results, M_ managing) and an abbreviation.  The transcriptions head
+statistic columns with the abbreviation as printed; the aliases below
+record, for each kind of sheet, the code that each heading stands for.
+The processed tables, the loader and the JSON and TOML exporters all take
+their statistic columns from this registry.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Kinds of column
+YEAR = "year"
+DATE = "date"
+TEXT = "text"
+COUNT = "count"
+RATE = "rate"
+
+_stat_prefixes = ["B_", "F_", "P_", "M_", "R_"]
+
+
+# Statistic headings used in each kind of sheet, and the codes they stand
+# for.  A heading which is already a code stands for itself.  Fielding
+# statistics are by position, and become F_<pos>_<abbreviation> in the
+# processed tables, except for those headed ALL_, which are over all
+# positions.
+aliases = {
+    "Batting": {
+        "G":          "B_G",
+        "AB":         "B_AB",
+        "R":          "B_R",
+        "ER":         "B_ER",
+        "H":          "B_H",
+        "TB":         "B_TB",
+        "EB":         "B_EB",       # "extra bases"
+        "H1B":        "B_1B",
+        "H2B":        "B_2B",
+        "H3B":        "B_3B",
+        "HR":         "B_HR",
+        "RBI":        "B_RBI",
+        "BB":         "B_BB",
+        "IBB":        "B_IBB",
+        "SO":         "B_SO",
+        "GDP":        "B_GDP",
+        "HP":         "B_HP",
+        "SH":         "B_SH",
+        "SF":         "B_SF",
+        "SB":         "B_SB",
+        "CS":         "B_CS",
+        "AVG":        "B_AVG",
+        "AVG_RANK":   "B_AVG_RANK",
+        "SLG":        "B_SLG",
+        "Pos":        "F_POS",
+        "B_G_PH":     "B_G_PH",     # games as pinch hitter
+        "B_G_PR":     "B_G_PR",     # games as pinch runner
+    },
+    "Pitching": {
+        "GP":         "P_G",
+        "GS":         "P_GS",
+        "REL":        "P_G_RP",     # games as reliever
+        "EIG":        "P_G_EI",     # extra-inning games
+        "0H":         "P_G_0H",
+        "1H":         "P_G_1H",
+        "2H":         "P_G_2H",
+        "3H":         "P_G_3H",
+        "4H":         "P_G_4H",
+        "5H":         "P_G_5H",
+        "CG":         "P_CG",
+        "SHO":        "P_SHO",
+        "TO":         "P_TO",
+        "GF":         "P_GF",
+        "DEC":        "P_DEC",
+        "W":          "P_W",
+        "L":          "P_L",
+        "T":          "P_T",
+        "ND":         "P_ND",
+        "SV":         "P_SV",
+        "PCT":        "P_PCT",
+        "IP":         "P_IP",
+        "TBF":        "P_TBF",
+        "AB":         "P_AB",
+        "R":          "P_R",
+        "R/G":        "P_RPG",      # runs per game
+        "ER":         "P_ER",
+        "H":          "P_H",
+        "H/G":        "P_HPG",      # hits per game
+        "TB":         "P_TB",
+        "H2B":        "P_2B",
+        "H3B":        "P_3B",
+        "HR":         "P_HR",
+        "BB":         "P_BB",
+        "IBB":        "P_IBB",
+        "SO":         "P_SO",
+        "HB":         "P_HP",
+        "SH":         "P_SH",
+        "SF":         "P_SF",
+        "WP":         "P_WP",
+        "BK":         "P_BK",
+        "SB":         "P_SB",
+        "AVG":        "P_AVG",
+        "ERA":        "P_ERA",
+        "ERA_RANK":   "P_ERA_RANK",
+    },
+    "Fielding": {
+        "Pos":        "F_POS",
+        "G":          "F_G",
+        "INN":        "F_INN",
+        "TC":         "F_TC",
+        "PO":         "F_PO",
+        "A":          "F_A",
+        "E":          "F_E",
+        "DP":         "F_DP",
+        "TP":         "F_TP",
+        "PB":         "F_PB",
+        "SB":         "F_SB",
+        "CS":         "F_CS",
+        "CN":         "F_PK",       # pickoffs
+        "PCT":        "F_PCT",
+        "ALL_G":      "F_ALL_G",
+        "ALL_TC":     "F_ALL_TC",
+        "ALL_PO":     "F_ALL_PO",
+        "ALL_A":      "F_ALL_A",
+        "ALL_E":      "F_ALL_E",
+        "ALL_DP":     "F_ALL_DP",
+        "ALL_TP":     "F_ALL_TP",
+        "ALL_PCT":    "F_ALL_PCT",
+    },
+    "Managing": {},
+    "Standings": {
+        "G":          "R_G",
+        "W":          "R_W",
+        "L":          "R_L",
+        "T":          "R_T",
+        "PCT":        "R_PCT",
+        "RANK":       "R_RANK",
+    },
+    "Attendance": {
+        "ATT":        "R_ATT",
+    },
+    "TeamBatting": {
+        "G":          "B_G",
+        "IP":         "B_IP",       # team innings batted - rare
+        "AB":         "B_AB",
+        "R":          "B_R",
+        "OR":         "P_R",        # opponents' runs
+        "ER":         "B_ER",
+        "H":          "B_H",
+        "TB":         "B_TB",
+        "EB":         "B_EB",
+        "H1B":        "B_1B",
+        "H2B":        "B_2B",
+        "H3B":        "B_3B",
+        "HR":         "B_HR",
+        "RBI":        "B_RBI",
+        "BB":         "B_BB",
+        "IBB":        "B_IBB",
+        "SO":         "B_SO",
+        "GDP":        "B_GDP",
+        "HP":         "B_HP",
+        "SH":         "B_SH",
+        "SF":         "B_SF",
+        "SB":         "B_SB",
+        "CS":         "B_CS",
+        "ROE":        "B_ROE",      # reached on error
+        "LOB":        "B_LOB",
+        "AVG":        "B_AVG",
+        "SLG":        "B_SLG",
+        "W":          "R_W",
+        "L":          "R_L",
+        "T":          "R_T",
+    },
+    "TeamPitching": {
+        "GP":         "P_G",
+        "APP":        "P_APP",
+        "GS":         "P_GS",
+        "CG":         "P_CG",
+        "SHO":        "P_SHO",
+        "GF":         "P_GF",
+        "W":          "P_W",
+        "L":          "P_L",
+        "T":          "P_T",
+        "PCT":        "P_PCT",
+        "SV":         "P_SV",
+        "IP":         "P_IP",
+        "TBF":        "P_TBF",
+        "AB":         "P_AB",
+        "R":          "P_R",
+        "ER":         "P_ER",
+        "H":          "P_H",
+        "HR":         "P_HR",
+        "BB":         "P_BB",
+        "IBB":        "P_IBB",
+        "SO":         "P_SO",
+        "HB":         "P_HP",
+        "SH":         "P_SH",
+        "SF":         "P_SF",
+        "WP":         "P_WP",
+        "BK":         "P_BK",
+        "SB":         "P_SB",
+        "CS":         "P_CS",
+        "ERA":        "P_ERA",
+    },
+    "TeamFielding": {
+        "G":          "F_G",
+        "TC":         "F_TC",
+        "PO":         "F_PO",
+        "A":          "F_A",
+        "E":          "F_E",
+        "DP":         "F_DP",
+        "TP":         "F_TP",
+        "PB":         "F_PB",
+        "CI":         "F_XI",       # catcher's interference
+        "LOB":        "F_LOB",
+        "SB":         "F_SB",
+        "CS":         "F_CS",
+        "PCT":        "F_PCT",
+    },
+}
+
+# Headings of the columns identifying a row, and their standard names
+fields = {
+    "year":       "league.year",
+    "nameLeague": "league.name",
+    "nameClub":   "entry.name",
+    "nameClub1":  "entry.name",
+    "nameLast":   "person.name.last",
+    "nameFirst":  "person.name.given",
+    "bats":       "person.bats",
+    "throws":     "person.throws",
+    "phase":      "phase.name",
+    "division":   "division.name",
+    "dateFirst":  "S_FIRST",
+    "dateLast":   "S_LAST",
+}
+
+# Identifying headings standardised in each kind of sheet; the others are
+# left as they are.  Sheets not listed here standardise all of 'fields'.
+# Batting, Pitching and Fielding sheets have 'nameClub' renamed to
+# 'nameClub1' before they are standardised.
+sheet_fields = {
+    "Batting":      ["year", "nameLeague", "nameClub1", "nameLast",
+                     "nameFirst", "bats", "dateFirst", "dateLast"],
+    "Pitching":     ["year", "nameLeague", "nameClub1", "nameLast",
+                     "nameFirst", "throws"],
+    "Fielding":     ["year", "nameLeague", "nameClub1", "nameLast",
+                     "nameFirst", "throws"],
+    "Managing":     ["year", "nameLeague", "nameClub", "nameLast",
+                     "nameFirst", "phase", "dateFirst", "dateLast"],
+    "Standings":    ["year", "nameLeague", "nameClub", "phase", "division",
+                     "dateFirst", "dateLast"],
+    "TeamBatting":  ["year", "nameLeague", "nameClub", "phase"],
+    "TeamPitching": ["year", "nameLeague", "nameClub", "phase"],
+    "TeamFielding": ["year", "nameLeague", "nameClub", "phase"],
+    "Attendance":   ["year", "nameLeague", "nameClub", "phase"],
+}
+
+# Statistic headings of each kind of sheet whose values the processed
+# tables do not take, although the JSON exporter files them under their
+# codes
+unprocessed = {
+    "Pitching":    ["TBF"],
+    "Standings":   ["G"],
+    "TeamBatting": ["W", "L", "T"],
+}
+
+
+# Columns of each processed table, in order
+tables = {
+    "playing_individual": [
+        'league.year', 'league.name',
+        'person.ref',
+        'person.name.last', 'person.name.given',
+        'person.bats', 'person.throws',
+        'phase.name', 'S_STINT', 'entry.name',
+        'S_FIRST', 'S_LAST',
+        'B_G', 'B_AB', 'B_R', 'B_ER', 'B_H', 'B_TB',
+        'B_1B', 'B_2B', 'B_3B', 'B_HR', 'B_RBI',
+        'B_BB', 'B_IBB', 'B_SO', 'B_GDP', 'B_HP', 'B_SH', 'B_SF',
+        'B_SB', 'B_CS',
+        'B_AVG', 'B_AVG_RANK',
+        'P_G', 'P_GS', 'P_CG', 'P_SHO', 'P_TO', 'P_GF',
+        'P_W', 'P_L', 'P_T', 'P_PCT', 'P_SV',
+        'P_IP', 'P_TBF', 'P_AB', 'P_R', 'P_ER', 'P_H',
+        'P_HR', 'P_BB', 'P_IBB', 'P_SO', 'P_HP', 'P_SH',
+        'P_WP', 'P_BK', 'P_SB',
+        'P_ERA', 'P_ERA_RANK', 'P_AVG',
+        'F_1B_POS', 'F_1B_G', 'F_1B_TC', 'F_1B_PO', 'F_1B_A', 'F_1B_E',
+        'F_1B_DP', 'F_1B_TP', 'F_1B_PCT',
+        'F_2B_POS', 'F_2B_G', 'F_2B_TC', 'F_2B_PO', 'F_2B_A', 'F_2B_E',
+        'F_2B_DP', 'F_2B_TP', 'F_2B_PCT',
+        'F_3B_POS', 'F_3B_G', 'F_3B_TC', 'F_3B_PO', 'F_3B_A', 'F_3B_E',
+        'F_3B_DP', 'F_3B_TP', 'F_3B_PCT',
+        'F_SS_POS', 'F_SS_G', 'F_SS_TC', 'F_SS_PO', 'F_SS_A', 'F_SS_E',
+        'F_SS_DP', 'F_SS_TP', 'F_SS_PCT',
+        'F_OF_POS', 'F_OF_G', 'F_OF_TC', 'F_OF_PO', 'F_OF_A', 'F_OF_E',
+        'F_OF_DP', 'F_OF_TP', 'F_OF_PCT',
+        'F_LF_POS', 'F_LF_G', 'F_LF_TC', 'F_LF_PO', 'F_LF_A', 'F_LF_E',
+        'F_LF_DP', 'F_LF_TP', 'F_LF_PCT',
+        'F_CF_POS', 'F_CF_G', 'F_CF_TC', 'F_CF_PO', 'F_CF_A', 'F_CF_E',
+        'F_CF_DP', 'F_CF_TP', 'F_CF_PCT',
+        'F_RF_POS', 'F_RF_G', 'F_RF_TC', 'F_RF_PO', 'F_RF_A', 'F_RF_E',
+        'F_RF_DP', 'F_RF_TP', 'F_RF_PCT',
+        'F_C_POS', 'F_C_G', 'F_C_INN',
+        'F_C_TC', 'F_C_PO', 'F_C_A', 'F_C_E',
+        'F_C_DP', 'F_C_TP', 'F_C_PB', 'F_C_SB', 'F_C_CS', 'F_C_PCT',
+        'F_P_POS', 'F_P_G', 'F_P_TC', 'F_P_PO', 'F_P_A', 'F_P_E',
+        'F_P_DP', 'F_P_TP', 'F_P_PCT',
+        'F_ALL_G', 'F_ALL_TC', 'F_ALL_PO', 'F_ALL_A', 'F_ALL_E',
+        'F_ALL_DP', 'F_ALL_TP', 'F_ALL_PCT'
+    ],
+    "managing_individual": [
+        'league.year', 'league.name', 'phase.name',
+        'entry.name', 'seq', 'person.ref',
+        'person.name.last', 'person.name.given',
+        'S_FIRST', 'S_LAST'
+    ],
+    "playing_team": [
+        'league.year', 'league.name',
+        'entry.name', 'phase.name', 'division.name',
+        'S_FIRST', 'S_LAST',
+        'R_G', 'R_W', 'R_L', 'R_T', 'R_PCT', 'R_RANK', 'R_ATT',
+        'B_G', 'B_IP', 'B_AB', 'B_R', 'B_ER', 'B_H', 'B_TB',
+        'B_1B', 'B_2B', 'B_3B', 'B_HR', 'B_RBI',
+        'B_BB', 'B_IBB', 'B_SO', 'B_GDP', 'B_HP',
+        'B_SH', 'B_SF', 'B_SB', 'B_CS', 'B_LOB',
+        'B_AVG',
+        'P_G', 'P_CG', 'P_SHO', 'P_GF',
+        'P_W', 'P_L', 'P_T', 'P_PCT', 'P_SV',
+        'P_IP', 'P_TBF', 'P_AB', 'P_R', 'P_ER', 'P_H', 'P_HR',
+        'P_BB', 'P_IBB', 'P_SO', 'P_HP', 'P_SH', 'P_SF',
+        'P_WP', 'P_BK', 'P_ERA',
+        'F_G', 'F_TC', 'F_PO', 'F_A', 'F_E', 'F_DP', 'F_TP',
+        'F_PB', 'F_SB', 'F_CS', 'F_XI', 'F_LOB', 'F_PCT'
+    ],
+}
+
+# Statistics whose values are not whole numbers, other than percentages
+# (codes ending in _PCT).  Innings pitched are recorded with thirds as
+# tenths, e.g. 200.2.
+rates = {"B_AVG", "B_SLG", "P_IP", "P_ERA", "P_AVG", "P_RPG", "P_HPG"}
+
+# Statistics whose values are text
+_text_stats = {"F_POS"}
+
+_field_kinds = {
+    "league.year": YEAR,
+    "S_FIRST":     DATE,
+    "S_LAST":      DATE,
+    "seq":         COUNT,
+}
+
+codes = ({code for sheet in aliases.values() for code in sheet.values()} |
+         {col for columns in tables.values() for col in columns
+          if col[:2] in _stat_prefixes})
+
+
+def kind(col):
+    """Return the kind of values held in the standardised column 'col'.
+    """
+    if col in _field_kinds:
+        return _field_kinds[col]
+    if col[:2] not in _stat_prefixes or col in _text_stats:
+        return TEXT
+    if col in rates or col.endswith("_PCT"):
+        return RATE
+    return COUNT
+
+
+def is_integer(col):
+    """Return True if 'col' holds values which should be integers.
+    Dates are recorded as YYYYMMDD, and so are integers too.
+    """
+    return kind(col) in [COUNT, DATE]
+
+
+def dtype(col):
+    """Return the pandas dtype for the standardised column 'col'.
+    """
+    return {YEAR: "Int64", COUNT: "Int64", RATE: "float64",
+            DATE: "string", TEXT: "string"}[kind(col)]
+
+
+def stat_map(sheet, columns, headings=None):
+    """Return a mapping from each statistic heading among 'columns' of a
+    sheet of kind 'sheet' to its code.  If 'headings' is given, only
+    those headings are mapped.
+    """
+    sheet_aliases = aliases.get(sheet, {})
+    return {col: sheet_aliases.get(col, col) for col in columns
+            if (col in sheet_aliases or col in codes) and
+            (headings is None or col in headings)}
+
+
+def standardize(df, sheet=None, stats=True):
+    """Return 'df', a sheet of kind 'sheet', with its identifying columns
+    renamed to their standard names, and, if 'stats' is set, its
+    statistic columns to their codes as the processed tables take them.
+    If 'sheet' is None, all identifying columns are renamed and the
+    statistic columns are left alone.
+    """
+    columns = {heading: fields[heading]
+               for heading in sheet_fields.get(sheet, fields)}
+    if sheet is not None and stats:
+        columns.update({col: code for (col, code)
+                        in stat_map(sheet, df.columns).items()
+                        if col not in unprocessed.get(sheet, [])})
+    return df.rename(columns=columns)
+
+
+def _is_null(values):
+    # As pd.concat, ignore null and empty columns when choosing a dtype,
+    # except those of a type which cannot hold nulls.
+    if values.dtype.kind in "biu":
+        return False
+    return len(values) == 0 or values.isnull().all()
+
+
+def _summary(values):
+    """Return what _assembled_dtype needs to know of the column 'values'
+    of one frame: its dtype, and whether it counts as null.
+    """
+    return (values.dtype, _is_null(values))
+
+
+def _common_dtype(dtypes):
+    dtypes = list(dict.fromkeys(dtypes))
+    if len(dtypes) == 1:
+        return dtypes[0]
+    if all(d.kind in "iuf" for d in dtypes):
+        return np.result_type(*dtypes)
+    # As pd.concat, booleans mixed with numbers are objects
+    return np.dtype(object)
+
+
+def _assembled_dtype(parts, complete):
+    """Return the dtype pd.concat gives a column, from the summaries
+    'parts' of it in the frames which have it; 'complete' is set if all
+    the frames have it.
+    """
+    if not parts:
+        return np.dtype(object)
+    first = parts[0][0]
+    if complete and not any(null for (_, null) in parts) and \
+       all(dtype == first or (dtype.kind in "biu" and first.kind != "O")
+           for (dtype, _) in parts):
+        # Concatenated by numpy alone, which makes numbers of booleans
+        return np.result_type(*[dtype for (dtype, _) in parts])
+    common = _common_dtype([dtype for (dtype, null) in parts if not null] or
+                           [dtype for (dtype, _) in parts])
+    if not complete:
+        # The rows of frames without the column are null
+        if common.kind in "iu":
+            return np.dtype(np.float64)
+        if common.kind == "b":
+            return np.dtype(object)
+        return common
+    if common.kind in "biu":
+        # Null columns are not recast to a type which cannot hold their
+        # nulls, but kept as they are
+        return _common_dtype([dtype for (dtype, _) in parts])
+    return common
+
+
+class Assembler(object):
+    """Works out the dtypes of the columns of 'table' assembled from a
+    sequence of frames, holding only a summary of each frame, so that
+    the frames can be assembled one at a time with cast().  The number
+    of non-null values in each column is counted in 'counts'.
+    """
+    def __init__(self, table):
+        self.columns = tables[table]
+        self.frames = 0
+        self._parts = {col: [] for col in self.columns}
+        self.counts = {col: 0 for col in self.columns}
+
+    def add(self, df):
+        self.frames += 1
+        for col in self.columns:
+            if col in df:
+                self._parts[col].append(_summary(df[col]))
+                self.counts[col] += int(df[col].notnull().sum())
+
+    def extend(self, other):
+        """Add the frames summarised by the Assembler 'other', of the
+        same table.
+        """
+        self.frames += other.frames
+        for col in self.columns:
+            self._parts[col].extend(other._parts[col])
+            self.counts[col] += other.counts[col]
+
+    def dtypes(self):
+        return {col: _assembled_dtype(parts, len(parts) == self.frames)
+                for (col, parts) in self._parts.items()}
+
+    def cast(self, frames, dtypes):
+        """Return the rows of 'frames' in turn, as one DataFrame with
+        the columns of the table in 'dtypes'.
+        """
+        lengths = [len(df) for df in frames]
+        offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+        data = {}
+        for col in self.columns:
+            dtype = dtypes[col]
+            array = np.empty(offsets[-1], dtype=dtype)
+            if any(col not in df for df in frames):
+                array[:] = np.nan if dtype.kind == "f" else None
+            for (i, df) in enumerate(frames):
+                if col in df:
+                    array[offsets[i]:offsets[i+1]] = \
+                        df[col].to_numpy(dtype=dtype)
+            data[col] = array
+        return pd.DataFrame(data, columns=self.columns)
+
+
+def assemble(frames, table):
+    """Return the rows of 'frames' in turn, as one DataFrame with the
+    columns of 'table'.  Each column is allocated once, with the dtype
+    pd.concat would give it, and filled from each frame in place; columns
+    a frame does not have are null for its rows.
+    """
+    assembler = Assembler(table)
+    for df in frames:
+        assembler.add(df)
+    return assembler.cast(frames, assembler.dtypes())
@@ -0,0 +1,431 @@
+"""Read-only HTTP query service over the processed tables.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+The processed tables of every source are loaded once and indexed in
+memory.  Queries are answered as JSON over HTTP GET:
+
+  /sources                               sources and their row counts
+  /league?year=1915&name=Texas League    everything in a league-season
+  /club?name=Waco                        everything for a club
+  /people?surname=Sm                     people whose surname starts so
+  /person?ref=B00013                     rows for a person.ref
+
+Each query other than /sources also accepts 'source' and 'year' to
+narrow the results.  A person.ref identifies a person only within one
+workbook, so /person is usually given 'source' and 'year' as well.
+Responses are cached, and a source is reloaded when its processed files
+change.
+"""
+import asyncio
+import collections
+import json
+import pathlib
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from . import leagues
+from . import loader
+
+
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _stamp(source, root):
+    """Return the names, sizes and modification times of the processed
+    files of 'source', which change whenever the source is rewritten.
+    """
+    stamp = []
+    for path in sorted((pathlib.Path(root)/source).iterdir()):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stamp.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(stamp)
+
+
+def _group_index(keys):
+    """Return a dict mapping each distinct value of the Series 'keys' to
+    the array of positions at which it occurs.
+    """
+    return {key: rows for (key, rows)
+            in keys.groupby(keys, sort=False).indices.items()}
+
+
+class SourceIndex(object):
+    """The processed tables of one source, indexed for lookups.
+    """
+    def __init__(self, source, root="processed"):
+        self.source = source
+        self.stamp = _stamp(source, root)
+        self.tables = {table: loader.load(source, table, root=root)
+                       for table in loader.tables}
+        self._leagues = {}
+        self._clubs = {}
+        self._refs = {}
+        self._surnames = {}
+        for (table, df) in self.tables.items():
+            keys = pd.Series(list(zip(df["league.year"],
+                                      df["league.name"].astype(object))),
+                             dtype=object)
+            self._leagues[table] = _group_index(keys)
+            self._clubs[table] = _group_index(
+                df["entry.name"].astype(object).map(leagues.club_key)
+            )
+            if "person.ref" not in df:
+                continue
+            self._refs[table] = _group_index(df["person.ref"].astype(object))
+            names = df["person.name.last"].astype(object).fillna("") \
+                                          .str.lower().to_numpy(dtype=str)
+            order = np.argsort(names, kind="stable")
+            self._surnames[table] = (names[order], order)
+
+    def rows(self, table):
+        return len(self.tables[table])
+
+    def league(self, table, year, name):
+        return self._leagues[table].get((year, name), [])
+
+    def club(self, table, name):
+        return self._clubs[table].get(leagues.club_key(name), [])
+
+    def person(self, table, ref):
+        return self._refs.get(table, {}).get(ref, [])
+
+    def surname(self, table, prefix):
+        if table not in self._surnames:
+            return []
+        (names, order) = self._surnames[table]
+        prefix = prefix.lower()
+        lo = np.searchsorted(names, prefix, side="left")
+        hi = np.searchsorted(names, prefix + "\uffff", side="left")
+        return np.sort(order[lo:hi])
+
+    def records(self, table, rows, year=None):
+        """Return the rows at positions 'rows' of 'table' as a list of
+        dicts without null entries, keeping only 'year' if given.
+        """
+        df = self.tables[table].iloc[rows]
+        if year is not None:
+            df = df[df["league.year"] == year]
+        return [{k: v for (k, v) in rec.items() if not pd.isnull(v)}
+                for rec in df.astype(object).to_dict(orient="records")]
+
+
+class ResponseCache(object):
+    """A least-recently-used cache of encoded responses, bounded by their
+    total size.
+    """
+    def __init__(self, max_bytes=64*1024*1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._responses = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            body = self._responses[key]
+        except KeyError:
+            return None
+        self._responses.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._responses:
+            self.size -= len(self._responses.pop(key))
+        self._responses[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            (_, oldest) = self._responses.popitem(last=False)
+            self.size -= len(oldest)
+
+    def clear(self):
+        self._responses.clear()
+        self.size = 0
+
+
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return str(value)
+
+
+class Service(object):
+    """Answers queries from the indexed tables of every source under
+    'root'.
+    """
+    def __init__(self, root="processed", cache_bytes=64*1024*1024):
+        self.root = root
+        self.indexes = {}
+        self.responses = ResponseCache(cache_bytes)
+
+    def _sources(self):
+        return loader.sources(self.root) \
+            if pathlib.Path(self.root).is_dir() else []
+
+    def refresh(self):
+        """Load sources which are new or whose processed files have
+        changed, and drop those which have gone.  Returns the names of
+        the sources affected.  The set of indexes is replaced as a whole,
+        so this may run in another thread while queries are answered.
+        A source which cannot be loaded, such as one whose files are
+        being rewritten, keeps its old index and is tried again at the
+        next refresh.
+        """
+        indexes = {}
+        changed = []
+        for source in self._sources():
+            index = self.indexes.get(source)
+            if index is None or index.stamp != _stamp(source, self.root):
+                try:
+                    index = SourceIndex(source, self.root)
+                except Exception as exc:
+                    print(f"Could not load {source}: {exc!r}")
+                    if index is None:
+                        continue
+                else:
+                    changed.append(source)
+            indexes[source] = index
+        changed.extend(source for source in self.indexes
+                       if source not in indexes)
+        self.indexes = indexes
+        return changed
+
+    def _select(self, params):
+        source = params.get("source")
+        if source is None:
+            return list(self.indexes.values())
+        if source not in self.indexes:
+            raise QueryError(404, f"Unknown source {source}")
+        return [self.indexes[source]]
+
+    @staticmethod
+    def _year(params, required=False):
+        if "year" not in params:
+            if required:
+                raise QueryError(400, "Parameter 'year' is required")
+            return None
+        try:
+            return int(params["year"])
+        except ValueError:
+            raise QueryError(400, f"Invalid year {params['year']!r}")
+
+    @staticmethod
+    def _required(params, name):
+        value = params.get(name)
+        if not value:
+            raise QueryError(400, f"Parameter '{name}' is required")
+        return value
+
+    def _collect(self, params, tables, lookup, year=None):
+        result = {table: [] for table in tables}
+        for index in self._select(params):
+            for table in tables:
+                result[table].extend(
+                    index.records(table, lookup(index, table), year)
+                )
+        return result
+
+    def query(self, path, params):
+        """Return the answer to the query 'path' with 'params' as a
+        JSON-serialisable object.
+        """
+        if path == "/sources":
+            return {index.source: {table: index.rows(table)
+                                   for table in loader.tables}
+                    for index in self.indexes.values()}
+        if path == "/league":
+            year = self._year(params, required=True)
+            name = self._required(params, "name")
+            return self._collect(params, loader.tables,
+                                 lambda index, table:
+                                 index.league(table, year, name))
+        if path == "/club":
+            name = self._required(params, "name")
+            return self._collect(params, loader.tables,
+                                 lambda index, table: index.club(table, name),
+                                 self._year(params))
+        people = ["playing_individual", "managing_individual"]
+        if path == "/people":
+            prefix = self._required(params, "surname")
+            return self._collect(params, people,
+                                 lambda index, table:
+                                 index.surname(table, prefix),
+                                 self._year(params))
+        if path == "/person":
+            ref = self._required(params, "ref")
+            return self._collect(params, people,
+                                 lambda index, table: index.person(table, ref),
+                                 self._year(params))
+        raise QueryError(404, f"Unknown query {path}")
+
+    def respond(self, target):
+        """Return the status and encoded body answering the request for
+        'target'.  Successful responses are cached.
+        """
+        url = urllib.parse.urlsplit(target)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        key = (url.path, tuple(sorted(params.items())))
+        body = self.responses.get(key)
+        if body is not None:
+            return (200, body)
+        try:
+            body = json.dumps(self.query(url.path, params),
+                              default=_json_default).encode("utf-8")
+        except QueryError as exc:
+            return (exc.status,
+                    json.dumps({"error": str(exc)}).encode("utf-8"))
+        except Exception as exc:
+            print(f"Error answering {target}: {exc!r}")
+            return (500, b'{"error": "Internal error"}')
+        self.responses.put(key, body)
+        return (200, body)
+
+
+async def _read_request(reader):
+    """Read one request, returning its method, target, version and
+    headers, or None at the end of the connection.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        (method, target, version) = line.decode("latin-1").split()
+    except ValueError:
+        raise QueryError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in [b"\r\n", b"\n", b""]:
+            break
+        (name, _, value) = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0") or "0")
+    except ValueError:
+        raise QueryError(400, "Invalid Content-Length")
+    if length:
+        await reader.readexactly(length)
+    return (method, target, version, headers)
+
+
+def _response(status, body, keep_alive):
+    head = (f"HTTP/1.1 {status} {_reasons[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n")
+    return head.encode("latin-1") + body
+
+
+class Server(object):
+    """Serves a Service over HTTP, reloading changed sources every
+    'interval' seconds.
+    """
+    def __init__(self, service, interval=2.0):
+        self.service = service
+        self.interval = interval
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except QueryError as exc:
+                    writer.write(_response(
+                        exc.status,
+                        json.dumps({"error": str(exc)}).encode("utf-8"),
+                        False))
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as exc:
+                    print(f"Error reading request: {exc!r}")
+                    writer.write(_response(
+                        500, b'{"error": "Internal error"}', False))
+                    break
+                if request is None:
+                    break
+                (method, target, version, headers) = request
+                keep_alive = (version == "HTTP/1.1" and
+                              headers.get("connection", "").lower() !=
+                              "close")
+                if method != "GET":
+                    (status, body) = (405, b'{"error": "Only GET is '
+                                           b'supported"}')
+                else:
+                    (status, body) = self.service.respond(target)
+                writer.write(_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def reload(self):
+        """Reload changed sources in a worker thread, so that queries
+        continue to be answered from the old indexes meanwhile.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                changed = await loop.run_in_executor(None,
+                                                     self.service.refresh)
+            except Exception as exc:
+                # Keep serving from the old indexes, and try again
+                print(f"Reload failed: {exc!r}")
+                continue
+            if changed:
+                self.service.responses.clear()
+                print(f"Reloaded {', '.join(changed)}")
+
+    async def run(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        reloader = asyncio.ensure_future(self.reload())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reloader.cancel()
+
+
+def serve(host="127.0.0.1", port=8000, root="processed", interval=2.0):
+    """Load the processed tables in 'root' and answer queries on
+    'host':'port' until interrupted.
+    """
+    service = Service(root)
+    service.refresh()
+    print(f"Serving {len(service.indexes)} source(s) on "
+          f"http://{host}:{port}/")
+    asyncio.run(Server(service, interval).run(host, port))
@@ -0,0 +1,210 @@
+"""On-disk cache of parsed worksheets.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Sheets are stored as pickled DataFrames, named by a digest of the
+workbook's contents, the sheet name, the reader (see readers.py) and the
+arguments used to read it.  Pickles keep the numpy column blocks and the
+exact dtypes that the reader produced, including mixed-type object
+columns, so a cached sheet is indistinguishable from a freshly parsed
+one.  The list of sheet names in each workbook is cached alongside, so
+that a request for a sheet which does not exist is also answered
+without opening the workbook.
+
+The cache lives in $HGAME_CACHE_DIR, or ~/.cache/hgame-averages if that
+is not set.  Its total size is capped at $HGAME_CACHE_SIZE megabytes
+(default 1024); the least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import os
+import pathlib
+
+import pandas as pd
+
+from . import readers
+
+
+_hashes = {}
+
+# Running total of the size of the cache, computed when first needed
+_size = None
+
+
+def cache_dir():
+    """Return the directory holding the cache.
+    """
+    path = os.environ.get("HGAME_CACHE_DIR")
+    if path is None:
+        return pathlib.Path.home()/".cache"/"hgame-averages"
+    return pathlib.Path(path)
+
+
+def max_bytes():
+    """Return the maximum total size of the cache, in bytes.
+    """
+    return int(os.environ.get("HGAME_CACHE_SIZE", "1024")) * 1024 * 1024
+
+
+def workbook_hash(fn):
+    """Return the digest of the contents of the workbook 'fn'.  Digests
+    are remembered for as long as the file's size and mtime are unchanged.
+    """
+    stat = os.stat(fn)
+    key = (str(fn), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        with open(fn, "rb") as f:
+            _hashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return _hashes[key]
+
+
+def _entry(fn, *parts):
+    digest = hashlib.sha256(
+        json.dumps([workbook_hash(fn)] + list(parts),
+                   sort_keys=True, default=repr).encode("utf-8")
+    ).hexdigest()
+    return cache_dir()/digest[:2]/digest
+
+
+def _store(path, write):
+    global _size
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + ".tmp%d" % os.getpid())
+    write(temp)
+    temp.replace(path)
+    if _size is None:
+        _size = sum(p.stat().st_size for p in _entries())
+    else:
+        _size += path.stat().st_size
+    if _size > max_bytes():
+        evict()
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def sheet_names(fn):
+    """Return the names of the sheets in workbook 'fn', in order.
+    """
+    path = _entry(fn, "sheets").with_suffix(".json")
+    if path.exists():
+        _touch(path)
+        with path.open() as f:
+            return json.load(f)
+    names = readers.get_reader().sheet_names(fn)
+
+    def write(temp):
+        with temp.open("w") as f:
+            json.dump(names, f)
+    _store(path, write)
+    return names
+
+
+def read_excel(fn, sheet_name, **kwargs):
+    """Read 'sheet_name' from workbook 'fn', as pd.read_excel does, using
+    the cached copy if there is one.  If 'sheet_name' is a list of names,
+    or None for all sheets, return a dict of those sheets; the ones not
+    cached are read from one opening of the workbook.  A missing sheet
+    raises readers.SheetNotFound.
+    """
+    names = sheet_names(fn)
+    if sheet_name is None:
+        wanted = names
+    elif isinstance(sheet_name, list):
+        wanted = sheet_name
+    else:
+        wanted = [sheet_name]
+    for name in wanted:
+        if name not in names:
+            raise readers.SheetNotFound(fn, name)
+    reader = readers.get_reader()
+    paths = {name: _entry(fn, "sheet", name, reader.name,
+                          kwargs).with_suffix(".pkl")
+             for name in wanted}
+    sheets = {}
+    for name in wanted:
+        if paths[name].exists():
+            _touch(paths[name])
+            sheets[name] = pd.read_pickle(paths[name])
+    missing = [name for name in wanted if name not in sheets]
+    if missing:
+        for (name, df) in reader.read_sheets(fn, missing, **kwargs).items():
+            _store(paths[name], df.to_pickle)
+            sheets[name] = df
+    if sheet_name is None or isinstance(sheet_name, list):
+        return {name: sheets[name] for name in wanted}
+    return sheets[sheet_name]
+
+
+def _entries():
+    root = cache_dir()
+    if not root.exists():
+        return []
+    return [p for p in root.glob("*/*")
+            if p.is_file() and p.suffix in [".pkl", ".json"]]
+
+
+def evict():
+    """Remove least recently used entries until the cache fits its cap.
+    """
+    global _size
+    entries = []
+    for path in _entries():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total = sum(size for (_, size, _) in entries)
+    limit = max_bytes()
+    for (_, size, path) in entries:
+        if total <= limit:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+    _size = total
+
+
+def stats():
+    """Return a dict summarising the contents of the cache.
+    """
+    entries = _entries()
+    return {
+        "directory": str(cache_dir()),
+        "sheets": sum(1 for p in entries if p.suffix == ".pkl"),
+        "workbooks": sum(1 for p in entries if p.suffix == ".json"),
+        "bytes": sum(p.stat().st_size for p in entries),
+        "max_bytes": max_bytes(),
+    }
+
+
+def clear():
+    """Remove every entry from the cache.
+    """
+    global _size
+    for path in _entries():
+        path.unlink()
+    _size = 0
@@ -0,0 +1,97 @@
+"""Expansion of multi-club entries into per-club stints.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+A person who played for more than one club has the clubs recorded in
+columns nameClub1, nameClub2, ..., in the order of the stints.  Each
+entry is either the name of the club, or 'games@club' where the number
+of games with that club is known.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Matches 'games@club' or 'club'; anything between the first and last '@'
+# is discarded, as the transcriptions have always done.
+_club_pattern = r"^(?:(?P<games>[^@]*)@)?(?:.*@)?(?P<club>[^@]*)$"
+
+# Sort key for S_STINT values which are not stint numbers (the 'T' of a
+# multi-club total), placing them after all of the stints.
+_total_key = np.iinfo(np.int64).max
+
+
+def numbered_columns(columns, pattern):
+    """Return the columns matching 'pattern', which contains '{}' where
+    the number appears, as a list of (number, column) in numeric order.
+    """
+    regex = re.compile(re.escape(pattern).replace(r"\{\}", r"(\d+)"))
+    return sorted((int(m.group(1)), col)
+                  for col in columns
+                  for m in [regex.fullmatch(col)] if m)
+
+
+def club_column_map(columns, template, offset=0):
+    """Return a mapping from each nameClubN in 'columns' to 'template'
+    formatted with N + 'offset'.
+    """
+    return {col: template.format(n + offset)
+            for (n, col) in numbered_columns(columns, "nameClub{}")}
+
+
+def split_club(values):
+    """Split each 'games@club' entry of the Series 'values', returning a
+    DataFrame with columns 'games' (null if not given) and 'club'.
+    """
+    return values.astype(object).str.extract(_club_pattern)
+
+
+def expand_stints(multiclub, g_label):
+    """Return one row per club for each row of 'multiclub', with columns
+    'person.ref', 'nameClub1', 'S_STINT' and 'g_label' (the games with
+    the club).  Rows are ordered by person, then by stint.
+    """
+    columns = numbered_columns(multiclub.columns, "nameClub{}")
+    values = pd.Series(multiclub[[col for (_, col) in columns]]
+                       .to_numpy(dtype=object).ravel())
+    keep = values.notnull().to_numpy()
+    parts = split_club(values[keep])
+    return pd.DataFrame({
+        'person.ref': np.repeat(multiclub['person.ref'].to_numpy(),
+                                len(columns))[keep],
+        'nameClub1': parts['club'].to_numpy(),
+        'S_STINT': np.tile([str(n) for (n, _) in columns],
+                           len(multiclub))[keep],
+        g_label: parts['games'].to_numpy()
+    })
+
+
+def sort_stints(df):
+    """Return 'df' ordered by person and then by stint, with any multi-club
+    total row following the person's stints.  The ordering is stable.
+
+    People are ordered by their first appearance in 'df'.  As person.ref
+    values are assigned in sheet order, this is also the order of
+    person.ref when rows from expand_stints are appended to a sheet.
+    """
+    (person, _) = pd.factorize(df['person.ref'])
+    stint = pd.to_numeric(pd.Series(df['S_STINT'].to_numpy()),
+                          errors='coerce') \
+              .fillna(_total_key).to_numpy()
+    return df.take(np.lexsort((stint, person)))
@@ -0,0 +1,115 @@
+"""Selection of part of a source for processing.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+A Selection restricts processing to some leagues, seasons, workbooks or
+sheets; each criterion left as None selects everything.  Workbooks are
+chosen by name first, and then by the leagues and seasons the catalogue
+records for them, so that workbooks which are not selected are never
+opened.  Only the selected sheets of a workbook are parsed.  A league
+is selected by any part of its name, without regard to case, and a
+workbook by its file name, with or without the .xls suffix, or a
+wildcard pattern.
+
+The JSON and TOML outputs number their records by row within each sheet,
+so for them leagues and seasons select whole workbooks, and records are
+not filtered within a workbook.
+"""
+import collections
+import fnmatch
+import pathlib
+
+import pandas as pd
+
+from . import catalog
+
+
+Selection = collections.namedtuple(
+    "Selection", ["leagues", "seasons", "workbooks", "sheets"]
+)
+Selection.__new__.__defaults__ = (None, None, None, None)
+
+
+def is_empty(selection):
+    """Return True if 'selection' is None or selects everything.
+    """
+    return selection is None or all(v is None for v in selection)
+
+
+def _matches_name(fn, patterns):
+    path = pathlib.Path(fn)
+    return any(fnmatch.fnmatch(path.name, p) or
+               fnmatch.fnmatch(path.stem, p) for p in patterns)
+
+
+def _matches_leagues(names, leagues):
+    names = [name.lower() for name in names]
+    return any(league.lower() in name for league in leagues
+               for name in names)
+
+
+def select_workbooks(fns, selection, root="processed"):
+    """Return those of the workbooks 'fns' which 'selection' selects.
+    """
+    if is_empty(selection):
+        return list(fns)
+    if selection.workbooks is not None:
+        fns = [fn for fn in fns if _matches_name(fn, selection.workbooks)]
+    if selection.leagues is None and selection.seasons is None:
+        return list(fns)
+    selected = []
+    for (fn, entry) in zip(fns, catalog.lookup(fns, root)):
+        items = entry["leagues"].split(catalog.separator) \
+            if entry["leagues"] else []
+        if selection.leagues is not None and \
+           not _matches_leagues(items, selection.leagues):
+            continue
+        items = entry["seasons"].split(catalog.separator) \
+            if entry["seasons"] else []
+        if selection.seasons is not None and \
+           not set(map(str, selection.seasons)) & set(items):
+            continue
+        selected.append(fn)
+    return selected
+
+
+def selects_sheet(selection, sheet):
+    """Return True if 'selection' includes sheets named 'sheet'.
+    """
+    return selection is None or selection.sheets is None or \
+        sheet in selection.sheets
+
+
+def filter_rows(df, selection):
+    """Return the rows of the processed table 'df' in the selected
+    leagues and seasons.  Rows are filtered after the workbook has been
+    processed, so that references numbered by row are the same as in a
+    full build.
+    """
+    if is_empty(selection) or not len(df):
+        return df
+    keep = pd.Series(True, index=df.index)
+    if selection.seasons is not None:
+        keep &= pd.to_numeric(df['league.year'], errors='coerce') \
+                  .isin(selection.seasons)
+    if selection.leagues is not None:
+        names = df['league.name'].astype(str).str.lower()
+        keep &= names.apply(lambda name:
+                            any(league.lower() in name
+                                for league in selection.leagues))
+    return df[keep].reset_index(drop=True)
@@ -5,6 +5,16 @@ from collections import OrderedDict
 import numpy as np
 import pandas as pd
 
+from . import compression
+from . import headtohead
+from . import normalize
+from . import refs
+from . import report
+from . import schema
+from . import sheetcache
+from . import stints
+from . import subset
+
 
 def dropnull(rec):
     if not isinstance(rec, dict):
@@ -17,24 +27,13 @@ def dropnull(rec):
 
 
 def extract_club_splits(df, prefix):
-    def split_games(x):
-        if pd.isnull(x):
-            return x
-        if "@" in x:
-            return x.split("@")[0]
-        else:
-            return None
-
-    i = 1
-    while True:
-        colname = f"club{i}_name"
-        if colname not in df:
-            return df
+    for (i, colname) in stints.numbered_columns(df.columns, "club{}_name"):
+        parts = stints.split_club(df[colname])
         df.insert(loc=df.columns.get_loc(colname)+1,
                   column=f"club{i}_{prefix}_G",
-                  value=df[colname].apply(split_games))
-        df[colname] = df[colname].str.split("@").str[-1]
-        i += 1
+                  value=parts["games"])
+        df[colname] = parts["club"]
+    return df
 
 
 def format_percentages(df):
@@ -81,25 +80,66 @@ def format_dates(df):
     return df
 
 
-def format_names(df):
-    for col in ["name_last", "name_first"]:
-        if col in df:
-            df[col] = df[col].str.replace(chr(8220), '"')
-            df[col] = df[col].str.replace(chr(8221), '"')
-            df[col] = df[col].str.replace(chr(8217), "'")
-    return df
+def row_keys(df, sheet, book=None):
+    """Return the _row of each row of 'df', a sheet of kind 'sheet': its
+    number, or its stable reference in workbook 'book' if given, which
+    is the person.ref of the processed tables.
+    """
+    if book is None:
+        return np.arange(len(df))+1
+    return refs.sheet_refs(df, sheet, book)
 
 
-def add_row_metadata(df, table):
+def add_row_metadata(df, table, keys):
     df.insert(loc=0, column='_table', value=table)
-    df.insert(loc=1, column='_row', value=np.arange(len(df))+1)
+    df.insert(loc=1, column='_row', value=keys)
     return df
 
 
-def rename_columns(df, column_map):
+# Statistic headings of each kind of sheet filed under totals
+totals_headings = {
+    "Standings":    ["G", "W", "L", "T", "PCT", "RANK"],
+    "Attendance":   ["ATT"],
+    "TeamBatting":  ["G", "IP", "AB", "R", "OR", "ER", "H", "TB", "EB",
+                     "H1B", "H2B", "H3B", "HR", "RBI", "BB", "IBB", "SO",
+                     "GDP", "HP", "SH", "SF", "SB", "CS", "ROE", "LOB",
+                     "AVG", "SLG", "W", "L", "T"],
+    "TeamPitching": ["GP", "APP", "GS", "CG", "SHO", "GF", "W", "L", "T",
+                     "PCT", "IP", "AB", "R", "ER", "H", "HR", "BB", "IBB",
+                     "SO", "HB", "SH", "SF", "WP", "BK", "SB", "CS", "ERA"],
+    "TeamFielding": ["G", "TC", "PO", "A", "E", "DP", "TP", "PB", "SB",
+                     "CS", "PCT", "P_W", "P_L", "P_T"],
+    "Batting":      ["Pos", "G", "AB", "R", "ER", "H", "TB", "EB", "H1B",
+                     "H2B", "H3B", "HR", "RBI", "BB", "IBB", "SO", "GDP",
+                     "HP", "SH", "SF", "SB", "CS", "AVG", "AVG_RANK",
+                     "SLG"],
+    "Pitching":     ["GP", "GS", "REL", "EIG", "0H", "1H", "2H", "3H", "4H",
+                     "5H", "CG", "SHO", "TO", "GF", "DEC", "W", "L", "T",
+                     "ND", "PCT", "IP", "TBF", "AB", "R", "R/G", "ER", "H",
+                     "H/G", "TB", "H2B", "H3B", "HR", "BB", "IBB", "SO",
+                     "HB", "SH", "WP", "BK", "SB", "AVG", "ERA",
+                     "ERA_RANK"],
+    "Fielding":     ["Pos", "G", "ALL_G", "INN", "TC", "PO", "ALL_PO", "A",
+                     "ALL_A", "E", "ALL_E", "DP", "ALL_DP", "TP", "PB",
+                     "SB", "CS", "CN", "PCT", "ALL_PCT", "P_WP"],
+}
+
+
+def stat_columns(sheet, columns):
+    # Totals over all fielding positions are labelled UT (utility)
+    return {col: "totals_" + code.replace("F_ALL_", "F_UT_")
+            for (col, code)
+            in schema.stat_map(sheet, columns,
+                               totals_headings.get(sheet, [])).items()}
+
+
+def rename_columns(df, sheet, column_map):
+    column_map = {**stints.club_column_map(df.columns, "club{}_name"),
+                  **stat_columns(sheet, df.columns),
+                  **column_map}
     unknown = [c for c in df.columns if c not in column_map.keys()]
     if unknown:
-        print(f"WARNING: Unknown columns {unknown}")
+        report.warn(f"Unknown columns {unknown}")
     df = df.rename(columns=column_map)
     if "game_type" not in df:
         df.insert(loc=df.columns.get_loc("league_name")+1,
@@ -112,24 +152,19 @@ def rename_columns(df, column_map):
     return df
 
 
-def extract_standings_team(df):
+def extract_standings_team(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
         "nameClub":        "name_short",
         "division":        "division_name",
         "phase":           "game_type",
-        "G":               "totals_R_G",
-        "W":               "totals_R_W",
-        "L":               "totals_R_L",
-        "T":               "totals_R_T",
-        "PCT":             "totals_R_PCT",
-        "RANK":            "totals_R_RANK",
         "NOTES":           "NOTES",
     }
+    keys = row_keys(df, "Standings", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "standings")
+        df.pipe(rename_columns, "Standings", column_map)
+        .pipe(add_row_metadata, "standings", keys)
         .pipe(format_percentages)
         .pipe(format_dates)
         .pipe(transform_team_name)
@@ -144,40 +179,37 @@ def extract_standings_team(df):
     }
 
 
-def extract_head_to_head(df):
-    # TODO: Format for head-to-head records
-    return {}
-    df = pd.melt(df, id_vars=["year", "nameLeague", "nameClub"],
-                 var_name="opponent_name", value_name="R_W")
-    column_map = {
-        "year":            "league_season",
-        "nameLeague":      "league_name",
-        "nameClub":        "club_name",
-        "phase":           "game_type",
-        "opponent_name":   "opponent_name",
-        "R_W":             "R_W",
-    }
-    df = (
-        df[~df["R_W"].isnull()]
-        .pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "headtohead_team", "playing_team")
-        .pipe(format_percentages)
-        .pipe(format_dates)
-    )
-    return [dropnull(x) for x in df.to_dict(orient='records')]
-
-
-def extract_attendance_team(df):
+def extract_head_to_head(df, book=None):
+    grids = headtohead.matrices(schema.standardize(df))
+    records = []
+    for grid in grids:
+        for (club, wins) in zip(grid.clubs, grid.wins):
+            records.append({
+                "_table": "headtohead",
+                "_row": (len(records) + 1 if book is None else
+                         refs.make_ref("TH", len(records) + 1, book)),
+                "league_season": grid.year,
+                "league_name": grid.league,
+                "game_type": grid.phase,
+                "name": club,
+                "wins": {opponent: int(n)
+                         for (opponent, n) in zip(grid.clubs, wins)
+                         if n != headtohead.MISSING}
+            })
+    return {"head_to_head": records}
+
+
+def extract_attendance_team(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
         "nameClub":        "name_short",
         "phase":           "game_type",
-        "ATT":             "totals_R_ATT",
     }
+    keys = row_keys(df, "Attendance", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "attendance")
+        df.pipe(rename_columns, "Attendance", column_map)
+        .pipe(add_row_metadata, "attendance", keys)
         .pipe(format_percentages)
         .pipe(format_dates)
         .pipe(transform_team_name)
@@ -211,46 +243,17 @@ def transform_team_playing(df):
     return df
 
 
-def extract_batting_team(df):
+def extract_batting_team(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
         "nameClub":        "name_short",
         "phase":           "game_type",
-        "G":               "totals_B_G",
-        "IP":              "totals_B_IP",    # team innings batted - rare
-        "AB":              "totals_B_AB",
-        "R":               "totals_B_R",
-        "OR":              "totals_P_R",
-        "ER":              "totals_B_ER",
-        "H":               "totals_B_H",
-        "TB":              "totals_B_TB",
-        "EB":              "totals_B_EB",    # "extra bases"
-        "H1B":             "totals_B_1B",
-        "H2B":             "totals_B_2B",
-        "H3B":             "totals_B_3B",
-        "HR":              "totals_B_HR",
-        "RBI":             "totals_B_RBI",
-        "BB":              "totals_B_BB",
-        "IBB":             "totals_B_IBB",
-        "SO":              "totals_B_SO",
-        "GDP":             "totals_B_GDP",
-        "HP":              "totals_B_HP",
-        "SH":              "totals_B_SH",
-        "SF":              "totals_B_SF",
-        "SB":              "totals_B_SB",
-        "CS":              "totals_B_CS",
-        "ROE":             "totals_B_ROE",
-        "LOB":             "totals_B_LOB",
-        "AVG":             "totals_B_AVG",
-        "SLG":             "totals_B_SLG",
-        "W":               "totals_R_W",
-        "L":               "totals_R_L",
-        "T":               "totals_R_T"
     }
+    keys = row_keys(df, "TeamBatting", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "batting")
+        df.pipe(rename_columns, "TeamBatting", column_map)
+        .pipe(add_row_metadata, "batting", keys)
         .pipe(format_percentages)
         .pipe(transform_team_name)
         .pipe(transform_totals)
@@ -264,43 +267,17 @@ def extract_batting_team(df):
     }
 
 
-def extract_pitching_team(df):
+def extract_pitching_team(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
         "nameClub":        "name_short",
         "phase":           "game_type",
-        "GP":              "totals_P_G",
-        "APP":             "totals_P_APP",
-        "GS":              "totals_P_GS",
-        "CG":              "totals_P_CG",
-        "SHO":             "totals_P_SHO",
-        "GF":              "totals_P_GF",
-        "W":               "totals_P_W",
-        "L":               "totals_P_L",
-        "T":               "totals_P_T",
-        "PCT":             "totals_P_PCT",
-        "IP":              "totals_P_IP",
-        "AB":              "totals_P_AB",
-        "R":               "totals_P_R",
-        "ER":              "totals_P_ER",
-        "H":               "totals_P_H",
-        "HR":              "totals_P_HR",
-        "BB":              "totals_P_BB",
-        "IBB":             "totals_P_IBB",
-        "SO":              "totals_P_SO",
-        "HB":              "totals_P_HP",
-        "SH":              "totals_P_SH",
-        "SF":              "totals_P_SF",
-        "WP":              "totals_P_WP",
-        "BK":              "totals_P_BK",
-        "SB":              "totals_P_SB",
-        "CS":              "totals_P_CS",
-        "ERA":             "totals_P_ERA",
     }
+    keys = row_keys(df, "TeamPitching", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "pitching")
+        df.pipe(rename_columns, "TeamPitching", column_map)
+        .pipe(add_row_metadata, "pitching", keys)
         .pipe(format_percentages)
         .pipe(format_dates)
         .pipe(transform_team_name)
@@ -315,31 +292,18 @@ def extract_pitching_team(df):
     }
 
 
-def extract_fielding_team(df):
+def extract_fielding_team(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
         "nameClub":        "name_short",
         "phase":           "game_type",
-        "G":               "totals_F_G",
-        "TC":              "totals_F_TC",
-        "PO":              "totals_F_PO",
-        "A":               "totals_F_A",
-        "E":               "totals_F_E",
-        "DP":              "totals_F_DP",
-        "TP":              "totals_F_TP",
-        "PB":              "totals_F_PB",
-        "SB":              "totals_F_SB",
-        "CS":              "totals_F_CS",
-        "PCT":             "totals_F_PCT",
-        "P_W":             "totals_P_W",
-        "P_L":             "totals_P_L",
-        "P_T":             "totals_P_T",
         "LOB":             "totals_P_LOB",
     }
+    keys = row_keys(df, "TeamFielding", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "fielding")
+        df.pipe(rename_columns, "TeamFielding", column_map)
+        .pipe(add_row_metadata, "fielding", keys)
         .pipe(format_percentages)
         .pipe(format_dates)
         .pipe(transform_team_name)
@@ -354,7 +318,7 @@ def extract_fielding_team(df):
     }
 
 
-def extract_managing_individual(df):
+def extract_managing_individual(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
@@ -365,13 +329,13 @@ def extract_managing_individual(df):
         "dateFirst":       "club1_S_FIRST",
         "dateLast":        "club1_S_LAST",
     }
+    keys = row_keys(df, "Managing", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "managing")
+        df.pipe(rename_columns, "Managing", column_map)
+        .pipe(add_row_metadata, "managing", keys)
         .pipe(extract_club_splits, "M")
         .pipe(format_percentages)
         .pipe(format_dates)
-        .pipe(format_names)
         .pipe(transform_person_name)
         .pipe(transform_person_description)
         .pipe(transform_person_club_splits, prefix="M")
@@ -397,11 +361,10 @@ def extract_umpiring_individual(df):
         "dateLast":        "S_LAST",
     }
     df = (
-        df.pipe(rename_columns, column_map)
+        df.pipe(rename_columns, "Umpiring", column_map)
         .pipe(add_row_metadata, "umpiring_individual", "umpiring_individual")
         .pipe(format_percentages)
         .pipe(format_dates)
-        .pipe(format_names)
     )
     return [dropnull(x) for x in df.to_dict(orient='records')]
 
@@ -424,9 +387,7 @@ def transform_person_description(df):
     return df
 
 def transform_person_club_splits(df, prefix):
-    for i in [1, 2, 3, 4, 5]:
-        if f'club{i}_name' not in df:
-            continue
+    for (i, _) in stints.numbered_columns(df.columns, "club{}_name"):
         df[f'split_{i}'] = (
             df.apply(lambda x:
                      dropnull(
@@ -482,7 +443,7 @@ def transform_person_managing(df):
     return df
 
 
-def extract_batting_individual(df):
+def extract_batting_individual(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
@@ -500,31 +461,6 @@ def extract_batting_individual(df):
         "S_STINT":         "S_STINT",
         "dateFirst":       "S_FIRST",
         "dateLast":        "S_LAST",
-        "Pos":             "totals_F_POS",
-        "G":               "totals_B_G",
-        "AB":              "totals_B_AB",
-        "R":               "totals_B_R",
-        "ER":              "totals_B_ER",
-        "H":               "totals_B_H",
-        "TB":              "totals_B_TB",
-        "EB":              "totals_B_EB",    # "extra bases"
-        "H1B":             "totals_B_1B",
-        "H2B":             "totals_B_2B",
-        "H3B":             "totals_B_3B",
-        "HR":              "totals_B_HR",
-        "RBI":             "totals_B_RBI",
-        "BB":              "totals_B_BB",
-        "IBB":             "totals_B_IBB",
-        "SO":              "totals_B_SO",
-        "GDP":             "totals_B_GDP",
-        "HP":              "totals_B_HP",
-        "SH":              "totals_B_SH",
-        "SF":              "totals_B_SF",
-        "SB":              "totals_B_SB",
-        "CS":              "totals_B_CS",
-        "AVG":             "totals_B_AVG",
-        "AVG_RANK":        "totals_B_AVG_RANK",
-        "SLG":             "totals_B_SLG",
         "F_P_G":           "F_P_G",
         "F_C_G":           "F_C_G",
         "F_1B_G":          "F_1B_G",
@@ -539,13 +475,13 @@ def extract_batting_individual(df):
         "B_G_PR":          "B_G_PR",
         "NOTES":           "NOTES",
     }
+    keys = row_keys(df, "Batting", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "batting")
+        df.pipe(rename_columns, "Batting", column_map)
+        .pipe(add_row_metadata, "batting", keys)
         .pipe(extract_club_splits, "B")
         .pipe(format_percentages)
         .pipe(format_dates)
-        .pipe(format_names)
     )
     df['club1_name'] = df['club1_name'].replace({"all": None})
 
@@ -565,7 +501,7 @@ def extract_batting_individual(df):
     }
 
 
-def extract_pitching_individual(df):
+def extract_pitching_individual(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
@@ -579,59 +515,16 @@ def extract_pitching_individual(df):
         "nameClub4":       "club4_name",
         "nameClub5":       "club5_name",
         "phase":           "game_type",
-        "GP":              "totals_P_G",
-        "GS":              "totals_P_GS",
-        "REL":             "totals_P_G_RP",    # games as reliever
-        "EIG":             "totals_P_G_EI",    # extra-inning games
-        "0H":              "totals_P_G_0H",
-        "1H":              "totals_P_G_1H",
-        "2H":              "totals_P_G_2H",
-        "3H":              "totals_P_G_3H",
-        "4H":              "totals_P_G_4H",
-        "5H":              "totals_P_G_5H",
-        "CG":              "totals_P_CG",
-        "SHO":             "totals_P_SHO",
-        "TO":              "totals_P_TO",
-        "GF":              "totals_P_GF",
-        "DEC":             "totals_P_DEC",
-        "W":               "totals_P_W",
-        "L":               "totals_P_L",
-        "T":               "totals_P_T",
-        "ND":              "totals_P_ND",
-        "PCT":             "totals_P_PCT",
-        "IP":              "totals_P_IP",
-        "TBF":             "totals_P_TBF",
-        "AB":              "totals_P_AB",
-        "R":               "totals_P_R",
-        "R/G":             "totals_P_RPG",    # runs per game
-        "ER":              "totals_P_ER",
-        "H":               "totals_P_H",
-        "H/G":             "totals_P_HPG",    # hits per game
-        "TB":              "totals_P_TB",
-        "H2B":             "totals_P_2B",
-        "H3B":             "totals_P_3B",
-        "HR":              "totals_P_HR",
-        "BB":              "totals_P_BB",
-        "IBB":             "totals_P_IBB",
-        "SO":              "totals_P_SO",
-        "HB":              "totals_P_HP",
-        "SH":              "totals_P_SH",
-        "WP":              "totals_P_WP",
-        "BK":              "totals_P_BK",
-        "SB":              "totals_P_SB",
-        "AVG":             "totals_P_AVG",
-        "ERA":             "totals_P_ERA",
-        "ERA_RANK":        "totals_P_ERA_RANK",
         "NOTES":           "NOTES",
     }
+    keys = row_keys(df, "Pitching", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "pitching")
+        df.pipe(rename_columns, "Pitching", column_map)
+        .pipe(add_row_metadata, "pitching", keys)
         .assign(totals_F_P_POS="1")
         .pipe(extract_club_splits, "P")
         .pipe(format_percentages)
         .pipe(format_dates)
-        .pipe(format_names)
         .pipe(transform_person_name)
         .pipe(transform_person_description)
         .pipe(transform_person_club_splits, prefix="P")
@@ -647,7 +540,7 @@ def extract_pitching_individual(df):
     }
 
 
-def extract_fielding_individual(df):
+def extract_fielding_individual(df, book=None):
     column_map = {
         "year":            "league_season",
         "nameLeague":      "league_name",
@@ -661,36 +554,15 @@ def extract_fielding_individual(df):
         "nameClub4":       "club4_name",
         "nameClub5":       "club5_name",
         "phase":           "game_type",
-        "Pos":             "totals_F_POS",
-        "G":               "totals_F_G",
-        "ALL_G":           "totals_F_UT_G",
-        "INN":             "totals_F_INN",
-        "TC":              "totals_F_TC",
-        "PO":              "totals_F_PO",
-        "ALL_PO":          "totals_F_UT_PO",
-        "A":               "totals_F_A",
-        "ALL_A":           "totals_F_UT_A",
-        "E":               "totals_F_E",
-        "ALL_E":           "totals_F_UT_E",
-        "DP":              "totals_F_DP",
-        "ALL_DP":          "totals_F_UT_DP",
-        "TP":              "totals_F_TP",
-        "PB":              "totals_F_PB",
-        "SB":              "totals_F_SB",
-        "CS":              "totals_F_CS",
-        "CN":              "totals_F_PK",
-        "PCT":             "totals_F_PCT",
-        "ALL_PCT":         "totals_F_UT_PCT",
-        "P_WP":            "totals_P_WP",
         "NOTES":           "NOTES",
     }
+    keys = row_keys(df, "Fielding", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "fielding")
+        df.pipe(rename_columns, "Fielding", column_map)
+        .pipe(add_row_metadata, "fielding", keys)
         .pipe(extract_club_splits, "F")
         .pipe(format_percentages)
         .pipe(format_dates)
-        .pipe(format_names)
         .pipe(transform_person_name)
         .pipe(transform_person_description)
         .pipe(transform_person_club_splits, prefix="F")
@@ -721,42 +593,52 @@ function_map = {
 }
 
 
-def process_file(source, fn):
+def process_file(source, fn, stable_keys=False, selection=None):
+    book = refs.workbook_id(fn) if stable_keys else None
     data = OrderedDict()
     data["_source"] = OrderedDict()
     data["_source"]["title"] = source
     data["teams"] = []
     data["people"] = []
-    for (name, df) in pd.read_excel(fn,
-                                    dtype=str, sheet_name=None).items():
-        if name == "Metadata":
-            continue
+    names = [name for name in sheetcache.sheet_names(fn)
+             if name != "Metadata" and subset.selects_sheet(selection, name)]
+    sheets = sheetcache.read_excel(
+        fn, [name for name in names if name in function_map], dtype=str
+    )
+    for name in names:
         if name not in function_map:
-            print(f"WARNING: Unknown sheet name {name}")
+            report.warn(f"Unknown sheet name {name}",
+                        workbook=fn, sheet=name)
             continue
         print(f"Processing worksheet {name}")
-        result = function_map[name](df)
-        for key in ["people", "teams"]:
-            try:
-                data[key].extend(result[key])
-            except KeyError:
-                pass
+        df = sheets[name]
+        changed = normalize.normalize_names(df)
+        if changed:
+            print(f"Normalized {changed} name cells")
+        with report.isolating(workbook=fn, sheet=name) as unit:
+            result = function_map[name](df, book)
+        if unit.failed:
+            continue
+        for (key, records) in result.items():
+            data.setdefault(key, []).extend(records)
     return data
 
 
-def main(source):
+def main(source, compress=None, stable_keys=False, selection=None,
+         root="json"):
     inpath = pathlib.Path("transcript")/source
-    outpath = pathlib.Path("json")
+    outpath = pathlib.Path(root)
     outpath.mkdir(exist_ok=True, parents=True)
 
     books = []
-    for fn in sorted(inpath.glob("*.xls")):
+    for fn in subset.select_workbooks(sorted(inpath.glob("*.xls")),
+                                      selection):
         print(f"Processing {fn}")
-        books.append(process_file(source, fn))
+        with report.isolating(source=source, workbook=fn):
+            books.append(process_file(source, fn, stable_keys, selection))
         print()
         break
 
-    js = json.dumps(books, indent=2)
-    with (outpath / f"{source}.json").open("w") as f:
-            f.write(js)
+    with compression.open_output(outpath / f"{source}.json", compress) as f:
+        json.dump(books, f, indent=2)
     print()
@@ -1,10 +1,18 @@
 import pathlib
 
-import damm
-import numpy as np
 import pandas as pd
 import toml
 
+from . import compression
+from . import headtohead
+from . import normalize
+from . import refs
+from . import report
+from . import schema
+from . import sheetcache
+from . import stints
+from . import subset
+
 
 def dropnull(rec):
     return {k: v.strip() if isinstance(v, str) else v
@@ -32,42 +40,41 @@ def format_dates(df):
     return df
 
 
-def add_row_metadata(df, table, prefix):
+def row_keys(df, sheet, book=None):
+    """Return the _key of each row of 'df', a sheet of kind 'sheet': the
+    sheet's prefix and the row's number, or its stable reference in
+    workbook 'book' if given, which is the person.ref of the processed
+    tables.
+    """
+    if book is None:
+        prefix = refs.sheets[sheet][0]
+        return [refs.make_ref(prefix, x) for x in range(1, len(df)+1)]
+    return refs.sheet_refs(df, sheet, book)
+
+
+def add_row_metadata(df, table, keys):
     df.insert(loc=0, column='_table', value=table)
-    df.insert(loc=1, column='_key', value=np.arange(len(df))+1)
-    df['_key'] = df['_key'].apply(
-        lambda x: f"{prefix}{x:04}{damm.encode('%04d' % x)}"
-    )
+    df.insert(loc=1, column='_key', value=keys)
     return df
 
 
 def extract_club_splits(df, prefix):
-    def split_games(x):
-        if pd.isnull(x):
-            return x
-        if "@" in x:
-            return x.split("@")[0]
-        else:
-            return None
-
-    i = 0
     if "team__1__team__name" in df:
         multiteam = ~df["team__1__team__name"].isnull()
     else:
         multiteam = ~df["team__0__team__name"].isnull()
-    while True:
-        colname = f"team__{i}__team__name"
-        if colname not in df:
-            return df
+    for (i, colname) in stints.numbered_columns(df.columns,
+                                                "team__{}__team__name"):
+        parts = stints.split_club(df[colname])
         df.insert(loc=df.columns.get_loc(colname)+1,
                   column=f"team__{i}__{prefix}_G",
-                  value=df[colname].apply(split_games))
+                  value=parts["games"])
         if "totals__F_POS" in df:
             df.insert(loc=df.columns.get_loc(colname)+1,
                       column=f"team__{i}__F_POS",
                       value=df.loc[multiteam, "totals__F_POS"])
-        df[colname] = df[colname].str.split("@").str[-1]
-        i += 1
+        df[colname] = parts["club"]
+    return df
 
 
 def format_percentages(df):
@@ -93,10 +100,40 @@ def format_percentages(df):
     return df
 
 
-def rename_columns(df, column_map):
+# Statistic headings of each kind of sheet filed under totals
+totals_headings = {
+    "TeamBatting":  ["G", "AB", "R", "OR", "H", "TB", "H2B", "H3B", "HR",
+                     "RBI", "BB", "IBB", "SO", "GDP", "HP", "SH", "SF",
+                     "SB", "CS", "LOB", "AVG"],
+    "TeamPitching": ["GP", "APP", "CG", "SHO", "IP", "AB", "R", "ER", "H",
+                     "HR", "BB", "IBB", "SO", "HB", "SH", "SF", "WP", "BK",
+                     "CS", "ERA"],
+    "TeamFielding": ["G", "TC", "PO", "A", "E", "DP", "TP", "PB", "SB",
+                     "CS", "PCT"],
+    "Standings":    ["W", "L", "T", "PCT", "RANK"],
+    "Attendance":   ["ATT"],
+    "Batting":      ["G", "AB", "R", "H", "TB", "H2B", "H3B", "HR", "RBI",
+                     "BB", "IBB", "SO", "GDP", "HP", "SH", "SF", "SB", "CS",
+                     "AVG", "AVG_RANK"],
+    "Pitching":     ["GP", "GS", "CG", "SHO", "W", "L", "PCT", "IP", "R",
+                     "ER", "H", "HR", "BB", "IBB", "SO", "HB", "WP", "BK",
+                     "ERA", "ERA_RANK"],
+    "Fielding":     ["Pos", "G", "PO", "A", "E", "DP", "PCT", "PB", "TP"],
+}
+
+
+def rename_columns(df, sheet, column_map):
+    column_map = {**stints.club_column_map(df.columns,
+                                           "team__{}__team__name", -1),
+                  **{col: f"totals__{code}"
+                     for (col, code)
+                     in schema.stat_map(sheet, df.columns,
+                                        totals_headings.get(sheet,
+                                                            [])).items()},
+                  **column_map}
     unknown = [c for c in df.columns if c not in column_map.keys()]
     if unknown:
-        print(f"  WARNING: Unknown columns {unknown}")
+        report.warn(f"Unknown columns {unknown}")
     df = df.rename(columns=column_map)
     if "league__phase" not in df:
         df.insert(loc=df.columns.get_loc("league__name")+1,
@@ -125,142 +162,108 @@ def reorder_columns(df, person=True, record_type="playing"):
     ]
 
 
-def extract_batting_team(df):
+def extract_batting_team(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
         "nameClub": "name__short",
-        "G": "totals__B_G",
-        "AB": "totals__B_AB",
-        "R": "totals__B_R",
-        "OR": "totals__P_R",
-        "H": "totals__B_H",
-        "TB": "totals__B_TB",
-        "H2B": "totals__B_2B",
-        "H3B": "totals__B_3B",
-        "HR": "totals__B_HR",
-        "RBI": "totals__B_RBI",
-        "BB": "totals__B_BB",
-        "IBB": "totals__B_IBB",
-        "SO": "totals__B_SO",
-        "GDP": "totals__B_GDP",
-        "HP": "totals__B_HP",
-        "SH": "totals__B_SH",
-        "SF": "totals__B_SF",
-        "SB": "totals__B_SB",
-        "CS": "totals__B_CS",
-        "LOB": "totals__B_LOB",
-        "AVG": "totals__B_AVG",
     }
+    keys = row_keys(df, "TeamBatting", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "team_batting", "TB")
+        df.pipe(rename_columns, "TeamBatting", column_map)
+        .pipe(add_row_metadata, "team_batting", keys)
         .pipe(format_percentages)
         .pipe(reorder_columns, person=False)
     )
     return {"team": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_pitching_team(df):
+def extract_pitching_team(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
         "nameClub": "name__short",
-        "GP": "totals__P_G",
-        "APP": "totals__P_APP",
-        "CG": "totals__P_CG",
-        "SHO": "totals__P_SHO",
-        "IP": "totals__P_IP",
-        "AB": "totals__P_AB",
-        "R": "totals__P_R",
-        "ER": "totals__P_ER",
-        "H": "totals__P_H",
-        "HR": "totals__P_HR",
-        "BB": "totals__P_BB",
-        "IBB": "totals__P_IBB",
-        "SO": "totals__P_SO",
-        "HB": "totals__P_HP",
-        "SH": "totals__P_SH",
-        "SF": "totals__P_SF",
-        "WP": "totals__P_WP",
-        "BK": "totals__P_BK",
-        "CS": "totals__P_CS",
-        "ERA": "totals__P_ERA",
     }
+    keys = row_keys(df, "TeamPitching", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "team_pitching", "TP")
+        df.pipe(rename_columns, "TeamPitching", column_map)
+        .pipe(add_row_metadata, "team_pitching", keys)
         .pipe(format_percentages)
         .pipe(reorder_columns, person=False)
     )
     return {"team": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_fielding_team(df):
+def extract_fielding_team(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
         "nameClub": "name__short",
-        "G": "totals__F_G",
-        "TC": "totals__F_TC",
-        "PO": "totals__F_PO",
-        "A": "totals__F_A",
-        "E": "totals__F_E",
-        "DP": "totals__F_DP",
-        "TP": "totals__F_TP",
-        "PB": "totals__F_PB",
-        "SB": "totals__F_SB",
-        "CS": "totals__F_CS",
-        "PCT": "totals__F_PCT",
     }
+    keys = row_keys(df, "TeamFielding", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "team_fielding", "TF")
+        df.pipe(rename_columns, "TeamFielding", column_map)
+        .pipe(add_row_metadata, "team_fielding", keys)
         .pipe(format_percentages)
         .pipe(reorder_columns, person=False)
     )
     return {"team": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_standings_team(df):
+def extract_standings_team(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
         "nameClub": "name__short",
         "phase": "league__phase",
         "division": "totals__S_DIVISION",
-        "W": "totals__R_W",
-        "L": "totals__R_L",
-        "T": "totals__R_T",
-        "PCT": "totals__R_PCT",
-        "RANK": "totals__R_RANK",
     }
+    keys = row_keys(df, "Standings", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "team_standings", "TS")
+        df.pipe(rename_columns, "Standings", column_map)
+        .pipe(add_row_metadata, "team_standings", keys)
         .pipe(format_percentages)
         .pipe(reorder_columns, person=False)
     )
     return {"team": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_attendance_team(df):
+def extract_head_to_head(df, book=None):
+    grids = headtohead.matrices(schema.standardize(df))
+    records = []
+    for grid in grids:
+        for (club, wins) in zip(grid.clubs, grid.wins):
+            records.append({
+                "_table": "team_head_to_head",
+                "_key": refs.make_ref("TH", len(records) + 1, book),
+                "league__season": grid.year,
+                "league__name": grid.league,
+                "league__phase": grid.phase,
+                "name__short": club,
+                "wins": {opponent: int(n)
+                         for (opponent, n) in zip(grid.clubs, wins)
+                         if n != headtohead.MISSING}
+            })
+    return {"team": records}
+
+
+def extract_attendance_team(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
         "nameClub": "name__short",
-        "ATT": "totals__R_ATT",
     }
+    keys = row_keys(df, "Attendance", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "team_attendance", "TA")
+        df.pipe(rename_columns, "Attendance", column_map)
+        .pipe(add_row_metadata, "team_attendance", keys)
         .pipe(format_percentages)
         .pipe(reorder_columns, person=False)
     )
     return {"team": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_batting_individual(df):
+def extract_batting_individual(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
@@ -273,30 +276,11 @@ def extract_batting_individual(df):
         "nameClub4": "team__3__team__name",
         "nameClub5": "team__4__team__name",
         "bats": "description__bats",
-        "G": "totals__B_G",
-        "AB": "totals__B_AB",
-        "R": "totals__B_R",
-        "H": "totals__B_H",
-        "TB": "totals__B_TB",
-        "H2B": "totals__B_2B",
-        "H3B": "totals__B_3B",
-        "HR": "totals__B_HR",
-        "RBI": "totals__B_RBI",
-        "BB": "totals__B_BB",
-        "IBB": "totals__B_IBB",
-        "SO": "totals__B_SO",
-        "GDP": "totals__B_GDP",
-        "HP": "totals__B_HP",
-        "SH": "totals__B_SH",
-        "SF": "totals__B_SF",
-        "SB": "totals__B_SB",
-        "CS": "totals__B_CS",
-        "AVG": "totals__B_AVG",
-        "AVG_RANK": "totals__B_AVG_RANK",
     }
+    keys = row_keys(df, "Batting", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "person_batting", "B")
+        df.pipe(rename_columns, "Batting", column_map)
+        .pipe(add_row_metadata, "person_batting", keys)
         .pipe(extract_club_splits, "B")
         .pipe(format_percentages)
         .pipe(reorder_columns)
@@ -304,7 +288,7 @@ def extract_batting_individual(df):
     return {"person": [dropnull(x) for x in df.to_dict(orient='records')]}
 
 
-def extract_pitching_individual(df):
+def extract_pitching_individual(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
@@ -317,30 +301,11 @@ def extract_pitching_individual(df):
         "nameClub4": "team__3__team__name",
         "nameClub5": "team__4__team__name",
         "throws": "description__throws",
-        "GP": "totals__P_G",
-        "GS": "totals__P_GS",
-        "CG": "totals__P_CG",
-        "SHO": "totals__P_SHO",
-        "W": "totals__P_W",
-        "L": "totals__P_L",
-        "PCT": "totals__P_PCT",
-        "IP": "totals__P_IP",
-        "R": "totals__P_R",
-        "ER": "totals__P_ER",
-        "H": "totals__P_H",
-        "HR": "totals__P_HR",
-        "BB": "totals__P_BB",
-        "IBB": "totals__P_IBB",
-        "SO": "totals__P_SO",
-        "HB": "totals__P_HP",
-        "WP": "totals__P_WP",
-        "BK": "totals__P_BK",
-        "ERA": "totals__P_ERA",
-        "ERA_RANK": "totals__P_ERA_RANK",
     }
+    keys = row_keys(df, "Pitching", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "person_pitching", "P")
+        df.pipe(rename_columns, "Pitching", column_map)
+        .pipe(add_row_metadata, "person_pitching", keys)
         .pipe(extract_club_splits, "P")
         .pipe(format_percentages)
         .pipe(reorder_columns)
@@ -358,7 +323,7 @@ def recode_fielding_columns(rec):
     return rec
 
 
-def extract_fielding_individual(df):
+def extract_fielding_individual(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
@@ -371,19 +336,11 @@ def extract_fielding_individual(df):
         "nameClub4": "team__3__team__name",
         "nameClub5": "team__4__team__name",
         "throws": "description__throws",
-        "Pos": "totals__F_POS",
-        "G": "totals__F_G",
-        "PO": "totals__F_PO",
-        "A": "totals__F_A",
-        "E": "totals__F_E",
-        "DP": "totals__F_DP",
-        "PCT": "totals__F_PCT",
-        "PB": "totals__F_PB",
-        "TP": "totals__F_TP",
     }
+    keys = row_keys(df, "Fielding", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "person_fielding", "F")
+        df.pipe(rename_columns, "Fielding", column_map)
+        .pipe(add_row_metadata, "person_fielding", keys)
         .pipe(extract_club_splits, "F")
         .pipe(format_percentages)
         .pipe(reorder_columns)
@@ -392,7 +349,7 @@ def extract_fielding_individual(df):
                        for x in df.to_dict(orient='records')]}
 
 
-def extract_managing_individual(df):
+def extract_managing_individual(df, book=None):
     column_map = {
         "year": "league__season",
         "nameLeague": "league__name",
@@ -402,9 +359,10 @@ def extract_managing_individual(df):
         "seq": "team__0__S_ORDER",
         "dateFirst": "team__0__S_FIRST",
     }
+    keys = row_keys(df, "Managing", book)
     df = (
-        df.pipe(rename_columns, column_map)
-        .pipe(add_row_metadata, "person_managing", "M")
+        df.pipe(rename_columns, "Managing", column_map)
+        .pipe(add_row_metadata, "person_managing", keys)
         .pipe(extract_club_splits, "B")
         .pipe(format_percentages)
         .pipe(format_dates)
@@ -415,6 +373,7 @@ def extract_managing_individual(df):
 
 function_map = {
     "Standings": extract_standings_team,
+    "HeadToHead": extract_head_to_head,
     "Attendance": extract_attendance_team,
     "Managing": extract_managing_individual,
     "TeamBatting": extract_batting_team,
@@ -430,29 +389,44 @@ def dump(data):
     return toml.dumps(data).replace("__", ".")
 
 
-def process_file(source, fn, outpath):
-    text = ""
-    for (name, df) in pd.read_excel(fn,
-                                    dtype=str, sheet_name=None).items():
-        if name in ["Metadata", "HeadToHead"]:
-            continue
-        try:
-            print(f"  {name}")  
-            result = function_map[name](df)
-            text += dump(result)
-        except KeyError as exc:
-            print(exc)
-    with (outpath/f"{fn.stem}.txt").open("w") as f:
-        f.write(text)
-
-
-def main(source):
+def process_file(source, fn, outpath, compress=None, stable_keys=False,
+                 selection=None):
+    book = refs.workbook_id(fn) if stable_keys else None
+    with compression.open_output(outpath/f"{fn.stem}.txt", compress) as f:
+        names = [name for name in sheetcache.sheet_names(fn)
+                 if name != "Metadata" and
+                 subset.selects_sheet(selection, name)]
+        sheets = sheetcache.read_excel(
+            fn, [name for name in names if name in function_map], dtype=str
+        )
+        for name in names:
+            if name not in function_map:
+                report.warn(f"Unknown sheet name {name}",
+                            workbook=fn, sheet=name)
+                continue
+            print(f"  {name}")
+            df = sheets[name]
+            changed = normalize.normalize_names(df)
+            if changed:
+                print(f"    normalized {changed} name cells")
+            with report.isolating(workbook=fn, sheet=name) as unit:
+                result = function_map[name](df, book)
+            if unit.failed:
+                continue
+            f.write(dump(result))
+
+
+def main(source, compress=None, stable_keys=False, selection=None,
+         root="toml"):
     inpath = pathlib.Path("transcript")/source
-    outpath = pathlib.Path("toml")/source
+    outpath = pathlib.Path(root)/source
     outpath.mkdir(exist_ok=True, parents=True)
 
-    for fn in sorted(inpath.glob("*.xls")):
+    for fn in subset.select_workbooks(sorted(inpath.glob("*.xls")),
+                                      selection):
         print(f"Processing {fn}")
-        process_file(source, fn, outpath)
+        with report.isolating(source=source, workbook=fn):
+            process_file(source, fn, outpath, compress, stable_keys,
+                         selection)
         print()
     
@@ -0,0 +1,296 @@
+"""Reprocess workbooks as they are saved.
+
+Copyright (c) 2016, Dr T L Turocy (ted.turocy@gmail.com)
+                    Chadwick Baseball Bureau (http://www.chadwick-bureau.com)
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+
+Each workbook's part of a source's outputs is kept as the CSV text of
+its rows in each table, with the summaries of its tables from which the
+dtypes of the source's tables are worked out.  When a workbook is saved,
+only that workbook is processed and formatted again, and the outputs are
+written by joining the parts; the other workbooks are formatted again
+only if the dtypes of a table have changed.  A session starts from the
+outputs last written, by the csv command or an earlier session, which
+are cut into parts by their layout (see layout.py).  So only the saved
+workbook is processed even on the first save, whatever is in the sheet
+cache; a source whose outputs have no layout, or have changed since it
+was recorded, is processed in full once.
+"""
+import collections
+import os
+import pathlib
+import time
+import traceback
+
+from . import compression
+from . import coverage
+from . import layout
+from . import process
+from . import schema
+from . import sheetcache
+
+
+def _is_workbook(path):
+    return path.suffix == ".xls" and "~" not in path.name
+
+
+class PollingWatcher(object):
+    """Detect changed workbooks by comparing file modification times.
+    """
+    def __init__(self, dirs, interval=0.5):
+        self.dirs = dirs
+        self.interval = interval
+        self._state = self._snapshot()
+
+    def _snapshot(self):
+        state = {}
+        for d in self.dirs:
+            for path in d.glob("*.xls"):
+                if not _is_workbook(path):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def changes(self, timeout):
+        """Return the set of workbooks changed since the last call, waiting
+        up to 'timeout' seconds for one to change.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self._snapshot()
+            changed = {path for path in set(state) | set(self._state)
+                       if state.get(path) != self._state.get(path)}
+            self._state = state
+            if changed or time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval)
+
+
+class InotifyWatcher(object):
+    """Detect changed workbooks using inotify.  Requires the
+    inotify_simple package, and so is available only on Linux.
+    """
+    def __init__(self, dirs):
+        import inotify_simple
+        self._flags = inotify_simple.flags
+        self._inotify = inotify_simple.INotify()
+        mask = (self._flags.CLOSE_WRITE | self._flags.MOVED_TO |
+                self._flags.DELETE)
+        self._dirs = {self._inotify.add_watch(str(d), mask): d
+                      for d in dirs}
+
+    def changes(self, timeout):
+        """Return the set of workbooks changed since the last call, waiting
+        up to 'timeout' seconds for one to change.
+        """
+        return {path
+                for path in (self._dirs[event.wd]/event.name
+                             for event in self._inotify.read(
+                                 timeout=int(timeout*1000)))
+                if _is_workbook(path)}
+
+
+def make_watcher(dirs, poll=False):
+    """Return an inotify watcher over 'dirs' if possible, or a polling
+    watcher if inotify is unavailable or 'poll' is set.
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(dirs)
+        except (ImportError, OSError):
+            pass
+    return PollingWatcher(dirs)
+
+
+class WorkbookPart(object):
+    """One workbook's part of the outputs of its source: the summaries of
+    its tables, and the CSV text of its rows in each table as formatted
+    for the dtypes it was last formatted for, with the derived statistics
+    found to differ in them.  A part is made by processing the workbook,
+    or from its rows in the outputs last written, given as 'assemblers'
+    and 'text'; such a part is processed only if its rows are to be
+    formatted for other dtypes.
+    """
+    def __init__(self, fn, assemblers=None, text=None):
+        self.fn = fn
+        self._tables = None
+        self.assemblers = assemblers
+        self._text = dict(text or {})
+        if self.assemblers is None:
+            self._process()
+        self.digest = sheetcache.workbook_hash(fn)
+
+    def _process(self):
+        print(f"  {self.fn}")
+        self._tables = process.process_workbook(process.Workbook(self.fn))
+        self.assemblers = [schema.Assembler(table) for table in schema.tables]
+        for (assembler, df) in zip(self.assemblers, self._tables):
+            assembler.add(df)
+
+    def text(self, i, dtypes):
+        """Return the CSV text and the differing derived statistics of
+        the rows of table number 'i', formatted for 'dtypes'.
+        """
+        signature = layout.signature(dtypes)
+        if self._text.get(i, (None,))[0] != signature:
+            if self._tables is None:
+                self._process()
+            table = list(schema.tables)[i]
+            (df, deltas) = process.prepare_table(
+                table, self.assemblers[i], dtypes, list(dtypes),
+                self._tables[i]
+            )
+            self._text[i] = (signature, df.to_csv(index=False, header=False),
+                             list(deltas))
+        return self._text[i][1:]
+
+
+def _header(table):
+    return process.defloat_columns(
+        schema.assemble([], table)
+    ).to_csv(index=False)
+
+
+class SourceState(object):
+    """Holds the parts of the outputs of a source contributed by each of
+    its workbooks, so that the source's outputs can be rewritten after
+    reprocessing one workbook.  A session starts from the outputs last
+    written, as their layout describes them, so only the workbooks which
+    have changed since are processed.
+    """
+    def __init__(self, source, root="processed"):
+        self.source = source
+        self.root = root
+        self.parts = {}
+
+    def _recorded(self):
+        """Return the parts of the workbooks whose rows are in the outputs
+        last written, cut from the text of the outputs, by workbook.
+        """
+        recorded = layout.load(self.source, self.root)
+        if recorded is None:
+            return {}
+        (signatures, entries) = recorded
+        texts = []
+        for (i, table) in enumerate(schema.tables):
+            with compression.open_input(
+                    pathlib.Path(self.root)/self.source/f"{table}.csv",
+                    "rb") as f:
+                text = f.read().decode("utf-8")
+            header = _header(table)
+            if not text.startswith(header) or \
+               len(text) != len(header) + sum(entry.lengths[i]
+                                              for entry in entries):
+                return {}
+            texts.append((text, len(header)))
+        parts = {}
+        for entry in entries:
+            chunks = {}
+            for (i, (text, at)) in enumerate(texts):
+                end = at + entry.lengths[i]
+                chunks[i] = (signatures[i], text[at:end], entry.found[i])
+                texts[i] = (text, end)
+            if os.path.exists(entry.fn) and \
+               sheetcache.workbook_hash(entry.fn) == entry.digest:
+                parts[entry.fn] = WorkbookPart(entry.fn, entry.assemblers,
+                                               chunks)
+        return parts
+
+    def update(self, changed, compress=None):
+        books = process.source_workbooks(self.source)
+        if not self.parts:
+            self.parts = self._recorded()
+        for fn in list(self.parts):
+            if fn not in books or fn in changed:
+                del self.parts[fn]
+        for fn in books:
+            if fn not in self.parts:
+                self.parts[fn] = WorkbookPart(fn)
+        self.write([self.parts[fn] for fn in books], compress)
+
+    def write(self, parts, compress=None):
+        """Write the outputs of the source from the workbook 'parts', in
+        order, as process.write_source does, and record their layout.
+        """
+        outdir = pathlib.Path(self.root)/self.source
+        outdir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        written = [([], []) for _ in parts]
+        for (i, table) in enumerate(schema.tables):
+            assembler = schema.Assembler(table)
+            for part in parts:
+                assembler.extend(part.assemblers[i])
+            dtypes = assembler.dtypes()
+            deltas = collections.Counter()
+            path = outdir/f"{table}.csv"
+            with compression.open_output(path, compress) as f:
+                f.write(_header(table))
+                for (part, (lengths, codes)) in zip(parts, written):
+                    (text, found) = part.text(i, dtypes)
+                    f.write(text)
+                    deltas.update(found)
+                    lengths.append(len(text))
+                    codes.append(found)
+            entries.extend(coverage.entries(table, dtypes,
+                                            assembler.counts, list(dtypes)))
+            process.log_derived_deltas(table, deltas)
+        coverage.write(self.source, entries, self.root)
+        layout.record(self.source,
+                      [layout.Entry(part.fn, part.digest, part.assemblers,
+                                    lengths, codes)
+                       for (part, (lengths, codes)) in zip(parts, written)],
+                      self.root)
+
+
+def watch(sources=None, compress=None, poll=False, debounce=0.5):
+    """Watch the workbooks of 'sources' (default all), reprocessing them
+    and rewriting their outputs as they are saved.  Bursts of saves
+    within 'debounce' seconds of each other are handled together.
+    """
+    root = pathlib.Path("transcript")
+    if not sources:
+        sources = sorted(p.name for p in root.iterdir() if p.is_dir())
+    watcher = make_watcher([root/source for source in sources], poll)
+    states = {source: SourceState(source) for source in sources}
+    print(f"Watching {len(sources)} source(s) with "
+          f"{type(watcher).__name__}; press Ctrl-C to stop")
+    while True:
+        changed = watcher.changes(timeout=3600)
+        if not changed:
+            continue
+        while True:
+            more = watcher.changes(timeout=debounce)
+            if not more:
+                break
+            changed |= more
+        start = time.monotonic()
+        bysource = {}
+        for path in changed:
+            bysource.setdefault(path.parent.name, set()) \
+                    .add(os.path.join("transcript", path.parent.name,
+                                      path.name))
+        for (source, fns) in sorted(bysource.items()):
+            print(f"Reprocessing source {source}")
+            try:
+                states[source].update(fns, compress)
+            except Exception:
+                traceback.print_exc()
+        print(f"Done in {time.monotonic()-start:.1f}s")
+        print()
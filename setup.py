@@ -9,6 +9,11 @@ setup(
     install_requires=[
         'damm', 'xlrd', 'numpy', 'pandas', 'Click'
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'watch': ['inotify_simple'],
+        'calamine': ['python-calamine'],
+    },
     entry_points="""
         [console_scripts]
         hgame-averages=hgame.averages.main:cli
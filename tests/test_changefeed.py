@@ -0,0 +1,43 @@
+import pandas as pd
+
+from hgame.averages import changefeed
+from hgame.averages import schema
+
+
+def _batting(people):
+    """Return the text of a playing_individual table with a row for each
+    of 'people', numbered in turn as the rows of a sheet are.
+    """
+    df = pd.DataFrame("", index=range(len(people)),
+                      columns=schema.tables["playing_individual"])
+    df["league.year"] = "1950"
+    df["league.name"] = "Western League"
+    df["phase.name"] = "regular"
+    df["entry.name"] = "Denver"
+    df["person.ref"] = [f"P{i:05d}" for i in range(1, len(people)+1)]
+    df["person.name.last"] = [last for (last, _) in people]
+    df["person.name.given"] = [given for (_, given) in people]
+    df["B_G"] = [str(10 + i) for i in range(len(people))]
+    return df
+
+
+def test_inserted_row_is_one_insert():
+    people = [("Adams", "John"), ("Baker", "Frank"), ("Clark", "Tom"),
+              ("Davis", "Jim"), ("Evans", "Bill"), ("Foster", "Joe")]
+    old = _batting(people)
+    new = _batting(people[:3] + [("Cobb", "Ty")] + people[3:])
+    new.loc[new["person.name.last"] != "Cobb", "B_G"] = old["B_G"].to_numpy()
+
+    previous = changefeed.snapshot(old, "playing_individual")
+    current = changefeed.snapshot(new, "playing_individual")
+    feed = changefeed.changes(previous, current, new)
+
+    inserted = feed[feed["change"] == "insert"]
+    assert list(inserted["person.name.last"]) == ["Cobb"]
+    assert (feed["change"] != "delete").all()
+    # The rows after the insert keep their keys; only their refs move
+    updated = feed[feed["change"] == "update"].set_index("person.name.last")
+    assert list(updated.index) == ["Davis", "Evans", "Foster"]
+    before = old.set_index("person.name.last").loc[updated.index]
+    assert [col for col in before.columns
+            if (before[col] != updated[col]).any()] == ["person.ref"]
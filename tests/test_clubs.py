@@ -0,0 +1,22 @@
+from hgame.averages import clubs
+
+
+def test_variants_cluster_to_commonest_name():
+    canonical = clubs.cluster({"St. Paul": 10, "St Paul": 3, "St. P.": 1,
+                               "Minneapolis": 8})
+    assert canonical == {"St. Paul": "St. Paul", "St Paul": "St. Paul",
+                         "St. P.": "St. Paul", "Minneapolis": "Minneapolis"}
+
+
+def test_close_names_cluster_unless_marked():
+    canonical = clubs.cluster({"Grand Rapids": 5, "Grand Rapid": 1,
+                               "Grand Rapids [II]": 4})
+    assert canonical == {"Grand Rapids": "Grand Rapids",
+                         "Grand Rapid": "Grand Rapids",
+                         "Grand Rapids [II]": "Grand Rapids [II]"}
+
+
+def test_ambiguous_abbreviation_stays_apart():
+    canonical = clubs.cluster({"St. Paul": 5, "St. Petersburg": 4,
+                               "St. P.": 1})
+    assert canonical["St. P."] == "St. P."
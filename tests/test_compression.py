@@ -0,0 +1,16 @@
+import gzip
+
+from hgame.averages import compression
+
+
+def test_gzip_output_is_reproducible(tmp_path):
+    written = []
+    for _ in range(2):
+        with compression.open_output(tmp_path/"table.csv", "gzip") as f:
+            f.write("league.year,league.name\n1910,Texas League\n")
+        written.append((tmp_path/"table.csv.gz").read_bytes())
+    assert written[0] == written[1]
+    # The header names the output, not the temporary file it was written to
+    assert written[0][10:20] == b"table.csv\x00"
+    assert gzip.decompress(written[0]).startswith(b"league.year,")
+    assert [p.name for p in tmp_path.iterdir()] == ["table.csv.gz"]
@@ -0,0 +1,29 @@
+import pandas as pd
+
+from hgame.averages import coverage
+
+
+def test_pruned_columns_are_restored(tmp_path):
+    dtypes = {"league.year": "int64", "B_G": "Int64", "B_GDP": "Int64"}
+    counts = {"league.year": 2, "B_G": 2, "B_GDP": 0}
+    keep = coverage.prune(dtypes, counts)
+    assert keep == ["league.year", "B_G"]
+    (tmp_path/"1910Reach").mkdir()
+    coverage.write("1910Reach",
+                   coverage.entries("playing_individual", dtypes, counts,
+                                    keep),
+                   root=tmp_path)
+
+    table = tmp_path/"1910Reach"/"playing_individual.csv.gz"
+    df = pd.DataFrame({"league.year": ["1909"], "B_G": ["12"]})
+    assert list(coverage.expand(df, table, "").columns) == list(dtypes)
+    assert coverage.covered("1910Reach", root=tmp_path) == \
+        ["league.year", "B_G"]
+
+
+def test_no_index_is_not_empty_coverage(tmp_path):
+    (tmp_path/"1910Reach").mkdir()
+    assert coverage.covered("1910Reach", root=tmp_path) is None
+    assert coverage.full_columns(
+        tmp_path/"1910Reach"/"playing_individual.csv"
+    ) is None
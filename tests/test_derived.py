@@ -0,0 +1,17 @@
+import pandas as pd
+
+from hgame.averages import derived
+
+
+def test_innings_are_read_as_outs():
+    values = pd.Series([200.2, 200.67, "200 2/3", "2/3", 200.1, 7.0],
+                       dtype=object)
+    # Thirds are printed as tenths, or as decimal or common fractions
+    assert derived.ip_outs(values).tolist() == [602, 602, 602, 2, 601, 21]
+
+
+def test_unreadable_innings_are_null():
+    values = pd.Series(["junk", None, "200 2/3"], dtype=object)
+    outs = derived.ip_outs(values)
+    assert outs.isnull().tolist() == [True, True, False]
+    assert str(outs.dtype) == "Int64"
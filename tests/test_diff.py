@@ -0,0 +1,27 @@
+import pandas as pd
+
+from hgame.averages import diff
+from hgame.averages import schema
+
+
+def _batting(people):
+    df = pd.DataFrame("", index=range(len(people)),
+                      columns=schema.tables["playing_individual"])
+    df["league.year"] = "1915"
+    df["league.name"] = "New York State League"
+    df["entry.name"] = "Utica"
+    df["person.ref"] = [f"B{i:05d}" for i in range(1, len(people)+1)]
+    df["person.name.last"] = people
+    df["B_G"] = [str(20 + i) for i in range(len(people))]
+    return df
+
+
+def test_corrected_name_is_one_change():
+    old = _batting(["Adams", "Hinchman", "Clark"])
+    new = _batting(["Adams", "Hinchmann", "Clark"])
+    (added, removed, changed) = diff.diff_table(
+        old, new, diff.keys["playing_individual"]
+    )
+    assert added.empty and removed.empty
+    assert list(changed[["column", "old", "new"]].itertuples(index=False)) \
+        == [("person.name.last", "Hinchman", "Hinchmann")]
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from hgame.averages import headtohead
+
+
+def _grids():
+    sheet = pd.DataFrame({
+        "league.year": ["1910", None, None],
+        "league.name": ["Western League", None, None],
+        "entry.name":  ["Omaha", "Denver", "Lincoln"],
+        "Omaha":       [None, 5, 3],
+        "Denver":      [4, None, 2],
+        "Lincoln":     [6, 7, None],
+    })
+    return headtohead.matrices(sheet)
+
+
+def test_grid_rows_are_wins_and_columns_losses():
+    (grid,) = _grids()
+    assert grid.clubs == ["Omaha", "Denver", "Lincoln"]
+    assert grid.won().tolist() == [10, 12, 5]
+    assert grid.lost().tolist() == [8, 6, 13]
+
+
+def test_check_compares_with_standings():
+    standings = pd.DataFrame({
+        "league.year": ["1910", "1910"],
+        "league.name": ["Western League", "Western League"],
+        "entry.name":  ["Omaha", "Denver"],
+        "R_W":         ["10", "12"],
+        "R_L":         ["8", "9"],
+    })
+    df = headtohead.check(_grids(), standings)
+    # Denver's losses differ; Lincoln is not in the standings
+    assert dict(zip(df["entry.name"], df["disagrees"])) == \
+        {"Omaha": False, "Denver": True, "Lincoln": True}
+    assert df["R_L.standings"].isnull().tolist() == [False, False, True]
+
+
+def test_check_without_grids_is_empty():
+    df = headtohead.check([], pd.DataFrame())
+    assert df.empty
+    assert "disagrees" in df
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from hgame.averages import leaders
+from hgame.averages import loader
+
+
+def _write_pitching(root, rows):
+    """Write a processed playing_individual table for a source 'TSN' with
+    'rows' of (league, surname, P_IP, P_ERA, P_ERA_RANK).
+    """
+    (root/"TSN").mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame(rows, columns=["league.name", "person.name.last",
+                                     "P_IP", "P_ERA", "P_ERA_RANK"])
+    df["league.year"] = 1955
+    df["S_STINT"] = "0"
+    df["person.ref"] = [f"P{i:05d}" for i in range(1, len(df)+1)]
+    df.reindex(columns=loader.tables["playing_individual"]) \
+      .to_csv(root/"TSN"/"playing_individual.csv", index=False)
+    for table in ["managing_individual", "playing_team"]:
+        pd.DataFrame(columns=loader.tables[table]) \
+          .to_csv(root/"TSN"/f"{table}.csv", index=False)
+
+
+def _ranks(df):
+    return dict(zip(df["person.name.last"],
+                    df["rank"].astype(object).where(df["rank"].notnull(),
+                                                    None)))
+
+
+def test_printed_ranks_mark_qualified_rows(tmp_path):
+    _write_pitching(tmp_path, [
+        ("Western League", "Adams", 200.0, 2.50, 1),
+        ("Western League", "Baker", 180.1, 3.10, 3),
+        ("Western League", "Clark", 20.0, 1.80, None),
+        ("Western League", "Davis", 150.2, 3.00, 2),
+        ("Texas League", "Evans", 90.0, 4.00, None),
+        ("Texas League", "Foster", 10.0, 2.00, None),
+    ])
+    df = leaders.rank("P_ERA", root=str(tmp_path))
+    # The guide did not rank Clark; the Texas League has no printed ranks
+    assert _ranks(df) == {"Adams": 1, "Baker": 3, "Clark": None, "Davis": 2,
+                          "Evans": 2, "Foster": 1}
+    assert not df["disagrees"].any()
+
+
+def test_rules_measure_innings_in_thirds(tmp_path):
+    _write_pitching(tmp_path, [
+        ("Western League", "Adams", 30.0, 2.50, 1),
+        ("Western League", "Baker", 20.2, 2.00, 2),
+        ("Western League", "Clark", 20.0, 1.50, None),
+    ])
+    # 20.2 is 20 2/3 innings, over 68% of 30; 20 innings are not
+    df = leaders.rank("P_ERA", qualify={"P_IP": 0.68}, root=str(tmp_path))
+    assert _ranks(df) == {"Adams": 2, "Baker": 1, "Clark": None}
+    # Only rows with both ranks are compared
+    assert list(df.loc[df["disagrees"], "person.name.last"]) == \
+        ["Adams", "Baker"]
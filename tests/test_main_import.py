@@ -0,0 +1,41 @@
+import pathlib
+import subprocess
+import sys
+
+
+_root = pathlib.Path(__file__).resolve().parent.parent
+
+# Cumulative import time of hgame.averages.main, in microseconds
+_budget = 500000
+
+_heavy = ("pandas", "numpy", "xlrd")
+
+
+def _run(code, *options):
+    return subprocess.run([sys.executable, *options, "-c", code],
+                          cwd=_root, capture_output=True, text=True,
+                          check=True)
+
+
+def test_help_does_not_import_heavy_packages():
+    result = _run(
+        "import sys\n"
+        "from hgame.averages.main import cli\n"
+        "try:\n"
+        "    cli(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print(' '.join(m for m in {_heavy!r} if m in sys.modules))\n"
+    )
+    assert "Usage:" in result.stdout
+    assert result.stdout.splitlines()[-1] == ""
+
+
+def test_import_is_within_budget():
+    result = _run("import hgame.averages.main", "-X", "importtime")
+    lines = [line.split("|") for line in result.stderr.splitlines()
+             if line.startswith("import time:")]
+    cumulative = {name.strip(): int(total) for (_, total, name) in lines
+                  if total.strip().isdigit()}
+    assert not set(_heavy) & set(cumulative)
+    assert cumulative["hgame.averages.main"] < _budget
@@ -0,0 +1,45 @@
+import pathlib
+
+import toml
+
+from hgame.averages import process
+from hgame.averages import refs
+from hgame.averages import totoml
+
+
+_workbook = pathlib.Path(__file__).parents[1] / \
+    "transcript" / "1969TSN" / "1968MexicanRookieLeague.xls"
+
+
+def test_csv_and_toml_join_on_refs(tmp_path, monkeypatch):
+    monkeypatch.setenv("HGAME_CACHE_DIR", str(tmp_path/"cache"))
+    book = process.Workbook(str(_workbook), stable_keys=True)
+    (playing, managing, _) = process.process_workbook(book)
+    totoml.process_file("1969TSN", _workbook, tmp_path, stable_keys=True)
+    people = toml.load(tmp_path/f"{_workbook.stem}.txt")["person"]
+
+    keys = {rec["_key"]: rec for rec in people}
+    assert len(keys) == len(people)
+    for df in [playing, managing]:
+        for (ref, last) in zip(df["person.ref"], df["person.name.last"]):
+            assert keys[ref]["name"]["last"] == last
+    csv = set(playing["person.ref"]) | set(managing["person.ref"])
+    assert csv == set(keys)
+    # Every kind of sheet is covered, each numbered from its own offset
+    for sheet in ["Batting", "Pitching", "Fielding", "Managing"]:
+        (prefix, offset) = refs.sheets[sheet]
+        first = refs.make_ref(prefix, offset+1, refs.workbook_id(_workbook))
+        assert first in keys
+
+
+def test_default_toml_keys_number_each_sheet(tmp_path, monkeypatch):
+    monkeypatch.setenv("HGAME_CACHE_DIR", str(tmp_path/"cache"))
+    totoml.process_file("1969TSN", _workbook, tmp_path)
+    people = toml.load(tmp_path/f"{_workbook.stem}.txt")["person"]
+
+    for (table, prefix) in [("person_batting", "B"),
+                            ("person_pitching", "P"),
+                            ("person_fielding", "F")]:
+        keys = [rec["_key"] for rec in people if rec["_table"] == table]
+        assert keys == [refs.make_ref(prefix, n)
+                        for n in range(1, len(keys)+1)]
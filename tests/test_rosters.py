@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from hgame.averages import rosters
+
+
+def _spans(count, seed):
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, 200, count)
+    return pd.DataFrame({
+        "league.year": 1910,
+        "league.name": "Western League",
+        "entry.name":  rng.choice(["Omaha", "Denver", "Lincoln"], count),
+        "row":         np.arange(count),
+        "first":       first,
+        "last":        first + rng.integers(0, 60, count),
+    })
+
+
+def test_overlap_matches_brute_force():
+    df = _spans(300, seed=1)
+    index = rosters.IntervalIndex(df)
+    rng = np.random.default_rng(2)
+    codes = rng.integers(0, 3, 100)
+    first = rng.integers(-20, 260, 100)
+    last = first + rng.integers(0, 30, 100)
+    found = index.overlap(codes, first, last)
+    clubs = {int(index.codes([1910], club)[0]): club
+             for club in ["Omaha", "Denver", "Lincoln"]}
+    for q in range(len(codes)):
+        expected = df[(df["entry.name"] == clubs[codes[q]]) &
+                      (df["first"] <= last[q]) & (df["last"] >= first[q])]
+        assert sorted(found.loc[found["query"] == q, "row"]) == \
+            sorted(expected["row"])
+
+
+def test_on_finds_rows_with_club_on_date():
+    df = pd.DataFrame({
+        "league.year": [1910, 1910, 1910],
+        "league.name": ["Western League"] * 3,
+        "entry.name":  ["Omaha", "Omaha", "Denver"],
+        "S_FIRST":     ["19100501", None, "19100601"],
+        "S_LAST":      ["19100630", "19100520", None],
+    })
+    index = rosters.IntervalIndex(rosters.playing_spans(df))
+    # The second row joined at the start of the season
+    assert sorted(index.on("1910-05-10", club="Omaha")["S_LAST"]) == \
+        ["19100520", "19100630"]
+    assert index.on("19100525", club="Omaha")["S_LAST"].tolist() == \
+        ["19100630"]
+    assert len(index.on("1910-07-01")) == 1
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hgame.averages import schema
+
+
+def _concatenated(frames, table):
+    """Return 'frames' put together as the tables were before assemble():
+    concatenated, with the columns they lack added as None.
+    """
+    df = pd.concat(frames, sort=False, ignore_index=True)
+    for col in schema.tables[table]:
+        if col not in df:
+            df[col] = None
+    return df[schema.tables[table]]
+
+
+_cases = {
+    "mixed": [
+        pd.DataFrame({"league.year": [1910, 1910], "seq": [1, 2],
+                      "entry.name": ["Waco", "Austin"]}),
+        pd.DataFrame({"league.year": [1911], "seq": [1.5],
+                      "person.ref": ["M00011"]}),
+        pd.DataFrame({"league.year": ["1912"], "entry.name": [3]}),
+    ],
+    "null": [
+        pd.DataFrame({"league.year": [1910, 1911], "seq": [1, 2]}),
+        pd.DataFrame({"league.year": [np.nan], "seq": [None],
+                      "S_FIRST": [None]}),
+        pd.DataFrame({"league.year": [1912], "seq": [np.nan],
+                      "S_FIRST": [np.nan]}),
+    ],
+    "empty": [
+        pd.DataFrame(columns=["league.year"]),
+        pd.DataFrame({"league.year": [1910], "seq": [1],
+                      "entry.name": ["Waco"]}),
+        pd.DataFrame({"league.year": pd.Series([], dtype=float),
+                      "seq": pd.Series([], dtype=object)}),
+    ],
+    "missing": [
+        pd.DataFrame({"league.year": [1910], "seq": [1]}),
+        pd.DataFrame({"league.year": [1911]}),
+    ],
+    "boolean": [
+        pd.DataFrame({"league.year": [1910], "seq": [True],
+                      "S_FIRST": [False]}),
+        pd.DataFrame({"league.year": [1911], "seq": [2]}),
+    ],
+}
+
+
+@pytest.mark.parametrize("case", list(_cases))
+def test_assemble_matches_concat(case):
+    frames = _cases[case]
+    expected = _concatenated(frames, "managing_individual")
+    assembled = schema.assemble(frames, "managing_individual")
+    assert assembled.dtypes.to_dict() == expected.dtypes.to_dict()
+    pd.testing.assert_frame_equal(assembled, expected)
+
+
+def test_assembler_works_out_dtypes_from_summaries():
+    frames = _cases["mixed"] + _cases["null"]
+    whole = schema.Assembler("managing_individual")
+    parts = [schema.Assembler("managing_individual") for _ in frames]
+    for (part, df) in zip(parts, frames):
+        part.add(df)
+        whole.extend(part)
+    assert whole.dtypes() == \
+        _concatenated(frames, "managing_individual").dtypes.to_dict()
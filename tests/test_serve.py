@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pandas as pd
+
+from hgame.averages import loader
+from hgame.averages import serve
+
+
+def _write_source(root, people):
+    """Write processed tables for a source 'Reach' with a batting row
+    for each of 'people'.
+    """
+    (root/"Reach").mkdir(parents=True, exist_ok=True)
+    for table in loader.tables:
+        df = pd.DataFrame(columns=loader.tables[table])
+        if table == "playing_individual":
+            df = pd.DataFrame({"league.year": 1915,
+                               "league.name": "Texas League",
+                               "entry.name": "Waco",
+                               "person.ref": [f"B{i:05d}" for i in
+                                              range(1, len(people)+1)],
+                               "person.name.last": people}) \
+                   .reindex(columns=loader.tables[table])
+        df.to_csv(root/"Reach"/f"{table}.csv", index=False)
+
+
+def _exchange(service, requests):
+    """Send each of the raw 'requests' to a server for 'service' on
+    localhost, returning the status and body of each response.
+    """
+    async def run():
+        server = await asyncio.start_server(serve.Server(service).handle,
+                                            "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        async with server:
+            for request in requests:
+                (reader, writer) = await asyncio.open_connection(
+                    "127.0.0.1", port
+                )
+                writer.write(request)
+                data = await reader.read()
+                writer.close()
+                (head, _, body) = data.partition(b"\r\n\r\n")
+                responses.append((int(head.split()[1]), json.loads(body)))
+        return responses
+    return asyncio.run(run())
+
+
+def _get(target):
+    return (f"GET {target} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Connection: close\r\n\r\n").encode("latin-1")
+
+
+def test_queries(tmp_path):
+    _write_source(tmp_path, ["Smith", "Smithson", "Jones"])
+    service = serve.Service(str(tmp_path))
+    assert service.refresh() == ["Reach"]
+    [(status, sources), (_, people), (missing, _)] = _exchange(
+        service, [_get("/sources"), _get("/people?surname=smi"),
+                  _get("/nowhere")]
+    )
+    assert status == 200
+    assert sources["Reach"]["playing_individual"] == 3
+    assert [rec["person.name.last"]
+            for rec in people["playing_individual"]] == ["Smith", "Smithson"]
+    assert missing == 404
+
+
+def test_errors_are_answered(tmp_path, monkeypatch):
+    _write_source(tmp_path, ["Smith"])
+    service = serve.Service(str(tmp_path))
+    service.refresh()
+
+    def fail(path, params):
+        raise RuntimeError("broken")
+    monkeypatch.setattr(service, "query", fail)
+    bad_length = (b"GET /sources HTTP/1.1\r\nContent-Length: many\r\n"
+                  b"\r\n")
+    assert [status for (status, _) in
+            _exchange(service, [bad_length, _get("/sources")])] == [400, 500]
+
+
+def test_refresh_keeps_index_of_unreadable_source(tmp_path):
+    _write_source(tmp_path, ["Smith"])
+    service = serve.Service(str(tmp_path))
+    service.refresh()
+    index = service.indexes["Reach"]
+
+    (tmp_path/"Reach"/"playing_individual.csv").write_text("league.ye")
+    assert service.refresh() == []
+    assert service.indexes["Reach"] is index
+
+    _write_source(tmp_path, ["Smith", "Jones"])
+    assert service.refresh() == ["Reach"]
+    assert service.indexes["Reach"].rows("playing_individual") == 2
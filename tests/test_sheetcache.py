@@ -0,0 +1,30 @@
+import pathlib
+
+from hgame.averages import readers
+from hgame.averages import sheetcache
+
+
+_workbook = pathlib.Path(__file__).parents[1] / \
+    "transcript" / "1969TSN" / "1968MexicanRookieLeague.xls"
+
+
+def test_uncached_sheets_are_read_together(tmp_path, monkeypatch):
+    monkeypatch.setenv("HGAME_CACHE_DIR", str(tmp_path))
+    reader = readers.get_reader()
+    calls = []
+    read_sheets = reader.read_sheets
+
+    def counted(fn, names, **kwargs):
+        calls.append(list(names))
+        return read_sheets(fn, names, **kwargs)
+    monkeypatch.setattr(reader, "read_sheets", counted)
+
+    sheets = sheetcache.read_excel(_workbook, None, dtype=str)
+    assert calls == [sheetcache.sheet_names(_workbook)]
+    assert list(sheets) == calls[0]
+    # Every sheet now comes from the cache
+    again = sheetcache.read_excel(_workbook, ["Pitching", "Batting"],
+                                  dtype=str)
+    assert len(calls) == 1
+    assert list(again) == ["Pitching", "Batting"]
+    assert again["Batting"].equals(sheets["Batting"])
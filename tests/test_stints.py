@@ -0,0 +1,22 @@
+import pandas as pd
+
+from hgame.averages import stints
+
+
+def test_stints_expand_in_numeric_order():
+    multiclub = pd.DataFrame({
+        "person.ref": ["P1", "P2"],
+        "nameClub1":  ["12@St. Paul", "Omaha"],
+        "nameClub10": ["3@Lincoln", None],
+        "nameClub2":  ["Denver", None],
+    })
+    df = stints.expand_stints(multiclub, "B_G")
+    assert df.columns.tolist() == ["person.ref", "nameClub1", "S_STINT",
+                                   "B_G"]
+    assert df.astype(object).where(df.notnull(), None) \
+             .values.tolist() == [
+        ["P1", "St. Paul", "1", "12"],
+        ["P1", "Denver", "2", None],
+        ["P1", "Lincoln", "10", "3"],
+        ["P2", "Omaha", "1", None],
+    ]